@@ -2,15 +2,21 @@
 """
 Model admin
 """
+from django.conf.urls import patterns, url
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import render
 from django.utils.translation import ugettext_lazy as _
 
 from models import *
+from forms.export import DayEntryImportForm
+from importers import DayEntryImporter, iter_csv_rows, iter_ics_rows
 
 class DatebookAdmin(admin.ModelAdmin):
     ordering = ('-modified',)
     list_filter = ('created', 'modified', 'author')
     list_display = ('period_title', 'author', 'days_count', 'created', 'modified')
+    list_select_related = ('author', 'summary')
     raw_id_fields = ("author",)
 
     def period_title(self, datebook):
@@ -19,8 +25,9 @@ class DatebookAdmin(admin.ModelAdmin):
     period_title.admin_order_field = 'period'
 
     def days_count(self, datebook):
-        return datebook.dayentry_set.all().count()
+        return datebook.get_summary().entries
     days_count.short_description = _('Days')
+    days_count.admin_order_field = 'summary__entries'
 
 class DayBaseAdmin(admin.ModelAdmin):
     def start_time(self, day):
@@ -40,12 +47,14 @@ class DayEntryAdmin(DayBaseAdmin):
     list_display = ('activity_date', 'datebook_title', 'start_time', 'stop_time', 'pause', 'overtime', 'vacation')
     list_display_links = ('activity_date',)
     raw_id_fields = ("datebook",)
+    # Denormalized columns are computed in model save method
+    readonly_fields = ('elapsed_seconds', 'overtime_seconds')
     fieldsets = (
         (_('Date'), {
             'fields': ('datebook', 'activity_date')
         }),
         (_('Time'), {
-            'fields': ('vacation', 'start', 'stop', 'pause', 'overtime')
+            'fields': ('vacation', 'start', 'stop', 'pause', 'overtime', 'elapsed_seconds', 'overtime_seconds')
         }),
         (_('Content'), {
             'fields': ('content',),
@@ -57,6 +66,40 @@ class DayEntryAdmin(DayBaseAdmin):
     datebook_title.short_description = _("Datebook")
     datebook_title.admin_order_field = 'datebook__author__username'
 
+    change_list_template = 'admin/datebook/dayentry/change_list.html'
+
+    def get_urls(self):
+        urls = super(DayEntryAdmin, self).get_urls()
+        return patterns('',
+            url(r'^import/$', self.admin_site.admin_view(self.import_view), name='datebook_dayentry_import'),
+        ) + urls
+
+    def import_view(self, request):
+        """
+        Import day entries from an uploaded CSV or iCalendar file
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        importer = None
+        form = DayEntryImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            author = form.cleaned_data['author'] or None
+            source = form.cleaned_data['source']
+            if form.cleaned_data['file_format'] == 'csv':
+                rows = iter_csv_rows(source)
+            else:
+                rows = iter_ics_rows(source, author=author)
+            importer = DayEntryImporter(author=author).run(rows)
+            importer.errors.sort()
+
+        return render(request, 'admin/datebook/dayentry/import.html', {
+            'title': _('Import day entries'),
+            'opts': self.model._meta,
+            'form': form,
+            'importer': importer,
+        })
+
 
 class DayModelAdmin(DayBaseAdmin):
     ordering = ('author__username', 'title',)
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for views, writes, the calendar engine and utils
+
+Benchmarks are runned on generated datas (see 'datebook.generators') with the
+test client, each measure records timings in milliseconds and the number of
+queries. Results are a dict that can be saved as JSON to compare runs.
+"""
+import datetime
+import platform
+import time
+import timeit
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+import datebook
+from datebook import utils
+from datebook.calendars import DatebookCalendar
+from datebook.generators import DatebookGenerator
+from datebook.models import Datebook, DayEntry, DayModel
+from datebook.forms.day import DATETIME_FORMATS
+
+
+class BenchmarkError(Exception):
+    """
+    Raised when a benchmarked request does not get the expected response
+    """
+    def __init__(self, url, status_code, expected):
+        self.url = url
+        self.status_code = status_code
+        self.expected = expected
+        super(BenchmarkError, self).__init__("{0} responds {1} instead of {2}".format(url, status_code, expected))
+
+
+def check_response(response, url, expected=200):
+    if response.status_code != expected:
+        raise BenchmarkError(url, response.status_code, expected)
+
+
+def percentile(values, pct):
+    """
+    Return the given percentile (from 0 to 100) of values, with the nearest
+    rank method
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    index = int(round(pct/100.0*len(values)+0.5))-1
+    return values[min(max(index, 0), len(values)-1)]
+
+
+def summarize_timings(timings):
+    """
+    Return a dict of statistics for the given timings in seconds, values are
+    in milliseconds
+    """
+    return {
+        'runs': len(timings),
+        'min': round(min(timings)*1000, 3),
+        'p50': round(percentile(timings, 50)*1000, 3),
+        'p95': round(percentile(timings, 95)*1000, 3),
+        'p99': round(percentile(timings, 99)*1000, 3),
+        'max': round(max(timings)*1000, 3),
+        'mean': round(sum(timings)/len(timings)*1000, 3),
+    }
+
+
+def get_view_urls(username, day):
+    """
+    Return a dict of the read views urls for the given author and day, from
+    their url names
+    """
+    return {
+        'index': reverse('datebook:index'),
+        'author': reverse('datebook:author-detail', kwargs={'author': username}),
+        'year': reverse('datebook:year-detail', kwargs={'author': username, 'year': day.year}),
+        'month': reverse('datebook:month-detail', kwargs={'author': username, 'year': day.year, 'month': day.month}),
+        'month-json': reverse('datebook:month-json', kwargs={'author': username, 'year': day.year, 'month': day.month}),
+        'day-detail': reverse('datebook:day-detail', kwargs={'author': username, 'year': day.year, 'month': day.month, 'day': day.day}),
+    }
+
+
+def get_dayentry_form_data(day, start=datetime.time(9, 0), stop=datetime.time(18, 0), submit='submit'):
+    """
+    Return POST datas for the day entry form
+    """
+    date_format = DATETIME_FORMATS['input_date_formats'][0]
+    time_format = DATETIME_FORMATS['input_time_formats'][0]
+    return {
+        'start_datetime_0': day.strftime(date_format),
+        'start_datetime_1': start.strftime(time_format),
+        'stop_datetime_0': day.strftime(date_format),
+        'stop_datetime_1': stop.strftime(time_format),
+        'pause': '01:00',
+        'overtime': '00:00',
+        'content': 'Benchmark',
+        submit: '1',
+    }
+
+
+def get_assign_daymodel_data(days, daymodel_id):
+    """
+    Return POST datas for the day model assignment form of the month view
+    """
+    return {'days': [str(item) for item in days], 'daymodel': daymodel_id}
+
+
+class DatebookBenchmark(object):
+    """
+    Run the benchmarks on generated datas, in the current database
+
+    Use 'run' to generate datas and run all the benchmarks, results are in the
+    'results' dict.
+    """
+    def __init__(self, entries=1000, years=1, seed=0, repeat=10, prefix='benchmark'):
+        self.years = years
+        # About 250 day entries are generated for each user and year
+        self.users = max(1, int(round(entries/(250.0*years))))
+        self.seed = seed
+        self.repeat = repeat
+        self.prefix = prefix
+        self.password = 'benchmark'
+        self.results = {}
+
+    def measure(self, func, repeat=None):
+        """
+        Call the function 'repeat' times and return the timing statistics
+        with the maximum number of queries of a call
+        """
+        timings, queries = [], 0
+        for i in range(0, repeat or self.repeat):
+            with CaptureQueriesContext(connection) as context:
+                started = time.time()
+                func()
+                timings.append(time.time()-started)
+            queries = max(queries, len(context.captured_queries))
+        stats = summarize_timings(timings)
+        stats['queries'] = queries
+        return stats
+
+    def get_meta(self):
+        return {
+            'datebook': datebook.__version__,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': connection.vendor,
+            'cache': settings.DATEBOOK_CACHE,
+            'date': datetime.datetime.now().isoformat(),
+            'repeat': self.repeat,
+        }
+
+    def generate(self):
+        started = time.time()
+        generator = DatebookGenerator(users=self.users, years=self.years, seed=self.seed, prefix=self.prefix, password=self.password).run()
+        self.author = generator.get_usernames()[0]
+        self.last_year = generator.start_year+self.years-1
+        return {
+            'users': generator.users,
+            'datebooks': generator.datebooks,
+            'entries': generator.entries,
+            'seed': self.seed,
+            'start_year': generator.start_year,
+            'seconds': round(time.time()-started, 3),
+        }
+
+    def get_client(self):
+        client = Client()
+        client.login(username=self.author, password=self.password)
+        return client
+
+    def bench_views(self):
+        """
+        Latency and queries of the read views for the first author on a month
+        of its last year
+        """
+        client = self.get_client()
+        entry = DayEntry.objects.filter(datebook__author__username=self.author, activity_date__year=self.last_year, activity_date__month=6).order_by('activity_date').first()
+        results = {}
+        for name, url in sorted(get_view_urls(self.author, entry.activity_date).items()):
+            def request():
+                response = client.get(url)
+                check_response(response, url)
+            results[name] = self.measure(request)
+        return results
+
+    def bench_writes(self):
+        """
+        Day entry create form and day model assignment throughputs, on a new
+        month after the generated ones
+        """
+        client = self.get_client()
+        author = User.objects.get(username=self.author)
+        period = datetime.date(self.last_year+1, 1, 1)
+        Datebook.objects.create(author=author, period=period)
+        daymodel_id = DayModel.objects.filter(author=author).values_list('id', flat=True)[0]
+        results = {}
+
+        days = [period+datetime.timedelta(days=i) for i in range(0, min(self.repeat, 31))]
+        timings, queries = [], 0
+        started = time.time()
+        for day in days:
+            url = reverse('datebook:day-add', kwargs={'author': self.author, 'year': day.year, 'month': day.month, 'day': day.day})
+            with CaptureQueriesContext(connection) as context:
+                request_started = time.time()
+                response = client.post(url, get_dayentry_form_data(day, submit='submit_and_next'))
+                timings.append(time.time()-request_started)
+            check_response(response, url, 302)
+            queries = max(queries, len(context.captured_queries))
+        results['day-add'] = summarize_timings(timings)
+        results['day-add'].update({'queries': queries, 'writes_per_second': round(len(days)/(time.time()-started), 3)})
+
+        # All the month days are assigned, existing ones are updated
+        url = reverse('datebook:month-detail', kwargs={'author': self.author, 'year': period.year, 'month': period.month})
+        data = get_assign_daymodel_data(range(1, 32), daymodel_id)
+        def assign():
+            response = client.post(url, data)
+            check_response(response, url, 302)
+        results['assign-daymodel'] = self.measure(assign)
+        results['assign-daymodel']['days_per_second'] = round(31/(results['assign-daymodel']['p50']/1000.0), 3)
+        return results
+
+    def bench_micro(self, number=1000):
+        """
+        Calendar engine and utils helpers, timings are in microseconds for a
+        call
+        """
+        month_datebook = Datebook.objects.get(author__username=self.author, period__year=self.last_year, period__month=6)
+        entries = list(month_datebook.dayentry_set.order_by('activity_date'))
+        values = [item.get_summary_values()[1:] for item in entries]
+        year, month = month_datebook.period.year, month_datebook.period.month
+        day, seconds, timeobj = month_datebook.period, 30600, datetime.time(8, 30)
+        calendar = DatebookCalendar()
+
+        calls = {
+            'DatebookCalendar.formatmonth': lambda: calendar.formatmonth(year, month, dayentries=entries, current_day=day),
+            'utils.format_seconds_to_clock': lambda: utils.format_seconds_to_clock(seconds),
+            'utils.time_to_seconds': lambda: utils.time_to_seconds(timeobj),
+            'utils.week_from_date': lambda: utils.week_from_date(day),
+            'utils.month_weeks_index': lambda: utils.month_weeks_index(year, month),
+            'utils.summarize_day_values': lambda: utils.summarize_day_values(year, month, values),
+        }
+        results = {}
+        for name, func in sorted(calls.items()):
+            timings = timeit.repeat(func, number=number, repeat=3)
+            results[name] = {'number': number, 'usec': round(min(timings)/number*1000000, 3)}
+        return results
+
+    def run(self):
+        self.results = {'meta': self.get_meta()}
+        self.results['datas'] = self.generate()
+        self.results['views'] = self.bench_views()
+        self.results['writes'] = self.bench_writes()
+        self.results['micro'] = self.bench_micro()
+        return self.results
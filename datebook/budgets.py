@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+SQL query budgets for views
+
+Views declare their expected maximum number of queries for a request with a
+'query_budget' attribute, either an integer or a dict of integers for each
+request method (like ``{'GET': 6, 'POST': 12}``). Queries of a request are recorded with the origin
+that issued them (the datebook code line and the template line if any) so
+reports show where the extra queries come from. Budgets are checked from
+'datebook.middleware.QueryBudgetMiddleware' or from tests with
+'QueryBudgetTestMixin'.
+"""
+import os
+import sys
+import warnings
+from collections import deque
+
+from django.conf import settings
+from django.core.urlresolvers import resolve
+from django.db import connections, DEFAULT_DB_ALIAS
+
+# Directory of the application, only its frames are reported as query origins
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Frames of this module are never query origins
+MODULE_PATH = os.path.splitext(os.path.abspath(__file__))[0]
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudgetWarning(RuntimeWarning):
+    pass
+
+
+def get_query_budget_mode():
+    """
+    Return the budget mode from 'DATEBOOK_QUERY_BUDGET_MODE', default is to
+    warn in debug mode only
+    """
+    mode = settings.DATEBOOK_QUERY_BUDGET_MODE
+    if mode is None:
+        mode = 'warn' if settings.DEBUG else 'off'
+    return mode
+
+
+def get_view_class(view_func):
+    """
+    Return the class of a class-based view function, None for function views
+
+    Django < 1.9 does not set 'view_class' on views from 'as_view', but their
+    function has the name and module of their class.
+    """
+    view_class = getattr(view_func, 'view_class', None)
+    if view_class is None:
+        module = sys.modules.get(getattr(view_func, '__module__', None))
+        view_class = getattr(module, getattr(view_func, '__name__', ''), None)
+    return view_class if isinstance(view_class, type) else None
+
+
+def get_query_budget(view_func, method='GET'):
+    """
+    Return the query budget of a view function for the given request method,
+    None if it does not have one
+    """
+    budget = getattr(get_view_class(view_func), 'query_budget', None)
+    if isinstance(budget, dict):
+        budget = budget.get(method.upper())
+    return budget
+
+
+def get_template_position(node):
+    """
+    Return a tuple ``(TEMPLATE_NAME, LINE)`` for a template node, None if
+    unknown
+    """
+    # Django >= 1.9
+    token, origin = getattr(node, 'token', None), getattr(node, 'origin', None)
+    if getattr(token, 'lineno', None) and origin is not None:
+        return origin.name, token.lineno
+    # Django 1.8 with template debug, source is a tuple of the origin and the
+    # node offsets in the template content
+    source = getattr(node, 'source', None)
+    if source and hasattr(source[0], 'reload'):
+        try:
+            return source[0].name, source[0].reload()[:source[1][0]].count('\n')+1
+        except Exception:
+            return source[0].name, None
+    return None
+
+
+def get_frame_label(frame):
+    """
+    Return a label for a frame of the application code, with the class that
+    defines its method (like a mixin) if any
+    """
+    code = frame.f_code
+    label = u'{0}:{1} in {2}'.format(os.path.relpath(code.co_filename, os.path.dirname(APP_DIR)), frame.f_lineno, code.co_name)
+    instance = frame.f_locals.get('self')
+    if instance is not None:
+        for klass in type(instance).__mro__:
+            func = klass.__dict__.get(code.co_name)
+            if getattr(func, '__code__', None) is code or getattr(getattr(func, '__func__', None), '__code__', None) is code:
+                label = u'{0} ({1})'.format(label, klass.__name__)
+                break
+    return label
+
+
+def get_query_origin():
+    """
+    Return a dict of the innermost application frame and template line from
+    the current stack
+    """
+    origin = {'code': None, 'template': None}
+    frame = sys._getframe(2)
+    while frame is not None and (origin['code'] is None or origin['template'] is None):
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if origin['code'] is None and filename.startswith(APP_DIR) and os.path.splitext(filename)[0] != MODULE_PATH:
+            origin['code'] = get_frame_label(frame)
+        if origin['template'] is None and frame.f_code.co_name == 'render' and 'self' in frame.f_locals:
+            position = get_template_position(frame.f_locals['self'])
+            if position:
+                origin['template'] = u'{0}:{1}'.format(*position)
+        frame = frame.f_back
+    return origin
+
+
+class OriginQueriesLog(deque):
+    """
+    Queries log that adds the origin to each logged query
+    """
+    def append(self, item):
+        item.update(get_query_origin())
+        super(OriginQueriesLog, self).append(item)
+
+
+class QueryRecorder(object):
+    """
+    Context manager to record the queries with their origin on a connection
+
+    Recorded queries are dicts with 'sql', 'time', 'code' and 'template'.
+    This needs Django >= 1.8 for its connection queries log.
+    """
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.queries = []
+
+    def __enter__(self):
+        self.force_debug_cursor = self.connection.force_debug_cursor
+        self.queries_log = self.connection.queries_log
+        self.connection.force_debug_cursor = True
+        self.connection.queries_log = OriginQueriesLog(maxlen=self.queries_log.maxlen)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.queries = list(self.connection.queries_log)
+        # Keep the recorded queries in the connection log
+        self.queries_log.extend(self.queries)
+        self.connection.queries_log = self.queries_log
+        self.connection.force_debug_cursor = self.force_debug_cursor
+
+    def __len__(self):
+        return len(self.queries)
+
+    def get_duplicates(self):
+        """
+        Return a list of tuples ``(COUNT, SQL)`` for the queries executed more
+        than once, ordered on their count
+        """
+        counts = {}
+        for item in self.queries:
+            counts[item['sql']] = counts.get(item['sql'], 0)+1
+        return sorted([(count, sql) for sql, count in counts.items() if count > 1], reverse=True)
+
+    def get_report(self, name, budget):
+        """
+        Return the report text for the recorded queries
+        """
+        lines = [u"{0} executed {1} queries for a budget of {2}".format(name, len(self.queries), budget)]
+        for i, item in enumerate(self.queries, start=1):
+            lines.append(u"{0}. {1}".format(i, item['sql']))
+            origins = [value for value in (item.get('code'), item.get('template')) if value]
+            if origins:
+                lines.append(u"   from {0}".format(u', '.join(origins)))
+        duplicates = self.get_duplicates()
+        if duplicates:
+            lines.append(u"Duplicated queries:")
+            for count, sql in duplicates:
+                lines.append(u"* {0} times: {1}".format(count, sql))
+        return u'\n'.join(lines)
+
+
+def check_query_budget(recorder, name, budget, mode='warn'):
+    """
+    Warn or raise 'QueryBudgetExceeded' when the recorded queries exceed the
+    budget, depending on the mode
+    """
+    if budget is None or len(recorder) <= budget:
+        return
+    report = recorder.get_report(name, budget)
+    if mode == 'raise':
+        raise QueryBudgetExceeded(report)
+    warnings.warn(report, QueryBudgetWarning)
+
+
+class QueryBudgetTestMixin(object):
+    """
+    TestCase mixin to assert that requests don't exceed the query budget of
+    their view
+    """
+    def assertQueryBudget(self, url, budget=None, method='get', data=None, **extra):
+        """
+        Request the url with the test client and fail if the view has executed
+        more queries than the given budget or else its own budget
+
+        Return the response.
+        """
+        if budget is None:
+            budget = get_query_budget(resolve(url.split('?')[0]).func, method)
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method)(url, data or {}, **extra)
+        if budget is not None and len(recorder) > budget:
+            self.fail(recorder.get_report(u'{0} {1}'.format(method.upper(), url), budget))
+        return response
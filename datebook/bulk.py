@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk operations on the day entries of an author
+
+Each operation is done on a set of dates, whatever are their months, with a
+few set-based queries in a single transaction: a single summary delta for
+all the modified entries and a single touch for all their datebooks.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.forms import ValidationError
+from django.utils.timezone import localtime, is_aware
+
+from datebook import utils
+from datebook.models import Datebook, DatebookSummary, DayEntry, coalesced_touches
+from datebook.utils.timezones import combine_local
+from datebook.validators import validate_day_start, validate_day_stop
+
+# Default times for created vacation days, the same than the day create form
+DEFAULT_START = datetime.time(9, 0)
+DEFAULT_STOP = datetime.time(18, 0)
+DEFAULT_PAUSE = datetime.time(1, 0)
+
+
+class DayEntryBulkEdit(object):
+    """
+    Bulk operations on the day entries of an author for the given dates
+
+    After an operation, 'created', 'updated' and 'deleted' are the counters
+    of written day entries.
+    """
+    def __init__(self, author, dates):
+        self.author = author
+        self.dates = set(dates)
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+
+    def get_existing(self, *fields):
+        """
+        Return the list of values tuples for the existing entries on the dates
+
+        Entries are getted from the dates range since dates can be too many
+        for a 'IN' clause, 'activity_date' must be in the fields.
+        """
+        if not self.dates:
+            return []
+        index = fields.index('activity_date')
+        rows = DayEntry.objects.filter(
+            datebook__author=self.author,
+            activity_date__gte=min(self.dates),
+            activity_date__lte=max(self.dates),
+        ).order_by('activity_date').values_list(*fields)
+        return [item for item in rows if item[index] in self.dates]
+
+    def mark_vacation(self):
+        """
+        Mark the days as vacations, missing days are created with the default
+        times
+        """
+        with transaction.atomic(), coalesced_touches():
+            existing = self.get_existing('pk', *DayEntry.SUMMARY_FIELDS)
+            worked = [item for item in existing if not item[3]]
+            if worked:
+                DayEntry.objects.filter(pk__in=[item[0] for item in worked]).update(vacation=True)
+                DatebookSummary.objects.apply_delta(
+                    removed=[item[1:] for item in worked],
+                    added=[item[1:3]+(True,)+item[4:] for item in worked],
+                )
+                Datebook.objects.touch([item[1] for item in worked])
+                self.updated += len(worked)
+
+            missing = sorted(self.dates - set([item[2] for item in existing]))
+            if missing:
+                datebooks, created = Datebook.objects.bulk_get_or_create([(self.author.id, item.replace(day=1)) for item in missing])
+                # The queryset fills their denormalized seconds, summaries and
+                # touches their datebook
+                DayEntry.objects.bulk_create([DayEntry(
+                    datebook=datebooks[(self.author.id, item.replace(day=1))],
+                    activity_date=item,
+                    start=combine_local(item, DEFAULT_START),
+                    stop=combine_local(item, DEFAULT_STOP),
+                    pause=DEFAULT_PAUSE,
+                    vacation=True,
+                ) for item in missing])
+                self.created += len(missing)
+        return self
+
+    def delete(self):
+        """
+        Delete the days
+        """
+        with transaction.atomic(), coalesced_touches():
+            existing = self.get_existing('pk', *DayEntry.SUMMARY_FIELDS)
+            if existing:
+                # Delete without the signal for each entry, nothing depends on
+                # day entries
+                DayEntry.objects.delete_each([item[0] for item in existing])
+                DatebookSummary.objects.apply_delta(removed=[item[1:] for item in existing])
+                Datebook.objects.touch([item[1] for item in existing])
+                self.deleted += len(existing)
+        return self
+
+    def shift(self, delta):
+        """
+        Shift the start and stop times of the days by the given timedelta
+
+        Raise a ValidationError if shifted times are not valid anymore for
+        some days, nothing is updated in this case.
+        """
+        with transaction.atomic(), coalesced_touches():
+            existing = self.get_existing('pk', 'datebook_id', 'activity_date', 'start', 'stop')
+
+            errors = []
+            for pk, datebook_id, activity_date, start, stop in existing:
+                start, stop = start+delta, stop+delta
+                if is_aware(start):
+                    start, stop = localtime(start), localtime(stop)
+                try:
+                    validate_day_start(start, activity_date)
+                    validate_day_stop(start, stop, activity_date)
+                except ValidationError as e:
+                    errors.extend([u'{0}: {1}'.format(activity_date.isoformat(), message) for message in e.messages])
+            if errors:
+                raise ValidationError(errors)
+
+            # Elapsed times don't change so summaries are unchanged
+            if existing:
+                DayEntry.objects.filter(pk__in=[item[0] for item in existing]).update(start=F('start')+delta, stop=F('stop')+delta)
+                Datebook.objects.touch([item[1] for item in existing])
+                self.updated += len(existing)
+        return self
+
+    def set_times(self, pause=None, overtime=None):
+        """
+        Set the pause and/or overtime of the days
+        """
+        values = {}
+        if overtime is not None:
+            values.update({'overtime': overtime, 'overtime_seconds': utils.time_to_seconds(overtime)})
+        if pause is not None:
+            values['pause'] = pause
+        if not values:
+            return self
+
+        with transaction.atomic(), coalesced_touches():
+            existing = self.get_existing('pk', 'start', 'stop', *DayEntry.SUMMARY_FIELDS)
+            if not existing:
+                return self
+
+            removed, added = [], []
+            changes = {}
+            for item in existing:
+                pk, start, stop, summary_values = item[0], item[1], item[2], item[3:]
+                elapsed_seconds, overtime_seconds = summary_values[3], summary_values[4]
+                # Elapsed time depends on the times of each day
+                if pause is not None:
+                    elapsed_seconds = utils.timedelta_to_seconds(stop-start)-utils.time_to_seconds(pause)
+                    changes[pk] = {'elapsed_seconds': elapsed_seconds}
+                if overtime is not None:
+                    overtime_seconds = values['overtime_seconds']
+                removed.append(summary_values)
+                added.append(summary_values[:3]+(elapsed_seconds, overtime_seconds))
+
+            if changes:
+                DayEntry.objects.update_each(changes, **values)
+            else:
+                DayEntry.objects.filter(pk__in=[item[0] for item in existing]).update(**values)
+            DatebookSummary.objects.apply_delta(removed=removed, added=added)
+            Datebook.objects.touch([item[0] for item in removed])
+            self.updated += len(existing)
+        return self
@@ -5,6 +5,11 @@ Calendar widgets
 import datetime
 from calendar import TextCalendar, LocaleHTMLCalendar, _localized_day
 
+from django.db import connection
+from django.db.models import Count, Sum
+
+from datebook.utils import format_seconds_to_clock, month_weeks_index
+
 class DatebookCalendar(TextCalendar):
     """
     Simple inherit from "TextCalendar" to fill calendars with datas from Datebook(s)
@@ -42,3 +47,127 @@ class DatebookCalendar(TextCalendar):
                     'is_current': day==current_day,
                 })
         return month
+
+
+class DatebookMonthTotals(object):
+    """
+    Calendar totals engine for a Datebook month
+
+    Compute weeks and month totals (elapsed seconds, overtime seconds and 
+    vacations) with a single query grouped on weeks, using a precomputed index 
+    of month days to their week number.
+    
+    Like within calendars, days from the current day and further are projections 
+    that are not counted in totals.
+    """
+    def __init__(self, datebook, current_day):
+        self.datebook = datebook
+        self.current_day = current_day
+        self.year = datebook.period.year
+        self.month = datebook.period.month
+        self.weeks_index = month_weeks_index(self.year, self.month)
+        self.weeks_count = max(self.weeks_index.values())+1
+    
+    def get_week_ranges(self):
+        """
+        Return a list of tuples ``(FIRST_DATE, LAST_DATE)`` for each week
+        """
+        ranges = [None]*self.weeks_count
+        for dayno, weekno in sorted(self.weeks_index.items()):
+            day = datetime.date(self.year, self.month, dayno)
+            ranges[weekno] = (ranges[weekno] and ranges[weekno][0] or day, day)
+        return ranges
+    
+    def get_weekno_select(self, queryset):
+        """
+        Return a SQL ``CASE`` expression and its parameters to get the week number 
+        from the activity date
+        """
+        qn = connection.ops.quote_name
+        column = "{0}.{1}".format(qn(queryset.model._meta.db_table), qn(queryset.model._meta.get_field('activity_date').column))
+        cases, params = [], []
+        for weekno, (first, last) in enumerate(self.get_week_ranges()):
+            cases.append("WHEN {0} BETWEEN %s AND %s THEN {1}".format(column, weekno))
+            params.extend([first.isoformat(), last.isoformat()])
+        return "CASE {0} END".format(" ".join(cases)), params
+    
+    def get_empty_weeks(self):
+        """
+        Return the weeks totals list with all counters to zero, the current week 
+        is tagged if we are on the current month
+        """
+        weeks_totals = [{'current': False, 'active': False, 'elapsed_seconds':0, 'overtime_seconds':0, 'vacations':0} for i in range(0, self.weeks_count)]
+        if self.current_day.year == self.year and self.current_day.month == self.month:
+            weeks_totals[self.weeks_index[self.current_day.day]]['current'] = True
+        return weeks_totals
+    
+    def get_rows(self, queryset):
+        """
+        Return totals rows grouped on week number and vacation for the days 
+        before the current day
+        """
+        # All days are projections for futur months
+        if (self.year, self.month) > (self.current_day.year, self.current_day.month):
+            return []
+        
+        select, params = self.get_weekno_select(queryset)
+        return queryset.filter(activity_date__lt=self.current_day).extra(
+            select={'weekno': select},
+            select_params=params,
+        ).values('weekno', 'vacation').annotate(
+            entries=Count('pk'),
+            elapsed=Sum('elapsed_seconds'),
+            overtime=Sum('overtime_seconds'),
+        ).order_by()
+    
+    def from_rows(self, rows):
+        """
+        Fill weeks totals from grouped rows
+        """
+        weeks_totals = self.get_empty_weeks()
+        for row in rows:
+            week = weeks_totals[row['weekno']]
+            week['active'] = True
+            if row['vacation']:
+                week['vacations'] += row['entries']
+            else:
+                week['elapsed_seconds'] += row['elapsed'] or 0
+                week['overtime_seconds'] += row['overtime'] or 0
+        return weeks_totals
+    
+    def from_summary(self, summary):
+        """
+        Fill weeks totals from the datebook summary, this is only right for past 
+        months because summary totals include projections
+        """
+        weeks_totals = self.get_empty_weeks()
+        for week, totals in zip(weeks_totals, summary.get_weeks_totals()):
+            week['active'] = totals['entries'] > 0
+            week['elapsed_seconds'] = totals['elapsed_seconds']
+            week['overtime_seconds'] = totals['overtime_seconds']
+            week['vacations'] = totals['vacations']
+        return weeks_totals
+    
+    def compute(self, queryset, use_summary=True):
+        """
+        Return a tuple ``(WEEKS_TOTALS, MONTH_TOTALS)`` for the day entries from 
+        the given queryset
+        
+        With 'use_summary', past months totals are taken from the datebook summary 
+        without any query on day entries.
+        """
+        if use_summary and self.datebook.is_past_month(self.current_day):
+            weeks_totals = self.from_summary(self.datebook.get_summary())
+        else:
+            weeks_totals = self.from_rows(self.get_rows(queryset))
+        
+        month_totals = {'elapsed_seconds': 0, 'overtime_seconds': 0, 'vacations': 0}
+        for item in weeks_totals:
+            item['elapsed_time'] = format_seconds_to_clock(item['elapsed_seconds'])
+            item['overtime_time'] = format_seconds_to_clock(item['overtime_seconds'])
+            for key in month_totals:
+                month_totals[key] += item[key]
+        month_totals['elapsed_time'] = format_seconds_to_clock(month_totals['elapsed_seconds'])
+        month_totals['overtime_time'] = format_seconds_to_clock(month_totals['overtime_seconds'])
+        
+        return weeks_totals, month_totals
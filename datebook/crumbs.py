@@ -12,10 +12,13 @@ breadcrumbs_registry.update({
     'datebook:year-detail': '{{ year }}',
     'datebook:month-detail': '{{ target_date|date:"F Y" }}',
     'datebook:month-notes': ugettext_lazy('Notes for {{ target_date|date:"F Y" }}'),
+    'datebook:month-copy': ugettext_lazy('Copy {{ target_date|date:"F Y" }}'),
     'datebook:day-add': ugettext_lazy('Add {{ target_date|date:"l d F Y" }}'),
     'datebook:day-edit': ugettext_lazy('Edit {{ target_date|date:"l d F Y" }}'),
     'datebook:day-remove': ugettext_lazy('Remove {{ target_date|date:"l d F Y" }}'),
+    'datebook:days-bulk': ugettext_lazy('Edit several days'),
     'datebook:day-models': ugettext_lazy('Day models'),
     'datebook:day-model-edit': ugettext_lazy('Edit "{{ daymodel.title }}"'),
+    'datebook:day-model-schedule': ugettext_lazy('Schedule "{{ daymodel.title }}"'),
     'datebook:dayentry-to-daymodel': ugettext_lazy('Make a model from {{ target_date|date:"l d F Y" }}'),
 })
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Day entries exports
+
+Rows are walked by chunks with a keyset on the activity date for each author,
+so exports use a constant memory whatever the number of entries.
+"""
+import csv
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.encoding import force_str
+from django.utils.timezone import is_aware, localtime
+
+from datebook.models import DayEntry
+
+# Exported columns, with the day entry fields to get them
+EXPORT_COLUMNS = (
+    ('author', 'datebook__author__username'),
+    ('activity_date', 'activity_date'),
+    ('start', 'start'),
+    ('stop', 'stop'),
+    ('pause', 'pause'),
+    ('overtime', 'overtime'),
+    ('elapsed_seconds', 'elapsed_seconds'),
+    ('overtime_seconds', 'overtime_seconds'),
+    ('vacation', 'vacation'),
+)
+
+
+class Echo(object):
+    """
+    Pseudo buffer that just return the written value, so the csv writer can
+    be used to format rows one by one
+    """
+    def write(self, value):
+        return value
+
+
+def format_value(value):
+    """
+    Format a value for a CSV cell, datetimes are in the current timezone
+    """
+    if hasattr(value, 'utcoffset') and is_aware(value):
+        value = localtime(value)
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    elif isinstance(value, bool):
+        value = int(value)
+    return force_str(value)
+
+
+def get_export_authors(usernames=None):
+    """
+    Return the ids of authors that have datebooks, ordered on their username
+    """
+    queryset = User.objects.filter(datebook__isnull=False)
+    if usernames:
+        queryset = queryset.filter(username__in=usernames)
+    return list(queryset.order_by('username').values_list('id', flat=True).distinct())
+
+
+def iter_dayentry_rows(author_ids, start=None, end=None, chunk_size=None):
+    """
+    Yield day entries rows as tuples of values for each of 'EXPORT_COLUMNS',
+    for the given authors and optional date range (both bounds included)
+    """
+    chunk_size = chunk_size or settings.DATEBOOK_EXPORT_CHUNK_SIZE
+    fields = [field for name, field in EXPORT_COLUMNS]
+    date_index = fields.index('activity_date')
+
+    for author_id in author_ids:
+        queryset = DayEntry.objects.filter(datebook__author_id=author_id)
+        if start:
+            queryset = queryset.filter(activity_date__gte=start)
+        if end:
+            queryset = queryset.filter(activity_date__lte=end)
+        queryset = queryset.order_by('activity_date').values_list(*fields)
+
+        # Activity date is unique for an author since its datebooks are unique
+        # for each month
+        last_date = None
+        while True:
+            chunk = queryset
+            if last_date:
+                chunk = chunk.filter(activity_date__gt=last_date)
+
+            count = 0
+            for row in chunk[0:chunk_size].iterator():
+                count += 1
+                last_date = row[date_index]
+                yield row
+
+            if count < chunk_size:
+                break
+
+
+def iter_csv_lines(rows):
+    """
+    Yield CSV lines for the header then each of the given rows
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow([force_str(name) for name, field in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([format_value(value) for value in row])
@@ -254,3 +254,102 @@ def assign_daymodel_helper(form_tag=True, form_action='.', **kwargs):
     )
     
     return helper
+
+def schedule_daymodel_helper(form_tag=True):
+    """
+    DayModelScheduleForm form layout helper
+    """
+    helper = FormHelper()
+    helper.form_action = '.'
+    helper.attrs = {'data_abide': ''}
+    helper.form_tag = form_tag
+    
+    # Build the full layout
+    helper.layout = Layout(
+        Row(
+            Column('start', css_class='small-12 medium-4'),
+            Column('end', css_class='small-12 medium-4'),
+            Column('every', css_class='small-12 medium-4'),
+        ),
+        SimpleRowColumn('weekdays'),
+        Row(
+            Column('with_content', css_class='small-12 medium-4'),
+            Column('skip_existing', css_class='small-12 medium-4'),
+            Column('skip_vacations', css_class='small-12 medium-4'),
+        ),
+        SimpleRowColumn(
+            ButtonHolderPanel(
+                Submit(
+                    'submit',
+                    _('Apply'),
+                ),
+                css_class='text-right',
+            ),
+        )
+    )
+    
+    return helper
+
+def bulk_day_helper(form_tag=True):
+    """
+    DayEntryBulkForm form layout helper
+    """
+    helper = FormHelper()
+    helper.form_action = '.'
+    helper.attrs = {'data_abide': ''}
+    helper.form_tag = form_tag
+    
+    # Build the full layout
+    helper.layout = Layout(
+        Row(
+            Column('start', css_class='small-12 medium-4'),
+            Column('end', css_class='small-12 medium-4'),
+            Column('dates', css_class='small-12 medium-4'),
+        ),
+        SimpleRowColumn('operation'),
+        Row(
+            Column('shift', css_class='small-12 medium-4'),
+            Column('pause', css_class='small-12 medium-4'),
+            Column('overtime', css_class='small-12 medium-4'),
+        ),
+        SimpleRowColumn(
+            ButtonHolderPanel(
+                Submit(
+                    'submit',
+                    _('Apply'),
+                ),
+                css_class='text-right',
+            ),
+        )
+    )
+    
+    return helper
+
+def copy_month_helper(form_tag=True):
+    """
+    DatebookCopyForm form layout helper
+    """
+    helper = FormHelper()
+    helper.form_action = '.'
+    helper.attrs = {'data_abide': ''}
+    helper.form_tag = form_tag
+    
+    # Build the full layout
+    helper.layout = Layout(
+        SimpleRowColumn('target'),
+        Row(
+            Column('with_content', css_class='small-12 medium-6'),
+            Column('with_vacations', css_class='small-12 medium-6'),
+        ),
+        SimpleRowColumn(
+            ButtonHolderPanel(
+                Submit(
+                    'submit',
+                    _('Copy'),
+                ),
+                css_class='text-right',
+            ),
+        )
+    )
+    
+    return helper
@@ -2,13 +2,16 @@
 """
 Forms for day forms
 """
+import datetime
+
 from django.conf import settings
 from django import forms
+from django.utils.dateparse import parse_date
 from django.utils.translation import ugettext as _
 
-from arrow import Arrow
-
+from datebook.bulk import DayEntryBulkEdit
 from datebook.models import DayEntry
+from datebook.validators import validate_day_start, validate_day_stop
 from datebook.forms import CrispyFormMixin
 from datebook.utils.imports import safe_import_module
 
@@ -62,24 +65,14 @@ class DayBaseFormMixin(object):
     
     def clean_start_datetime(self):
         start = self.cleaned_data['start_datetime']
-        # Day entry can't start before the targeted day date
-        if start and start.date() < self.daydate:
-            raise forms.ValidationError(_("You can't start a day before itself"))
-        # Day entry can't start after the targeted day date
-        if start and start.date() > self.daydate:
-            raise forms.ValidationError(_("You can't start a day after itself"))
+        validate_day_start(start, self.daydate)
         
         return start
     
     def clean_stop_datetime(self):
         start = self.cleaned_data.get('start_datetime')
         stop = self.cleaned_data['stop_datetime']
-        # Day entry can't stop before the start
-        if start and stop and stop <= start:
-            raise forms.ValidationError(_("Stop time can't be less or equal to start time"))
-        # Day entry can't stop in more than one futur day from the targeted day date
-        if stop and stop.date() > Arrow.fromdate(self.daydate).replace(days=1).date():
-            raise forms.ValidationError(_("Stop time can't be more than the next day"))
+        validate_day_stop(start, stop, self.daydate)
         
         return stop
     
@@ -167,3 +160,98 @@ class DayEntryCreateForm(DayEntryForm):
             raise forms.ValidationError(_("This day entry has allready been created"))
             
         return cleaned_data
+
+
+class DayEntryBulkForm(CrispyFormMixin, forms.Form):
+    """
+    Form to do an operation on several days at once
+    
+    Days are the ones from the date range and/or the dates list, they can be 
+    from any month.
+    """
+    crispy_form_helper_path = 'datebook.forms.crispies.bulk_day_helper'
+    
+    OPERATION_CHOICES = (
+        ('vacation', _('Mark as vacation')),
+        ('delete', _('Remove')),
+        ('shift', _('Shift start and stop times')),
+        ('times', _('Set pause and/or overtime')),
+    )
+    
+    start = forms.DateField(label=_('start'), required=False)
+    end = forms.DateField(label=_('end'), required=False)
+    dates = forms.CharField(label=_('dates'), required=False, help_text=_('Dates in YYYY-MM-DD format separated with commas.'))
+    operation = forms.ChoiceField(label=_('operation'), choices=OPERATION_CHOICES)
+    shift = forms.IntegerField(label=_('shift'), required=False, help_text=_('Minutes to add to start and stop times, negative to substract them.'))
+    pause = forms.TimeField(label=_('pause'), required=False, input_formats=DATETIME_FORMATS['input_time_formats'])
+    overtime = forms.TimeField(label=_('overtime'), required=False, input_formats=DATETIME_FORMATS['input_time_formats'])
+    
+    def __init__(self, author, *args, **kwargs):
+        self.author = author
+        
+        super(DayEntryBulkForm, self).__init__(*args, **kwargs)
+        super(forms.Form, self).__init__(*args, **kwargs)
+    
+    def clean_dates(self):
+        dates = []
+        for item in self.cleaned_data.get('dates', '').replace(' ', ',').split(','):
+            if not item:
+                continue
+            try:
+                value = parse_date(item)
+            except ValueError:
+                value = None
+            if value is None:
+                raise forms.ValidationError(_("'%(value)s' is not a valid date") % {'value': item})
+            dates.append(value)
+        
+        return dates
+    
+    def clean(self):
+        cleaned_data = super(DayEntryBulkForm, self).clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+        operation = cleaned_data.get('operation')
+        
+        days = set(cleaned_data.get('dates') or [])
+        if start or end:
+            if not (start and end):
+                raise forms.ValidationError(_("Both start and end dates are required for a date range"))
+            if start > end:
+                raise forms.ValidationError(_("Start date must be before end date"))
+            if (end-start).days >= settings.DATEBOOK_BULK_MAX_DAYS:
+                raise forms.ValidationError(_("Date range can't be longer than %(days)s days") % {'days': settings.DATEBOOK_BULK_MAX_DAYS})
+            days.update([start+datetime.timedelta(days=i) for i in range((end-start).days+1)])
+        if not days and 'dates' in cleaned_data:
+            raise forms.ValidationError(_("Select at least a date range or some dates"))
+        if len(days) > settings.DATEBOOK_BULK_MAX_DAYS:
+            raise forms.ValidationError(_("You can't select more than %(days)s days") % {'days': settings.DATEBOOK_BULK_MAX_DAYS})
+        cleaned_data['days'] = days
+        
+        if operation == 'shift':
+            if cleaned_data.get('shift') is None:
+                if 'shift' not in self.errors:
+                    self.add_error('shift', _("This field is required for this operation"))
+            elif cleaned_data['shift'] == 0:
+                self.add_error('shift', _("Shift can't be zero"))
+        if operation == 'times' and cleaned_data.get('pause') is None and cleaned_data.get('overtime') is None:
+            raise forms.ValidationError(_("Pause or overtime is required for this operation"))
+        
+        return cleaned_data
+    
+    def save(self, *args, **kwargs):
+        """
+        Do the operation on the selected days
+        
+        Return the bulk edit with its counters, a ValidationError is raised if 
+        shifted times are invalid for some days.
+        """
+        operation = self.cleaned_data['operation']
+        bulk = DayEntryBulkEdit(self.author, self.cleaned_data['days'])
+        if operation == 'vacation':
+            return bulk.mark_vacation()
+        elif operation == 'delete':
+            return bulk.delete()
+        elif operation == 'shift':
+            return bulk.shift(datetime.timedelta(minutes=self.cleaned_data['shift']))
+        return bulk.set_times(pause=self.cleaned_data['pause'], overtime=self.cleaned_data['overtime'])
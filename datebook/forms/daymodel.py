@@ -2,15 +2,17 @@
 """
 Forms for day forms
 """
-import datetime
-
 from django import forms
+from django.conf import settings
+from django.db import transaction
+from django.utils.dates import WEEKDAYS
 from django.utils.translation import ugettext as _
-from django.utils.timezone import now as tz_now, make_aware, utc, get_current_timezone, localtime, is_naive, pytz
 
-from datebook.models import DayEntry, DayModel
+from datebook.models import Datebook, DatebookSummary, DayEntry, DayModel, coalesced_touches
 from datebook.forms.day import DATETIME_FORMATS, DayBaseFormMixin
 from datebook.forms import CrispyFormMixin
+from datebook.schedules import DayModelSchedule, iter_schedule_dates
+from datebook.utils.timezones import combine_local, get_walltime
 
 class DayToDayModelForm(DayBaseFormMixin, CrispyFormMixin, forms.ModelForm):
     """
@@ -77,31 +79,19 @@ class AssignDayModelForm(CrispyFormMixin, forms.Form):
         self.fields['daymodel'] = forms.ModelChoiceField(queryset=self.daymodels_queryset, required=True)
         self.fields['with_content'] = forms.BooleanField(label=_('Use the model\'s content text'), required=False)
 
-    def combine_day_and_daymodel_time(self, day_start, daymodel_start, daymodel_delta):
+    def combine_day_and_daymodel_time(self, day_date, daymodel_start, daymodel_delta):
         """
-        Combine the day date with the daymodel start time, then calcul the stop 
-        from the start date and the given delta time (between daymodel start and 
-        stop time)
+        Combine the day date with the daymodel start wall-clock time, then calcul 
+        the stop from the start date and the given delta time (between daymodel 
+        start and stop time)
         
         This way we have clean datetimes, correctly calculated with the right 
-        day date and daymodel time.
+        day date and daymodel time, whatever is the daylight season of the day 
+        and the daymodel.
         
         Return the calculated start and stop datetimes
         """
-        if not isinstance(day_start, datetime.date):
-            combined_date = datetime.datetime.combine(day_start.date(), daymodel_start.time())
-        else:
-            combined_date = datetime.datetime.combine(day_start, daymodel_start.time())
-        
-        # Combine day date and daymodel time
-        combined_date = datetime.datetime.combine(day_start, daymodel_start.time())
-        start = make_aware(combined_date, utc)
-        
-        # Adapt day hour to daylight if needed, we get the offset time for the day date, 
-        # substract it the time diff between daylight seasons, then substract the result 
-        # to the day date
-        day_dst = (make_aware(datetime.datetime(day_start.year, day_start.month, day_start.day), self.current_tz).utcoffset())-self.seasons_offset
-        start = start-day_dst
+        start = combine_local(day_date, get_walltime(daymodel_start))
         
         return (
             start,
@@ -109,62 +99,120 @@ class AssignDayModelForm(CrispyFormMixin, forms.Form):
         )
 
     def save(self, *args, **kwargs):
+        """
+        Fill the selected days from the day model
+        
+        Existing entries are updated with a single query and the missing ones 
+        are bulk created, so the query count does not depend on the number of 
+        selected days.
+        """
         daymodel = self.cleaned_data['daymodel']
         with_content = self.cleaned_data['with_content']
         daymodel_delta = daymodel.stop - daymodel.start
         # Bind datetime for each days using datebook period as the base date
-        daydates = [self.daydate.replace(day=int(item)) for item in self.cleaned_data['days']]
-        
-        # Get time dst for daylight seasons
-        self.current_tz = get_current_timezone()
-        self.winter_offset = make_aware(datetime.datetime(daymodel.start.year, 1, 1), self.current_tz).utcoffset()
-        self.summer_offset = make_aware(datetime.datetime(daymodel.start.year, 7, 1), self.current_tz).utcoffset()
-        self.seasons_offset = (self.summer_offset-self.winter_offset)
-        
-        # Fill existing entries
-        for entry in self.datebook.dayentry_set.filter(activity_date__in=daydates).order_by('activity_date'):
-            # Get the start/stop datetimes
-            goto_start, goto_stop = self.combine_day_and_daymodel_time(entry.start, daymodel.start, daymodel_delta)
-            
-            # Fill object attribute using the daymodel
-            entry.start = goto_start
-            entry.stop = goto_stop
-            entry.pause = daymodel.pause
-            entry.overtime = daymodel.overtime
-            if with_content:
-                entry.content = daymodel.content
-            entry.vacation = False # Allways remove the vacation
-            entry.save()
-            # Remove the day number from remaining selected days
-            i = self.cleaned_data['days'].index(str(entry.activity_date.day))
-            self.cleaned_data['days'].pop(i)
-        
-        # Create remaining selected days
-        new_days = []
-        for day_no in self.cleaned_data['days']:
-            activity_date = self.datebook.period.replace(day=int(day_no))
-
-            goto_start, goto_stop = self.combine_day_and_daymodel_time(activity_date, daymodel.start, daymodel_delta)
-            
-            content = ""
-            if with_content:
-                content = daymodel.content
+        daydates = set([self.daydate.replace(day=int(item)) for item in self.cleaned_data['days']])
+        
+        # Get the start/stop datetimes once for each day
+        day_times = dict([(item, self.combine_day_and_daymodel_time(item, daymodel.start, daymodel_delta)) for item in daydates])
+        
+        # Common values for all days, the vacation is allways removed
+        values = {
+            'pause': daymodel.pause,
+            'overtime': daymodel.overtime,
+            'vacation': False,
+            'elapsed_seconds': daymodel.get_elapsed_seconds(),
+            'overtime_seconds': daymodel.get_overtime_seconds(),
+        }
+        if with_content:
+            values['content'] = daymodel.content
+        
+        with transaction.atomic(), coalesced_touches():
+            # Update existing entries with their summary values to compute the delta
+            existing = dict([(item[0], item[1:]) for item in self.datebook.dayentry_set.filter(activity_date__in=daydates).values_list('pk', *DayEntry.SUMMARY_FIELDS)])
+            if existing:
+                changes = {}
+                for pk, summary_values in existing.items():
+                    start, stop = day_times[summary_values[1]]
+                    changes[pk] = {'start': start, 'stop': stop}
+                DayEntry.objects.update_each(changes, **values)
+                
+                DatebookSummary.objects.apply_delta(
+                    removed=existing.values(),
+                    added=[(self.datebook.id, item[1], False, values['elapsed_seconds'], values['overtime_seconds']) for item in existing.values()],
+                )
+                Datebook.objects.touch([self.datebook.id])
             
-            new_days.append(DayEntry(
-                datebook=self.datebook,
-                activity_date=activity_date,
-                start=goto_start,
-                stop=goto_stop,
-                pause=daymodel.pause,
-                overtime=daymodel.overtime,
-                content=content,
-                vacation=False,
-            ))
-        # Bulk create all new days
-        if new_days:
-            DayEntry.objects.bulk_create(new_days)
-        # Update the datebook because model save method is not triggered with bulk creating
-        self.datebook.modified = tz_now()
-        self.datebook.save()
+            # Create remaining selected days
+            existing_dates = set([item[1] for item in existing.values()])
+            new_days = []
+            for activity_date in sorted(daydates - existing_dates):
+                start, stop = day_times[activity_date]
+                new_days.append(DayEntry(
+                    datebook=self.datebook,
+                    activity_date=activity_date,
+                    start=start,
+                    stop=stop,
+                    pause=daymodel.pause,
+                    overtime=daymodel.overtime,
+                    content=daymodel.content if with_content else "",
+                    vacation=False,
+                ))
+            # Bulk create all new days, the queryset fills their denormalized seconds,
+            # summaries and touches their datebook
+            if new_days:
+                DayEntry.objects.bulk_create(new_days)
         
         return None
+
+
+class DayModelScheduleForm(CrispyFormMixin, forms.Form):
+    """
+    Form to apply a DayModel on the days of a date range from a recurrence
+    """
+    crispy_form_helper_path = 'datebook.forms.crispies.schedule_daymodel_helper'
+    
+    start = forms.DateField(label=_('start'))
+    end = forms.DateField(label=_('end'))
+    weekdays = forms.MultipleChoiceField(label=_('weekdays'), choices=sorted(WEEKDAYS.items()), initial=[0, 1, 2, 3, 4], required=False, widget=forms.CheckboxSelectMultiple, help_text=_('Leave empty to use all days.'))
+    every = forms.IntegerField(label=_('every'), min_value=1, initial=1, help_text=_('Interval in days from the start date.'))
+    with_content = forms.BooleanField(label=_('Use the model\'s content text'), required=False)
+    skip_existing = forms.BooleanField(label=_('Skip existing days'), initial=True, required=False)
+    skip_vacations = forms.BooleanField(label=_('Skip vacation days'), initial=True, required=False)
+    
+    def __init__(self, *args, **kwargs):
+        self.daymodel = kwargs.pop('daymodel')
+        
+        super(DayModelScheduleForm, self).__init__(*args, **kwargs)
+        super(forms.Form, self).__init__(*args, **kwargs)
+    
+    def clean(self):
+        cleaned_data = super(DayModelScheduleForm, self).clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+        if start and end:
+            if start > end:
+                raise forms.ValidationError(_("Start date must be before end date"))
+            if (end-start).days >= settings.DATEBOOK_SCHEDULE_MAX_DAYS:
+                raise forms.ValidationError(_("Date range can't be longer than %(days)s days") % {'days': settings.DATEBOOK_SCHEDULE_MAX_DAYS})
+        
+        return cleaned_data
+    
+    def save(self, *args, **kwargs):
+        """
+        Apply the day model on the matching days
+        
+        Return the schedule with its counters
+        """
+        dates = iter_schedule_dates(
+            self.cleaned_data['start'],
+            self.cleaned_data['end'],
+            weekdays=[int(item) for item in self.cleaned_data['weekdays']],
+            every=self.cleaned_data['every'],
+        )
+        schedule = DayModelSchedule(
+            self.daymodel,
+            with_content=self.cleaned_data['with_content'],
+            skip_existing=self.cleaned_data['skip_existing'],
+            skip_vacations=self.cleaned_data['skip_vacations'],
+        )
+        return schedule.run(dates)
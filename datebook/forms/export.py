@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Forms for exports and imports
+"""
+from django import forms
+from django.contrib.auth.models import User
+from django.utils.translation import ugettext as _
+
+class DayEntryExportForm(forms.Form):
+    """
+    Day entries export date range, both bounds are optional and included
+    """
+    start = forms.DateField(label=_('start'), required=False)
+    end = forms.DateField(label=_('end'), required=False)
+    
+    def clean(self):
+        cleaned_data = super(DayEntryExportForm, self).clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError(_("Start date must be before end date"))
+        
+        return cleaned_data
+
+
+class DayEntryImportForm(forms.Form):
+    """
+    Day entries import file
+    """
+    FORMAT_CHOICES = (
+        ('', _('Guess from the file extension')),
+        ('csv', 'CSV'),
+        ('ics', 'iCalendar'),
+    )
+    
+    source = forms.FileField(label=_('file'))
+    file_format = forms.ChoiceField(label=_('format'), choices=FORMAT_CHOICES, required=False)
+    author = forms.CharField(label=_('author'), required=False, help_text=_('Username of the author for rows without author, required for iCalendar files.'))
+    
+    def clean_author(self):
+        author = self.cleaned_data.get('author')
+        if author and not User.objects.filter(username=author).exists():
+            raise forms.ValidationError(_("This user does not exist"))
+        
+        return author
+    
+    def clean(self):
+        cleaned_data = super(DayEntryImportForm, self).clean()
+        source = cleaned_data.get('source')
+        if source and not cleaned_data.get('file_format'):
+            extension = source.name.rsplit('.', 1)[-1].lower()
+            if extension not in ('csv', 'ics'):
+                raise forms.ValidationError(_("Unable to guess the file format, select it"))
+            cleaned_data['file_format'] = extension
+        if cleaned_data.get('file_format') == 'ics' and not cleaned_data.get('author'):
+            raise forms.ValidationError(_("Author is required for iCalendar files"))
+        
+        return cleaned_data
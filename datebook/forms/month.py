@@ -4,13 +4,16 @@ Forms for month forms
 """
 from django.conf import settings
 from django import forms
+from django.db import transaction
 from django.utils.translation import ugettext as _
 
 from crispy_forms.helper import FormHelper
 
-from datebook.models import Datebook
+from datebook.models import Datebook, DayEntry, coalesced_touches
 from datebook.forms import CrispyFormMixin
+from datebook.utils import get_matching_weekday
 from datebook.utils.imports import safe_import_module
+from datebook.utils.timezones import combine_local, get_walltime
 
 class DatebookForm(CrispyFormMixin, forms.Form):
     """
@@ -20,10 +23,16 @@ class DatebookForm(CrispyFormMixin, forms.Form):
     
     def __init__(self, *args, **kwargs):
         self.available_users = kwargs.pop('available_users', [])
+        self.owner_autocomplete_url = kwargs.pop('owner_autocomplete_url', None)
         super(DatebookForm, self).__init__(*args, **kwargs)
         super(forms.Form, self).__init__(*args, **kwargs)
         
-        self.fields['owner'] = forms.ModelChoiceField(label=_('owner'), queryset=self.available_users, empty_label=None)
+        # Owner is given by its username from a text input with autocompletion, 
+        # because available users can be too many to be all rendered in a select
+        owner_attrs = {'list': 'datebook-owner-choices', 'autocomplete': 'off'}
+        if self.owner_autocomplete_url:
+            owner_attrs['data-autocomplete-url'] = self.owner_autocomplete_url
+        self.fields['owner'] = forms.ModelChoiceField(label=_('owner'), queryset=self.available_users, to_field_name='username', empty_label=None, widget=forms.TextInput(attrs=owner_attrs))
         self.fields['period'] = forms.DateField(label=_('period'))
     
     def clean_period(self):
@@ -71,3 +80,82 @@ class DatebookNotesForm(CrispyFormMixin, forms.ModelForm):
     class Meta:
         model = Datebook
         fields = ['notes']
+
+
+class DatebookCopyForm(CrispyFormMixin, forms.Form):
+    """
+    Form to copy the day entries of a datebook to another month
+    
+    Each entry is copied on the same weekday occurrence of the target month 
+    (like the second tuesday), existing days of the target month are never 
+    overwrited.
+    """
+    crispy_form_helper_path = 'datebook.forms.crispies.copy_month_helper'
+    
+    target = forms.DateField(label=_('target month'))
+    with_content = forms.BooleanField(label=_('Copy the content texts'), initial=True, required=False)
+    with_vacations = forms.BooleanField(label=_('Copy the vacation days'), required=False)
+    
+    def __init__(self, datebook, *args, **kwargs):
+        self.datebook = datebook
+        self.created = 0
+        self.skipped = 0
+        
+        super(DatebookCopyForm, self).__init__(*args, **kwargs)
+        super(forms.Form, self).__init__(*args, **kwargs)
+    
+    def clean_target(self):
+        target = self.cleaned_data['target'].replace(day=1)
+        if target == self.datebook.period:
+            raise forms.ValidationError(_("Target month must be another month"))
+        
+        return target
+    
+    def save(self, *args, **kwargs):
+        """
+        Copy the entries with a single bulk create
+        
+        Start and stop are combined from the target days and the entries 
+        wall-clock times, so they are right whatever is the daylight season 
+        of the target month.
+        
+        Return the target datebook, created if needed
+        """
+        target = self.cleaned_data['target']
+        with_content = self.cleaned_data['with_content']
+        
+        entries = self.datebook.dayentry_set.order_by('activity_date').values('activity_date', 'start', 'stop', 'pause', 'overtime', 'vacation', 'content')
+        if not self.cleaned_data['with_vacations']:
+            entries = entries.filter(vacation=False)
+        
+        with transaction.atomic(), coalesced_touches():
+            datebooks, created = Datebook.objects.bulk_get_or_create([(self.datebook.author_id, target)])
+            target_datebook = datebooks[(self.datebook.author_id, target)]
+            existing = set(target_datebook.dayentry_set.values_list('activity_date', flat=True))
+            
+            new_days = []
+            for values in entries:
+                activity_date = get_matching_weekday(values['activity_date'], target)
+                if activity_date is None or activity_date in existing:
+                    self.skipped += 1
+                    continue
+                existing.add(activity_date)
+                
+                start = combine_local(activity_date, get_walltime(values['start']))
+                new_days.append(DayEntry(
+                    datebook=target_datebook,
+                    activity_date=activity_date,
+                    start=start,
+                    stop=start+(values['stop']-values['start']),
+                    pause=values['pause'],
+                    overtime=values['overtime'],
+                    vacation=values['vacation'],
+                    content=values['content'] if with_content else "",
+                ))
+            # The queryset fills their denormalized seconds, summaries and 
+            # touches their datebook
+            if new_days:
+                DayEntry.objects.bulk_create(new_days)
+                self.created = len(new_days)
+        
+        return target_datebook
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic datas generator for load and scaling tests
+
+Users are generated with their day models and datebooks for each month of some
+years, filled with realistic day entries (worked days, vacation weeks,
+overtimes and text contents in reStructuredText). Generated datas only depend
+on the given options and seed, with a given start year since the default one
+ends the datebooks with the current year.
+
+Everything is written with bulk creates by batches of months, each batch in
+its own transaction. Summaries are computed from the generated values instead
+of being updated with deltas.
+"""
+import datetime
+import json
+import random
+import calendar
+
+from django.conf import settings
+from django.db import transaction
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils.timezone import now as tz_now
+
+from datebook import utils
+from datebook.models import Datebook, DatebookSummary, DayEntry, DayModel
+from datebook.utils.timezones import combine_local
+
+# Texts picked to build day contents
+CONTENT_TASKS = (
+    u"Worked on the ``{project}`` project",
+    u"Meeting with the **{project}** team",
+    u"Code review for ``{project}``",
+    u"Fixed some bugs reported on *{project}*",
+    u"Wrote documentation for ``{project}``",
+    u"Deployed ``{project}`` on the staging server",
+    u"Support for *{project}* customers",
+)
+CONTENT_PROJECTS = (u'datebook', u'intranet', u'shop', u'api', u'website', u'mobile app')
+
+# Day models for each user as tuples (TITLE, START, STOP, PAUSE)
+DAY_MODELS = (
+    (u'Standard day', datetime.time(9, 0), datetime.time(18, 0), datetime.time(1, 0)),
+    (u'Short day', datetime.time(9, 0), datetime.time(13, 0), datetime.time(0, 0)),
+    (u'Long day', datetime.time(8, 0), datetime.time(20, 0), datetime.time(1, 30)),
+)
+
+
+class DatebookGenerator(object):
+    """
+    Generate users with their day models, datebooks and day entries
+
+    Usernames are made from the prefix and the user number. After 'run',
+    'users', 'datebooks' and 'entries' are the counters of created objects.
+    """
+    def __init__(self, users=10, years=1, start_year=None, seed=0, prefix='generated',
+                 password=None, batch_size=None):
+        self.users_count = users
+        self.years = years
+        self.start_year = start_year or (datetime.date.today().year-years+1)
+        self.seed = seed
+        self.prefix = prefix
+        self.password = password
+        self.batch_size = batch_size or settings.DATEBOOK_GENERATOR_BATCH_SIZE
+        self.users = 0
+        self.datebooks = 0
+        self.entries = 0
+
+    def get_usernames(self):
+        width = len(str(self.users_count))
+        return ['{0}{1}'.format(self.prefix, str(i).zfill(width)) for i in range(1, self.users_count+1)]
+
+    def get_periods(self):
+        return [datetime.date(year, month, 1) for year in range(self.start_year, self.start_year+self.years) for month in range(1, 13)]
+
+    def create_users(self):
+        """
+        Create the users with their day models, return their ids ordered on
+        their usernames
+        """
+        usernames = self.get_usernames()
+        # Hashing is slow so the same hash is used for all users
+        password = make_password(self.password)
+        User.objects.bulk_create([User(username=username, email='{0}@localhost'.format(username), password=password) for username in usernames])
+        author_ids = list(User.objects.filter(username__in=usernames).order_by('username').values_list('id', flat=True))
+        self.users += len(author_ids)
+
+        daymodels = []
+        for author_id in author_ids:
+            for title, start, stop, pause in DAY_MODELS:
+                day = datetime.date(self.start_year, 1, 1)
+                daymodels.append(DayModel(author_id=author_id, title=title, start=combine_local(day, start), stop=combine_local(day, stop), pause=pause))
+        DayModel.objects.bulk_create(daymodels)
+
+        return author_ids
+
+    def get_vacations(self, rand, year):
+        """
+        Return the set of vacation days for a year: some whole weeks and a few
+        single days
+        """
+        days = set()
+        for week in rand.sample(range(1, 52), 5):
+            monday = datetime.datetime.strptime('{0} {1} 1'.format(year, week), '%Y %W %w').date()
+            days.update([monday+datetime.timedelta(days=i) for i in range(0, 5)])
+        for i in range(0, 4):
+            days.add(datetime.date(year, 1, 1)+datetime.timedelta(days=rand.randint(0, 364)))
+        return days
+
+    def get_content(self, rand):
+        project = rand.choice(CONTENT_PROJECTS)
+        tasks = rand.sample(CONTENT_TASKS, rand.randint(1, 3))
+        return u'\n'.join([u'* {0}'.format(item.format(project=project)) for item in tasks])
+
+    def generate_month(self, rand, period, vacations):
+        """
+        Return the list of day entries values dicts for a month
+        """
+        entries = []
+        for dayno in range(1, calendar.monthrange(period.year, period.month)[1]+1):
+            day = period.replace(day=dayno)
+            # Week-end days are rarely worked
+            if day.weekday() > 4 and rand.random() > 0.02:
+                continue
+            # Some days are not filled
+            if rand.random() < 0.05:
+                continue
+
+            vacation = day in vacations
+            start = datetime.time(rand.randint(8, 9), rand.choice((0, 15, 30, 45)))
+            duration = datetime.timedelta(minutes=rand.randint(30, 40)*15)
+            overtime = datetime.time(0, 0)
+            if not vacation and rand.random() < 0.15:
+                overtime = datetime.time(rand.randint(0, 1), rand.choice((15, 30, 45)))
+
+            start = combine_local(day, start)
+            entries.append({
+                'activity_date': day,
+                'start': start,
+                'stop': start+duration,
+                'pause': datetime.time(rand.randint(0, 1), rand.choice((0, 30))),
+                'overtime': overtime,
+                'vacation': vacation,
+                'content': u'' if vacation else self.get_content(rand),
+            })
+        return entries
+
+    def write_batch(self, months):
+        """
+        Write the datebooks, day entries and summaries for the given months,
+        a list of tuples ``(AUTHOR_ID, PERIOD, NOTES, ENTRIES)``
+        """
+        now = tz_now()
+        with transaction.atomic():
+            Datebook.objects.bulk_create([Datebook(author_id=author_id, period=period, notes=notes, created=now, modified=now) for author_id, period, notes, entries in months])
+            author_ids = set([item[0] for item in months])
+            periods = set([item[1] for item in months])
+            datebook_ids = dict([((author_id, period), pk) for pk, author_id, period in Datebook.objects.filter(author_id__in=author_ids, period__in=periods).values_list('id', 'author_id', 'period')])
+
+            objs, summaries = [], []
+            for author_id, period, notes, entries in months:
+                datebook_id = datebook_ids[(author_id, period)]
+                month_objs = [DayEntry(datebook_id=datebook_id, **values) for values in entries]
+                for obj in month_objs:
+                    obj.set_seconds()
+                objs.extend(month_objs)
+
+                summary = DatebookSummary(datebook_id=datebook_id)
+                summary.set_totals(*utils.summarize_day_values(period.year, period.month, [obj.get_summary_values()[1:] for obj in month_objs]))
+                summary.weeks = json.dumps(summary.get_weeks_totals())
+                summaries.append(summary)
+
+            # Summaries don't exist yet so no delta is applied
+            DayEntry.objects.bulk_create(objs)
+            DatebookSummary.objects.bulk_create(summaries)
+
+        self.datebooks += len(months)
+        self.entries += len(objs)
+
+    def run(self):
+        """
+        Generate all the datas
+        """
+        rand = random.Random(self.seed)
+        periods = self.get_periods()
+
+        batch, batch_entries = [], 0
+        for author_id in self.create_users():
+            vacations = set()
+            for year in range(self.start_year, self.start_year+self.years):
+                vacations.update(self.get_vacations(rand, year))
+
+            for period in periods:
+                entries = self.generate_month(rand, period, vacations)
+                notes = self.get_content(rand) if rand.random() < 0.2 else u''
+                batch.append((author_id, period, notes, entries))
+                batch_entries += len(entries)
+                if batch_entries >= self.batch_size:
+                    self.write_batch(batch)
+                    batch, batch_entries = [], 0
+        if batch:
+            self.write_batch(batch)
+
+        return self
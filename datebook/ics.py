@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+iCalendar feeds of day entries
+
+Each day entry is an event, events are serialized in a block for each datebook
+that is cached for the datebook version, so a feed is assembled from the
+cached blocks and only the modified datebooks are serialized again.
+"""
+from django.conf import settings
+from django.core import signing
+from django.core.urlresolvers import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.encoding import force_text
+from django.utils.http import urlencode
+from django.utils.timezone import is_aware, utc
+from django.utils.translation import get_language, ugettext as _
+
+from datebook.models import DayEntry
+from datebook.utils import format_seconds_to_clock
+from datebook.utils.cache import get_datebook_cache, get_version_key, make_cache_key
+
+# Maximum length in octets of content lines
+LINE_LENGTH = 75
+
+FEED_TOKEN_SALT = 'datebook.ics'
+
+
+def get_feed_token(username):
+    """
+    Return the token for feeds of the given author, calendar clients can't
+    log in so they use it instead
+    """
+    return signing.Signer(salt=FEED_TOKEN_SALT).signature(username)
+
+
+def check_feed_token(username, token):
+    return constant_time_compare(get_feed_token(username), token or '')
+
+
+def get_feed_url(username, year=None):
+    """
+    Return the feed url with its token for the given author, and year if given
+    """
+    if year:
+        url = reverse('datebook:year-calendar-feed', kwargs={'author': username, 'year': year})
+    else:
+        url = reverse('datebook:author-calendar-feed', kwargs={'author': username})
+    return '{0}?{1}'.format(url, urlencode({'token': get_feed_token(username)}))
+
+
+def escape_text(value):
+    """
+    Escape a text value
+    """
+    value = force_text(value)
+    for char, escaped in (('\\', '\\\\'), (';', '\\;'), (',', '\\,'), ('\r\n', '\\n'), ('\n', '\\n')):
+        value = value.replace(char, escaped)
+    return value
+
+
+def fold_line(line):
+    """
+    Fold a content line on lines of 'LINE_LENGTH' octets, without breaking
+    multibyte characters
+    """
+    lines, current, length = [], [], 0
+    for char in line:
+        size = len(char.encode('utf-8'))
+        if length + size > LINE_LENGTH:
+            lines.append(u''.join(current))
+            # Continuation lines start with a space
+            current, length = [u' '], 1
+        current.append(char)
+        length += size
+    lines.append(u''.join(current))
+    return u'\r\n'.join(lines)
+
+
+def format_datetime(value):
+    """
+    Format a datetime in UTC
+    """
+    if is_aware(value):
+        value = value.astimezone(utc)
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def serialize_dayentry(values, dtstamp):
+    """
+    Return the VEVENT lines for the given day entry values
+    """
+    if values['vacation']:
+        summary = _('Vacation')
+    else:
+        summary = _('%(time)sh worked') % {'time': format_seconds_to_clock(values['elapsed_seconds'])}
+
+    lines = [
+        u'BEGIN:VEVENT',
+        u'UID:dayentry-{0}@datebook'.format(values['id']),
+        u'DTSTAMP:{0}'.format(dtstamp),
+        u'DTSTART:{0}'.format(format_datetime(values['start'])),
+        u'DTEND:{0}'.format(format_datetime(values['stop'])),
+        u'SUMMARY:{0}'.format(escape_text(summary)),
+    ]
+    if values['content']:
+        lines.append(u'DESCRIPTION:{0}'.format(escape_text(values['content'])))
+    # Extended properties to keep times that events don't have
+    lines.append(u'X-DATEBOOK-PAUSE:{0}'.format(values['pause'].strftime('%H:%M:%S')))
+    lines.append(u'X-DATEBOOK-OVERTIME:{0}'.format(values['overtime'].strftime('%H:%M:%S')))
+    # Summaries are translated, so vacations are also marked with a fixed value
+    lines.append(u'X-DATEBOOK-VACATION:{0}'.format('TRUE' if values['vacation'] else 'FALSE'))
+    lines.append(u'END:VEVENT')
+
+    return [fold_line(line) for line in lines]
+
+
+def serialize_datebooks(datebooks):
+    """
+    Return a dict of VEVENT blocks for the given datebooks, indexed on their ids
+
+    Day entries for all the given datebooks are getted from a single query.
+    """
+    blocks = dict([(item['id'], []) for item in datebooks])
+    dtstamps = dict([(item['id'], format_datetime(item['modified'])) for item in datebooks])
+
+    entries = DayEntry.objects.filter(datebook__in=blocks.keys()).order_by('activity_date').values(
+        'id', 'datebook_id', 'start', 'stop', 'pause', 'overtime', 'vacation', 'elapsed_seconds', 'content'
+    )
+    for values in entries.iterator():
+        blocks[values['datebook_id']].extend(serialize_dayentry(values, dtstamps[values['datebook_id']]))
+
+    return dict([(pk, u'\r\n'.join(lines)) for pk, lines in blocks.items()])
+
+
+def get_datebook_blocks(datebooks):
+    """
+    Return the list of VEVENT blocks for the given datebooks, from cache if
+    enabled
+
+    Datebooks are dicts with their 'id' and 'modified' values, only the ones
+    without a cached block for their version are serialized.
+    """
+    cache = get_datebook_cache()
+    if cache is None:
+        blocks = serialize_datebooks(datebooks)
+        return [blocks[item['id']] for item in datebooks]
+
+    language = get_language()
+    keys = dict([(item['id'], make_cache_key('ics', item['id'], get_version_key(item['modified']), language)) for item in datebooks])
+    cached = cache.get_many(keys.values())
+
+    missing = [item for item in datebooks if keys[item['id']] not in cached]
+    if missing:
+        blocks = serialize_datebooks(missing)
+        cache.set_many(dict([(keys[pk], block) for pk, block in blocks.items()]), settings.DATEBOOK_ICS_CACHE_TIMEOUT)
+        cached.update(dict([(keys[pk], block) for pk, block in blocks.items()]))
+
+    return [cached[keys[item['id']]] for item in datebooks]
+
+
+def build_feed(name, blocks):
+    """
+    Return the feed content from the given VEVENT blocks
+    """
+    lines = [
+        u'BEGIN:VCALENDAR',
+        u'VERSION:2.0',
+        u'PRODID:-//django-datebook//EN',
+        u'CALSCALE:GREGORIAN',
+        fold_line(u'X-WR-CALNAME:{0}'.format(escape_text(name))),
+    ]
+    lines.extend([block for block in blocks if block])
+    lines.append(u'END:VCALENDAR')
+
+    return u'\r\n'.join(lines)+u'\r\n'
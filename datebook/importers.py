@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+Day entries imports from CSV or iCalendar files
+
+Files are parsed as streams of rows, rows are validated and written by batches:
+each batch creates its missing datebooks then its day entries with bulk
+creates, in its own transaction. Invalid rows are collected as errors without
+stopping the import.
+"""
+import csv
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.forms import ValidationError
+from django.contrib.auth.models import User
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+from django.utils.encoding import force_text
+from django.utils.timezone import is_aware, is_naive, localtime, make_aware, utc
+from django.utils.translation import ugettext as _
+
+from datebook.models import Datebook, DayEntry
+from datebook.utils.imports import safe_import_module
+from datebook.validators import validate_day_start, validate_day_stop
+
+# Values for true booleans
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on')
+
+# Untranslated summary of vacation events from feeds
+VACATION_SUMMARY = 'Vacation'
+
+
+def iter_csv_rows(fileobj):
+    """
+    Yield rows as dicts with their line number, from a CSV file with a header
+
+    Columns are the same than exports: 'author', 'start', 'stop', 'pause',
+    'overtime', 'vacation' and an optional 'content'; other columns are
+    ignored.
+    """
+    reader = csv.DictReader(fileobj)
+    for row in reader:
+        row = dict([(key, force_text(value).strip()) for key, value in row.items() if key and value is not None])
+        row['line'] = reader.line_num
+        yield row
+
+
+def unfold_ics_lines(fileobj):
+    """
+    Yield unfolded content lines with their line number from an iCalendar file
+    """
+    current, current_no = None, 0
+    for lineno, line in enumerate(fileobj, start=1):
+        line = force_text(line).rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current_no, current
+        current, current_no = line, lineno
+    if current is not None:
+        yield current_no, current
+
+
+def unescape_ics_text(value):
+    for escaped, char in (('\\n', '\n'), ('\\N', '\n'), ('\\;', ';'), ('\\,', ','), ('\\\\', '\\')):
+        value = value.replace(escaped, char)
+    return value
+
+
+def parse_ics_datetime(value):
+    """
+    Parse an iCalendar datetime, UTC ones end with 'Z' and the other ones are
+    in the current timezone
+    """
+    parsed = datetime.datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        parsed = parsed.replace(tzinfo=utc)
+    return parsed
+
+
+def iter_ics_rows(fileobj, author=None):
+    """
+    Yield rows as dicts with their line number, for each event from an
+    iCalendar file
+
+    Events have no author, so the given one is used. Like in feeds, pause,
+    overtime and vacation are getted from the 'X-DATEBOOK-PAUSE',
+    'X-DATEBOOK-OVERTIME' and 'X-DATEBOOK-VACATION' properties. Events
+    without the vacation property are vacations when their summary is
+    'Vacation', untranslated or in the current language.
+    """
+    row = None
+    for lineno, line in unfold_ics_lines(fileobj):
+        name, sep, value = line.partition(':')
+        # Ignore parameters like timezones
+        name = name.split(';')[0].upper()
+
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            row = {'line': lineno, 'author': author}
+        elif row is None:
+            continue
+        elif name == 'END' and value.upper() == 'VEVENT':
+            yield row
+            row = None
+        elif name in ('DTSTART', 'DTEND'):
+            try:
+                row['start' if name == 'DTSTART' else 'stop'] = parse_ics_datetime(value)
+            except ValueError:
+                row[name.lower()] = value
+        elif name == 'DESCRIPTION':
+            row['content'] = unescape_ics_text(value)
+        elif name == 'SUMMARY':
+            row.setdefault('vacation', unescape_ics_text(value) in (VACATION_SUMMARY, _(VACATION_SUMMARY)))
+        # Extended properties from feeds
+        elif name in ('X-DATEBOOK-PAUSE', 'X-DATEBOOK-OVERTIME'):
+            row[name[len('X-DATEBOOK-'):].lower()] = value
+        elif name == 'X-DATEBOOK-VACATION':
+            row['vacation'] = (value.strip().upper() == 'TRUE')
+
+
+class DayEntryImporter(object):
+    """
+    Import day entries from rows
+
+    Rows are dicts with an 'author' username, 'start' and 'stop' datetimes,
+    'pause' and 'overtime' times, a 'vacation' boolean and a 'content'. They
+    can be strings that are parsed, datetimes without timezone are in the
+    current timezone.
+
+    After 'run', 'created' and 'datebooks_created' are the counters of
+    created objects and 'errors' the list of tuples ``(LINE, MESSAGES)`` for
+    invalid rows.
+    """
+    def __init__(self, author=None, batch_size=None):
+        self.author = author
+        self.batch_size = batch_size or settings.DATEBOOK_IMPORT_BATCH_SIZE
+        self.authors = {}
+        self.created = 0
+        self.datebooks_created = 0
+        self.errors = []
+        self.validation_helper = safe_import_module(settings.DATEBOOK_TEXT_VALIDATOR_HELPER_PATH)
+
+    def get_authors(self, usernames):
+        """
+        Return a dict of the users for the given usernames, users are getted
+        only once for all batches
+        """
+        missing = [item for item in usernames if item not in self.authors]
+        if missing:
+            for user in User.objects.filter(username__in=missing):
+                self.authors[user.username] = user
+        return dict([(item, self.authors[item]) for item in usernames if item in self.authors])
+
+    def parse_datetime(self, value):
+        if not isinstance(value, datetime.datetime):
+            value = parse_datetime(value or '')
+            if value is None:
+                raise ValidationError(_("Invalid datetime"))
+        if settings.USE_TZ and is_naive(value):
+            value = make_aware(value)
+        if is_aware(value):
+            value = localtime(value)
+        return value
+
+    def parse_boolean(self, value):
+        if isinstance(value, bool):
+            return value
+        return (value or '').lower() in TRUE_VALUES
+
+    def parse_date(self, value):
+        if not isinstance(value, datetime.date):
+            try:
+                value = parse_date(value or '')
+            except ValueError:
+                value = None
+            if value is None:
+                raise ValidationError(_("Invalid date"))
+        return value
+
+    def parse_time(self, value):
+        if not value:
+            return datetime.time(0, 0)
+        if not isinstance(value, datetime.time):
+            value = parse_time(value)
+            if value is None:
+                raise ValidationError(_("Invalid time"))
+        return value
+
+    def clean_row(self, row):
+        """
+        Return the cleaned values from the given row, raise a ValidationError
+        with all the errors if any
+        """
+        errors = []
+        cleaned = {
+            'author': row.get('author') or self.author,
+            'vacation': self.parse_boolean(row.get('vacation')),
+            'content': row.get('content') or '',
+        }
+        if not cleaned['author']:
+            errors.append(_("Author is missing"))
+
+        for name, parser in (('start', self.parse_datetime), ('stop', self.parse_datetime), ('pause', self.parse_time), ('overtime', self.parse_time)):
+            try:
+                cleaned[name] = parser(row.get(name))
+            except ValidationError as e:
+                errors.append(u'{0}: {1}'.format(name, u' '.join(e.messages)))
+
+        if 'start' in cleaned and 'stop' in cleaned:
+            # Activity date is optional since it can be getted from the start
+            try:
+                cleaned['activity_date'] = self.parse_date(row['activity_date']) if row.get('activity_date') else cleaned['start'].date()
+            except ValidationError as e:
+                errors.append(u'activity_date: {0}'.format(u' '.join(e.messages)))
+            else:
+                # Same rules than day forms
+                validators = (
+                    (validate_day_start, (cleaned['start'], cleaned['activity_date'])),
+                    (validate_day_stop, (cleaned['start'], cleaned['stop'], cleaned['activity_date'])),
+                )
+                for validator, args in validators:
+                    try:
+                        validator(*args)
+                    except ValidationError as e:
+                        errors.extend(e.messages)
+
+        if self.validation_helper is not None and cleaned['content']:
+            try:
+                cleaned['content'] = self.validation_helper(None, cleaned['content'])
+            except ValidationError as e:
+                errors.extend(e.messages)
+
+        if errors:
+            raise ValidationError(errors)
+        return cleaned
+
+    def get_datebooks(self, keys):
+        """
+        Return a dict of datebooks indexed on tuples ``(AUTHOR_ID, PERIOD)``
+        for the given keys, missing ones are bulk created with empty
+        summaries
+        """
+        datebooks, created = Datebook.objects.bulk_get_or_create(keys)
+        self.datebooks_created += len(created)
+        return datebooks
+
+    def import_batch(self, rows):
+        """
+        Validate the given rows and write their day entries
+        """
+        cleaned_rows = []
+        for row in rows:
+            try:
+                cleaned_rows.append((row.get('line'), self.clean_row(row)))
+            except ValidationError as e:
+                self.errors.append((row.get('line'), e.messages))
+
+        authors = self.get_authors(set([cleaned['author'] for line, cleaned in cleaned_rows]))
+        valid_rows = []
+        for line, cleaned in cleaned_rows:
+            if cleaned['author'] not in authors:
+                self.errors.append((line, [_("Author '%(username)s' does not exist") % {'username': cleaned['author']}]))
+                continue
+            cleaned['author_id'] = authors[cleaned['author']].id
+            cleaned['period'] = cleaned['activity_date'].replace(day=1)
+            valid_rows.append((line, cleaned))
+
+        if not valid_rows:
+            return
+
+        with transaction.atomic():
+            datebooks = self.get_datebooks(set([(cleaned['author_id'], cleaned['period']) for line, cleaned in valid_rows]))
+
+            # Existing entries for the same days
+            datebook_ids = [item.id for item in datebooks.values()]
+            dates = set([cleaned['activity_date'] for line, cleaned in valid_rows])
+            existing = set(DayEntry.objects.filter(datebook__in=datebook_ids, activity_date__in=dates).values_list('datebook_id', 'activity_date'))
+
+            entries = []
+            for line, cleaned in valid_rows:
+                datebook = datebooks[(cleaned['author_id'], cleaned['period'])]
+                key = (datebook.id, cleaned['activity_date'])
+                if key in existing:
+                    self.errors.append((line, [_("This day entry has allready been created")]))
+                    continue
+                existing.add(key)
+                entries.append(DayEntry(
+                    datebook=datebook,
+                    activity_date=cleaned['activity_date'],
+                    start=cleaned['start'],
+                    stop=cleaned['stop'],
+                    pause=cleaned['pause'],
+                    overtime=cleaned['overtime'],
+                    vacation=cleaned['vacation'],
+                    content=cleaned['content'],
+                ))
+
+            if entries:
+                DayEntry.objects.bulk_create(entries)
+                self.created += len(entries)
+
+    def run(self, rows):
+        """
+        Import the given rows by batches
+        """
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent load tests
+
+Simulated users run in threads, each one with its own test client logged in
+as a generated author (see 'datebook.generators') and its own database
+connection. They replay a weighted mix of scenarios on their datebooks, with
+urls reversed from their names so they follow the url map.
+
+Statement timings are recorded for each request, time spent in writes
+(``INSERT``, ``UPDATE``, ``DELETE`` and ``SELECT ... FOR UPDATE``) includes
+the time waiting for database locks, and requests failing on a lock timeout
+are counted apart.
+"""
+import random
+import sys
+import threading
+import time
+
+from django.db import connection, reset_queries, DatabaseError
+from django.core.urlresolvers import reverse
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from datebook.benchmarks import DatebookBenchmark, summarize_timings, get_dayentry_form_data, get_assign_daymodel_data
+from datebook.generators import DatebookGenerator
+from datebook.models import DayEntry, DayModel
+
+# Default weights of scenarios
+DEFAULT_MIX = (
+    ('month', 30),
+    ('day-form', 20),
+    ('day-submit', 15),
+    ('day-detail', 25),
+    ('assign', 10),
+)
+
+# Statements that can wait for locks
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def parse_mix(value):
+    """
+    Return the scenario weights from a string like ``month:30,assign:10``
+    """
+    mix = []
+    for item in value.split(','):
+        name, weight = item.split(':')
+        if name.strip() not in dict(DEFAULT_MIX):
+            raise ValueError("Unknown scenario '{0}'".format(name.strip()))
+        mix.append((name.strip(), int(weight)))
+    return tuple(mix)
+
+
+def is_write_statement(sql):
+    # Debug cursors log queries as "QUERY = '...' - PARAMS = ..." on SQLite
+    sql = sql.split("'", 1)[-1] if sql.startswith('QUERY = ') else sql
+    sql = sql.lstrip().upper()
+    return sql.startswith(WRITE_STATEMENTS) or (sql.startswith('SELECT') and 'FOR UPDATE' in sql)
+
+
+class ThreadClient(Client):
+    """
+    Test client for simulated users
+
+    The signal of request exceptions is received by the clients of all the
+    threads, so exceptions are stored on the client of the thread which
+    raised them to be re-raised from its request.
+    """
+    def store_exc_info(self, **kwargs):
+        client = getattr(threading.current_thread(), 'client', self)
+        client.exc_info = sys.exc_info()
+
+
+class SimulatedUser(threading.Thread):
+    """
+    Thread replaying random scenarios for an author
+
+    Results are the lists 'timings' of tuples ``(SCENARIO, SECONDS)``,
+    'write_timings' of write statements durations, and the dict 'errors' of
+    error counters for each scenario.
+    """
+    def __init__(self, loadtest, username, number):
+        super(SimulatedUser, self).__init__(name='datebook-loadtest-{0}'.format(number))
+        self.daemon = True
+        self.loadtest = loadtest
+        self.username = username
+        self.rand = random.Random('{0}-{1}'.format(loadtest.seed, number))
+        self.timings = []
+        self.write_timings = []
+        self.errors = {}
+        self.lock_errors = 0
+
+    def prepare(self):
+        """
+        Log in and get the days and day models of the author, called from the
+        main thread before the start
+        """
+        self.client = ThreadClient()
+        self.client.login(username=self.username, password=self.loadtest.password)
+        self.days = list(DayEntry.objects.filter(datebook__author__username=self.username).values_list('activity_date', flat=True))
+        self.daymodel_ids = list(DayModel.objects.filter(author__username=self.username).values_list('id', flat=True))
+        self.scenarios = []
+        for name, weight in self.loadtest.mix:
+            self.scenarios.extend([name]*weight)
+
+    def get_request(self, scenario):
+        """
+        Return a tuple ``(METHOD, URL, DATA, EXTRA, EXPECTED_STATUS)`` for a
+        scenario on a random day of the author
+        """
+        day = self.rand.choice(self.days)
+        kwargs = {'author': self.username, 'year': day.year, 'month': day.month}
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+        if scenario == 'month':
+            return 'get', reverse('datebook:month-detail', kwargs=kwargs), {}, {}, 200
+        elif scenario == 'assign':
+            days = self.rand.sample(range(1, 29), 5)
+            data = get_assign_daymodel_data(days, self.rand.choice(self.daymodel_ids))
+            return 'post', reverse('datebook:month-detail', kwargs=kwargs), data, {}, 302
+
+        kwargs['day'] = day.day
+        if scenario == 'day-form':
+            return 'get', reverse('datebook:day-edit', kwargs=kwargs), {}, ajax, 200
+        elif scenario == 'day-submit':
+            data = get_dayentry_form_data(day, submit='submit_and_next')
+            return 'post', reverse('datebook:day-edit', kwargs=kwargs), data, ajax, 302
+        return 'get', reverse('datebook:day-detail', kwargs=kwargs), {}, ajax, 200
+
+    def add_error(self, scenario, name):
+        key = '{0}: {1}'.format(scenario, name)
+        self.errors[key] = self.errors.get(key, 0)+1
+
+    def request(self, scenario):
+        method, url, data, extra, expected = self.get_request(scenario)
+        # Keep the thread connection log short
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            started = time.time()
+            try:
+                response = getattr(self.client, method)(url, data, **extra)
+            except DatabaseError as e:
+                if 'lock' in str(e).lower():
+                    self.lock_errors += 1
+                self.add_error(scenario, e.__class__.__name__)
+                return
+            except Exception as e:
+                self.add_error(scenario, e.__class__.__name__)
+                return
+            finally:
+                elapsed = time.time()-started
+                self.write_timings.extend([float(item['time']) for item in context.captured_queries if is_write_statement(item['sql'])])
+
+        self.timings.append((scenario, elapsed))
+        if response.status_code != expected:
+            self.add_error(scenario, 'status {0}'.format(response.status_code))
+
+    def run(self):
+        self.loadtest.start_event.wait()
+        try:
+            for i in range(0, self.loadtest.requests):
+                if self.loadtest.deadline and time.time() > self.loadtest.deadline:
+                    break
+                self.request(self.rand.choice(self.scenarios))
+        finally:
+            # Each thread has its own connection
+            connection.close()
+
+
+class DatebookLoadTest(object):
+    """
+    Run simulated users concurrently on generated datas, in the current
+    database
+
+    Each simulated user does 'requests' requests, or less if the 'duration'
+    in seconds is reached. Use 'run' to generate datas and run the load test,
+    results are in the 'results' dict.
+    """
+    def __init__(self, users=10, requests=50, duration=None, years=1, seed=0, mix=DEFAULT_MIX, prefix='loadtest'):
+        self.users = users
+        self.requests = requests
+        self.duration = duration
+        self.years = years
+        self.seed = seed
+        self.mix = mix
+        self.prefix = prefix
+        self.password = 'loadtest'
+        self.deadline = None
+        self.start_event = threading.Event()
+        self.results = {}
+
+    def get_meta(self):
+        meta = DatebookBenchmark(repeat=self.requests).get_meta()
+        meta.update({'users': self.users, 'requests': self.requests, 'duration': self.duration, 'mix': dict(self.mix)})
+        return meta
+
+    def generate(self):
+        started = time.time()
+        generator = DatebookGenerator(users=self.users, years=self.years, seed=self.seed, prefix=self.prefix, password=self.password).run()
+        self.usernames = generator.get_usernames()
+        return {
+            'users': generator.users,
+            'datebooks': generator.datebooks,
+            'entries': generator.entries,
+            'seed': self.seed,
+            'start_year': generator.start_year,
+            'seconds': round(time.time()-started, 3),
+        }
+
+    def get_stats(self, timings):
+        if not timings:
+            return {'runs': 0}
+        return summarize_timings(timings)
+
+    def run_users(self):
+        """
+        Start the simulated users together and return their results
+        """
+        users = [SimulatedUser(self, username, i) for i, username in enumerate(self.usernames)]
+        for user in users:
+            user.prepare()
+            user.start()
+
+        started = time.time()
+        if self.duration:
+            self.deadline = started+self.duration
+        self.start_event.set()
+        for user in users:
+            user.join()
+        seconds = time.time()-started
+
+        timings, write_timings, errors, lock_errors = [], [], {}, 0
+        for user in users:
+            timings.extend(user.timings)
+            write_timings.extend(user.write_timings)
+            lock_errors += user.lock_errors
+            for key, count in user.errors.items():
+                errors[key] = errors.get(key, 0)+count
+
+        all_timings = [item[1] for item in timings]
+        results = {
+            'users': len(users),
+            'seconds': round(seconds, 3),
+            'requests': len(all_timings),
+            'throughput': round(len(all_timings)/seconds, 3) if seconds else None,
+            'latency': self.get_stats(all_timings),
+            'scenarios': dict([(name, self.get_stats([item[1] for item in timings if item[0] == name])) for name, weight in self.mix]),
+            'errors': errors,
+            'database': {
+                'writes': self.get_stats(write_timings),
+                'write_seconds': round(sum(write_timings), 3),
+                'lock_errors': lock_errors,
+            },
+        }
+        return results
+
+    def run(self):
+        self.results = {'meta': self.get_meta()}
+        self.results['datas'] = self.generate()
+        self.results['load'] = self.run_users()
+        return self.results
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Command to run the benchmarks on generated datas in a test database
+"""
+import json
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from datebook.benchmarks import BenchmarkError, DatebookBenchmark
+
+
+class Command(BaseCommand):
+    help = "Run the benchmarks for views, writes, the calendar engine and utils on generated datas in a test database, results are written as JSON"
+    option_list = BaseCommand.option_list + (
+        make_option('--entries', dest='entries', type='int', default=1000,
+            help='Approximative number of day entries to generate, default is 1000.'),
+        make_option('--years', dest='years', type='int', default=1,
+            help='Number of years of datebooks for each generated user, default is 1.'),
+        make_option('--seed', dest='seed', type='int', default=0,
+            help='Seed for the datas generator, default is 0.'),
+        make_option('--repeat', dest='repeat', type='int', default=10,
+            help='Number of requests for each measure, default is 10.'),
+        make_option('--output', dest='output', default=None,
+            help='File path to write the JSON results, default is to write them to the standard output.'),
+    )
+
+    def handle(self, *args, **options):
+        # Benchmarks never touch the real database
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            benchmark = DatebookBenchmark(
+                entries=options['entries'],
+                years=options['years'],
+                seed=options['seed'],
+                repeat=options['repeat'],
+            )
+            results = benchmark.run()
+        except BenchmarkError as e:
+            raise CommandError(str(e))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        content = json.dumps(results, indent=4, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(content)
+        else:
+            self.stdout.write(content)
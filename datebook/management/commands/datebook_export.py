@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Command to export day entries as CSV
+"""
+import datetime
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from datebook.exports import get_export_authors, iter_dayentry_rows, iter_csv_lines
+
+
+class Command(BaseCommand):
+    help = "Export the day entries as CSV, for all authors or only for the given author(s)"
+    args = '[username username ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--start', dest='start', default=None,
+            help='Only export day entries from this date (YYYY-MM-DD).'),
+        make_option('--end', dest='end', default=None,
+            help='Only export day entries until this date (YYYY-MM-DD).'),
+        make_option('--output', dest='output', default=None,
+            help='File path to write the export, default is to write to the standard output.'),
+        make_option('--chunk-size', dest='chunk_size', type='int', default=None,
+            help='Number of day entries fetched by each query, default is from DATEBOOK_EXPORT_CHUNK_SIZE setting.'),
+    )
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("Invalid date '{0}', expected format is YYYY-MM-DD".format(value))
+
+    def handle(self, *args, **options):
+        start = self.parse_date(options['start'])
+        end = self.parse_date(options['end'])
+
+        rows = iter_dayentry_rows(get_export_authors(args), start=start, end=end, chunk_size=options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for line in iter_csv_lines(rows):
+                    output.write(line)
+        else:
+            for line in iter_csv_lines(rows):
+                self.stdout.write(line, ending='')
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Command to generate synthetic datas for load and scaling tests
+"""
+import time
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from datebook.generators import DatebookGenerator
+
+
+class Command(BaseCommand):
+    help = "Generate users with their day models, datebooks and day entries for load and scaling tests, generated datas only depend on the options when the start year is given"
+    option_list = BaseCommand.option_list + (
+        make_option('--users', dest='users', type='int', default=10,
+            help='Number of users to generate, default is 10.'),
+        make_option('--years', dest='years', type='int', default=1,
+            help='Number of years of datebooks for each user, default is 1.'),
+        make_option('--start-year', dest='start_year', type='int', default=None,
+            help='First year of datebooks, default is to end with the current year. Give it to get the same datas whatever is the current date.'),
+        make_option('--seed', dest='seed', type='int', default=0,
+            help='Seed for the random generator, default is 0.'),
+        make_option('--prefix', dest='prefix', default='generated',
+            help='Prefix for usernames, default is "generated".'),
+        make_option('--password', dest='password', default=None,
+            help='Password for all users, default is to not be able to log in.'),
+        make_option('--batch-size', dest='batch_size', type='int', default=None,
+            help='Minimum number of day entries written in each transaction, default is from DATEBOOK_GENERATOR_BATCH_SIZE setting.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['years'] < 1:
+            raise CommandError("Numbers of users and years must be at least 1")
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError("There are allready users with the '{0}' prefix, use another one".format(options['prefix']))
+
+        generator = DatebookGenerator(
+            users=options['users'],
+            years=options['years'],
+            start_year=options['start_year'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            password=options['password'],
+            batch_size=options['batch_size'],
+        )
+        started = time.time()
+        generator.run()
+
+        self.stdout.write("Created {0} users, {1} datebooks and {2} day entries in {3:.1f}s".format(
+            generator.users, generator.datebooks, generator.entries, time.time()-started
+        ))
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Command to import day entries from CSV or iCalendar files
+"""
+import os
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from datebook.importers import DayEntryImporter, iter_csv_rows, iter_ics_rows
+
+
+class Command(BaseCommand):
+    help = "Import day entries from CSV or iCalendar files, missing datebooks are created"
+    args = 'filepath [filepath ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--author', dest='author', default=None,
+            help='Username of the author for rows without author, required for iCalendar files.'),
+        make_option('--format', dest='format', default=None, type='choice', choices=['csv', 'ics'],
+            help='File format, default is to guess it from the file extension.'),
+        make_option('--batch-size', dest='batch_size', type='int', default=None,
+            help='Number of rows written in each transaction, default is from DATEBOOK_IMPORT_BATCH_SIZE setting.'),
+    )
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError("You must give at least one file path to import")
+
+        importer = DayEntryImporter(author=options['author'], batch_size=options['batch_size'])
+        for filepath in args:
+            file_format = options['format'] or os.path.splitext(filepath)[1][1:].lower()
+            if file_format not in ('csv', 'ics'):
+                raise CommandError("Unable to guess the format of '{0}', use the '--format' option".format(filepath))
+
+            with open(filepath, 'rb') as fileobj:
+                if file_format == 'csv':
+                    rows = iter_csv_rows(fileobj)
+                else:
+                    rows = iter_ics_rows(fileobj, author=options['author'])
+                errors_count = len(importer.errors)
+                importer.run(rows)
+
+            for line, messages in sorted(importer.errors[errors_count:]):
+                self.stderr.write(u"{0}:{1}: {2}".format(filepath, line, u' '.join(messages)))
+
+        self.stdout.write("{0} day entries and {1} datebooks have been created, {2} rows have errors".format(importer.created, importer.datebooks_created, len(importer.errors)))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Command to run a concurrent load test on generated datas in a test database
+"""
+import json
+import os
+import shutil
+import tempfile
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from datebook.loadtests import DatebookLoadTest, DEFAULT_MIX, parse_mix
+
+
+class Command(BaseCommand):
+    help = "Run simulated users concurrently on generated datas in a test database, results are written as JSON"
+    option_list = BaseCommand.option_list + (
+        make_option('--users', dest='users', type='int', default=10,
+            help='Number of simulated users, each one in its own thread, default is 10.'),
+        make_option('--requests', dest='requests', type='int', default=50,
+            help='Number of requests for each simulated user, default is 50.'),
+        make_option('--duration', dest='duration', type='float', default=None,
+            help='Maximum duration in seconds, default is to wait for all the requests.'),
+        make_option('--years', dest='years', type='int', default=1,
+            help='Number of years of datebooks for each generated user, default is 1.'),
+        make_option('--seed', dest='seed', type='int', default=0,
+            help='Seed for the datas generator and the scenarios, default is 0.'),
+        make_option('--mix', dest='mix', default=None,
+            help='Weights of the scenarios, default is "{0}".'.format(','.join(['{0}:{1}'.format(*item) for item in DEFAULT_MIX]))),
+        make_option('--output', dest='output', default=None,
+            help='File path to write the JSON results, default is to write them to the standard output.'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # Threads have their own connection, they can't share an in-memory 
+        # SQLite database so a temporary file is used
+        test_settings = connection.settings_dict['TEST']
+        old_test_name, tmp_dir = test_settings.get('NAME'), None
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db(old_test_name or ':memory:'):
+            tmp_dir = tempfile.mkdtemp()
+            test_settings['NAME'] = os.path.join(tmp_dir, 'datebook_loadtest.sqlite3')
+
+        # Load tests never touch the real database
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            loadtest = DatebookLoadTest(
+                users=options['users'],
+                requests=options['requests'],
+                duration=options['duration'],
+                years=options['years'],
+                seed=options['seed'],
+                mix=mix,
+            )
+            results = loadtest.run()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            test_settings['NAME'] = old_test_name
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        content = json.dumps(results, indent=4, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(content)
+        else:
+            self.stdout.write(content)
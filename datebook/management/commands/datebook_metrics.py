@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Command to time the month view of an author and dump the metrics
+"""
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import resolve, reverse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from datebook.metrics import registry, render_prometheus
+from datebook.models import Datebook
+
+
+class Command(BaseCommand):
+    help = "Render the month view of an author with the timing spans enabled and dump their histograms in the Prometheus text format"
+    args = 'username'
+    option_list = BaseCommand.option_list + (
+        make_option('--year', dest='year', type='int', default=None,
+            help='Year of the month to render, default is from the last datebook of the author.'),
+        make_option('--month', dest='month', type='int', default=None,
+            help='Month to render, default is from the last datebook of the author.'),
+        make_option('--repeat', dest='repeat', type='int', default=10,
+            help='Number of renderings, default is 10.'),
+        make_option('--output', dest='output', default=None,
+            help='File path to write the metrics, default is to write them to the standard output.'),
+    )
+
+    def get_datebook(self, author, year, month):
+        queryset = Datebook.objects.filter(author=author)
+        if year and month:
+            queryset = queryset.filter(period__year=year, period__month=month)
+        datebook = queryset.order_by('-period').first()
+        if datebook is None:
+            raise CommandError("No datebook to render for '{0}'".format(author.username))
+        return datebook
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("A single username is required")
+        try:
+            author = User.objects.get(username=args[0])
+        except User.DoesNotExist:
+            raise CommandError("User '{0}' does not exist".format(args[0]))
+        datebook = self.get_datebook(author, options['year'], options['month'])
+
+        url = reverse('datebook:month-detail', kwargs={'author': author.username, 'year': datebook.period.year, 'month': datebook.period.month})
+        match = resolve(url)
+        factory = RequestFactory()
+
+        registry.reset()
+        with override_settings(DATEBOOK_METRICS_ENABLED=True):
+            for i in range(0, options['repeat']):
+                request = factory.get(url)
+                request.user = author
+                response = match.func(request, *match.args, **match.kwargs)
+                if response.status_code != 200:
+                    raise CommandError("{0} responds {1}".format(url, response.status_code))
+
+        content = render_prometheus()
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(content)
+        else:
+            self.stdout.write(content, ending='')
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Command to rebuild datebook summaries from their day entries
+"""
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from datebook.models import Datebook, DatebookSummary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the datebook summaries from their day entries, for all datebooks or only for the given author(s)"
+    args = '[username username ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--missing', action='store_true', dest='missing', default=False,
+            help='Only build the missing summaries.'),
+    )
+
+    def handle(self, *args, **options):
+        queryset = Datebook.objects.all()
+        if args:
+            queryset = queryset.filter(author__username__in=args)
+
+        if options['missing']:
+            queryset = queryset.filter(summary__isnull=True)
+
+        counter = 0
+        for datebook in queryset.order_by('pk').iterator():
+            DatebookSummary.objects.rebuild(datebook)
+            counter += 1
+
+        self.stdout.write("{0} summaries have been rebuilded".format(counter))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Timing metrics for the hot paths
+
+Named timing spans are observed into in-process histograms, one for each span
+name, which can be exposed in the Prometheus text format. Histograms are kept
+in the memory of each process, so with several processes each one has its own
+metrics.
+
+Spans are only timed when 'DATEBOOK_METRICS_ENABLED' setting is True, else
+'timing_span' returns a shared context manager that does nothing.
+"""
+import threading
+from timeit import default_timer
+
+from django.conf import settings
+
+# Name of the histograms metric in the Prometheus format
+METRIC_NAME = 'datebook_span_seconds'
+
+
+class Histogram(object):
+    """
+    Cumulative histogram of durations in seconds
+    """
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0]*len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def get_buckets(self):
+        """
+        Return a list of tuples ``(UPPER_BOUND, CUMULATIVE_COUNT)``, the last
+        one is for the infinite bound
+        """
+        buckets, total = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            buckets.append((bound, total))
+        buckets.append((float('inf'), self.count))
+        return buckets
+
+
+class MetricsRegistry(object):
+    """
+    Thread safe registry of histograms for span names
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, name, value):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(settings.DATEBOOK_METRICS_BUCKETS)
+            self.histograms[name].observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def get_histograms(self):
+        """
+        Return a list of tuples ``(NAME, HISTOGRAM)`` ordered on names
+        """
+        with self.lock:
+            return sorted(self.histograms.items())
+
+
+registry = MetricsRegistry()
+
+
+class TimingSpan(object):
+    """
+    Context manager to observe its duration in the histogram of its name
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        registry.observe(self.name, default_timer()-self.started)
+
+
+class NullSpan(object):
+    """
+    Context manager that does nothing, used when metrics are disabled
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+def timing_span(name):
+    """
+    Return a context manager to time a span, like: ::
+
+        with timing_span('month.formatmonth'):
+            ...
+    """
+    if not settings.DATEBOOK_METRICS_ENABLED:
+        return NULL_SPAN
+    return TimingSpan(name)
+
+
+def format_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_bound(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def render_prometheus():
+    """
+    Return the histograms in the Prometheus text format
+    """
+    lines = [
+        '# HELP {0} Duration of the datebook hot path spans in seconds.'.format(METRIC_NAME),
+        '# TYPE {0} histogram'.format(METRIC_NAME),
+    ]
+    for name, histogram in registry.get_histograms():
+        label = format_label(name)
+        for bound, count in histogram.get_buckets():
+            lines.append('{0}_bucket{{span="{1}",le="{2}"}} {3}'.format(METRIC_NAME, label, format_bound(bound), count))
+        lines.append('{0}_sum{{span="{1}"}} {2}'.format(METRIC_NAME, label, repr(histogram.sum)))
+        lines.append('{0}_count{{span="{1}"}} {2}'.format(METRIC_NAME, label, histogram.count))
+    return '\n'.join(lines)+'\n'
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Middlewares
+"""
+from django.core.exceptions import MiddlewareNotUsed
+
+from datebook.budgets import QueryRecorder, check_query_budget, get_query_budget, get_query_budget_mode
+
+
+class QueryBudgetMiddleware(object):
+    """
+    Record the queries of requests on views with a 'query_budget' and warn or
+    fail when they exceed it, see 'DATEBOOK_QUERY_BUDGET_MODE' setting
+
+    The number of queries and the budget are added to responses in a
+    'X-Datebook-Queries' header. Streaming responses are not checked since
+    their queries are executed after the middleware.
+    """
+    def __init__(self):
+        self.mode = get_query_budget_mode()
+        if self.mode == 'off':
+            raise MiddlewareNotUsed
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = get_query_budget(view_func, request.method)
+        if budget is not None:
+            request._query_budget = budget
+            request._query_recorder = QueryRecorder()
+            request._query_recorder.__enter__()
+
+    def process_response(self, request, response):
+        recorder = getattr(request, '_query_recorder', None)
+        if recorder is None:
+            return response
+        recorder.__exit__(None, None, None)
+        del request._query_recorder
+        if response.streaming:
+            return response
+
+        response['X-Datebook-Queries'] = '{0}/{1}'.format(len(recorder), request._query_budget)
+        check_query_budget(recorder, u'{0} {1}'.format(request.method, request.path), request._query_budget, mode=self.mode)
+        return response
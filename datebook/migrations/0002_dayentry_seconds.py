@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+# Number of day entries loaded at once when filling the new columns
+BACKFILL_BATCH_SIZE = 500
+
+
+# Helpers are copied from 'datebook.utils' so the migration does not change
+# with the application code
+def time_to_seconds(timeobj):
+    return (timeobj.hour*60*60)+(timeobj.minute*60)+timeobj.second
+
+
+def timedelta_to_seconds(delta):
+    return (delta.days*24*60*60)+delta.seconds
+
+
+def backfill_seconds(apps, schema_editor):
+    """
+    Fill the denormalized seconds columns for existing day entries
+
+    Entries are walked on their primary key by batches, then updated with one
+    query for each distinct (elapsed, overtime) couple in the batch, which are
+    very repetitive in practice.
+    """
+    DayEntry = apps.get_model('datebook', 'DayEntry')
+    last_pk = 0
+    while True:
+        batch = list(DayEntry.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'start', 'stop', 'pause', 'overtime')[:BACKFILL_BATCH_SIZE])
+        if not batch:
+            break
+
+        groups = {}
+        for pk, start, stop, pause, overtime in batch:
+            key = (
+                timedelta_to_seconds(stop-start)-time_to_seconds(pause),
+                time_to_seconds(overtime),
+            )
+            groups.setdefault(key, []).append(pk)
+
+        for (elapsed, overtime), pks in groups.items():
+            DayEntry.objects.filter(pk__in=pks).update(elapsed_seconds=elapsed, overtime_seconds=overtime)
+
+        last_pk = batch[-1][0]
+
+
+def noop(apps, schema_editor):
+    """Nothing to do when unapplying since the columns are dropped"""
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datebook', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dayentry',
+            name='elapsed_seconds',
+            field=models.IntegerField(default=0, verbose_name='elapsed seconds', editable=False, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='dayentry',
+            name='overtime_seconds',
+            field=models.IntegerField(default=0, verbose_name='overtime seconds', editable=False, db_index=True),
+        ),
+        migrations.RunPython(backfill_seconds, noop),
+    ]
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import calendar
+import json
+
+from django.db import models, migrations
+
+# Number of datebooks summarized at once
+BACKFILL_BATCH_SIZE = 200
+
+
+# Helpers are copied from 'datebook.utils' so the migration does not change
+# with the application code
+def empty_totals():
+    return {'entries': 0, 'elapsed_seconds': 0, 'overtime_seconds': 0, 'vacations': 0}
+
+
+def add_day_totals(totals, activity_date, vacation, elapsed_seconds, overtime_seconds):
+    totals['entries'] += 1
+    if vacation:
+        totals['vacations'] += 1
+    else:
+        totals['elapsed_seconds'] += elapsed_seconds
+        totals['overtime_seconds'] += overtime_seconds
+    return totals
+
+
+def summarize_day_values(year, month, values):
+    """
+    Return a tuple ``(totals, weeks_totals)`` from day entry values tuples
+    ``(activity_date, vacation, elapsed_seconds, overtime_seconds)``
+    """
+    weeks_index = {}
+    for i, week in enumerate(calendar.Calendar().monthdayscalendar(year, month)):
+        for dayno in week:
+            if dayno:
+                weeks_index[dayno] = i
+    totals = empty_totals()
+    weeks_totals = [empty_totals() for i in range(0, max(weeks_index.values())+1)]
+    for item in values:
+        add_day_totals(totals, *item)
+        if item[0].day in weeks_index:
+            add_day_totals(weeks_totals[weeks_index[item[0].day]], *item)
+    return totals, weeks_totals
+
+
+def build_summaries(apps, schema_editor):
+    """
+    Create the summaries for existing datebooks, datebooks are walked on their
+    primary key by batches with a single query to get all their entries values
+    """
+    Datebook = apps.get_model('datebook', 'Datebook')
+    DayEntry = apps.get_model('datebook', 'DayEntry')
+    DatebookSummary = apps.get_model('datebook', 'DatebookSummary')
+    last_pk = 0
+    while True:
+        datebooks = list(Datebook.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'period')[:BACKFILL_BATCH_SIZE])
+        if not datebooks:
+            break
+
+        entries = {}
+        rows = DayEntry.objects.filter(datebook_id__in=[pk for pk, period in datebooks]).values_list('datebook_id', 'activity_date', 'vacation', 'elapsed_seconds', 'overtime_seconds')
+        for row in rows:
+            entries.setdefault(row[0], []).append(row[1:])
+
+        summaries = []
+        for pk, period in datebooks:
+            totals, weeks_totals = summarize_day_values(period.year, period.month, entries.get(pk, []))
+            summaries.append(DatebookSummary(datebook_id=pk, weeks=json.dumps(weeks_totals), **totals))
+        DatebookSummary.objects.bulk_create(summaries)
+
+        last_pk = datebooks[-1][0]
+
+
+def noop(apps, schema_editor):
+    """Nothing to do when unapplying since the table is dropped"""
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datebook', '0002_dayentry_seconds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatebookSummary',
+            fields=[
+                ('datebook', models.OneToOneField(related_name='summary', primary_key=True, serialize=False, to='datebook.Datebook', verbose_name='datebook')),
+                ('entries', models.IntegerField(default=0, verbose_name='entries')),
+                ('elapsed_seconds', models.IntegerField(default=0, verbose_name='elapsed seconds')),
+                ('overtime_seconds', models.IntegerField(default=0, verbose_name='overtime seconds')),
+                ('vacations', models.IntegerField(default=0, verbose_name='vacations')),
+                ('weeks', models.TextField(verbose_name='weeks totals', blank=True)),
+            ],
+            options={
+                'verbose_name': 'datebook summary',
+                'verbose_name_plural': 'datebook summaries',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.RunPython(build_summaries, noop),
+    ]
@@ -3,16 +3,29 @@
 View mixins
 """
 import datetime
+import hashlib
+import logging
 
+from django import http
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from django.core.exceptions import ImproperlyConfigured, PermissionDenied
 from django.contrib.auth.views import redirect_to_login
+from django.utils.cache import patch_cache_control
+from django.utils.encoding import force_text
+from django.utils.http import parse_etags, quote_etag
+from django.utils.timezone import get_current_timezone_name
+from django.utils.translation import get_language
 
 from braces.views import PermissionRequiredMixin
 
-from datebook.models import Datebook
+from datebook.models import Datebook, coalesced_touches
 from datebook.calendars import DatebookCalendar
+from datebook.metrics import timing_span
+from datebook.profiling import MemoryProfile
+
+logger = logging.getLogger('datebook.profiling')
 
 class AuthorKwargsMixin(object):
     """
@@ -59,14 +72,115 @@ class DateKwargsMixin(AuthorKwargsMixin):
         return context
 
 
+class ConditionalResponseMixin(object):
+    """
+    Emit an 'ETag' validator and answer with a 'Not Modified' response when 
+    the client allready have the current version
+    
+    Views have to implement 'get_modified' to return the last modification 
+    date of their datas, then call 'get_not_modified_response' as soon as 
+    they can in their 'get' method (before any heavy computing) and return its 
+    response if any, else pass their response to 'set_validators'.
+    
+    Rendered pages depend also on the user, the language, the timezone and the 
+    current day (for projected days), so they are parts of the ETag. There is 
+    no 'Last-Modified' validator since a date can't tell these versions apart, 
+    a client (or a cache middleware) comparing it would get the page of 
+    another user or language.
+    """
+    def get_modified(self):
+        raise ImproperlyConfigured("'ConditionalResponseMixin' requires 'get_modified' method to be implemented.")
+    
+    def get_etag_parts(self):
+        """
+        Return a list of values that identify the response version
+        """
+        return [self.request.user.pk, get_language(), get_current_timezone_name(),
+                datetime.date.today().isoformat(), self.get_modified()]
+    
+    def get_etag(self):
+        parts = [force_text(item) for item in self.get_etag_parts()]
+        return hashlib.md5(u'|'.join(parts).encode('utf-8')).hexdigest()
+    
+    def get_not_modified_response(self):
+        """
+        Return a 'Not Modified' response if the request 'If-None-Match' 
+        validator matches the current version, else None
+        """
+        self.etag = self.get_etag()
+        
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if not if_none_match:
+            return None
+        etags = parse_etags(if_none_match)
+        if '*' not in etags and self.etag not in etags:
+            return None
+        
+        return self.set_validators(http.HttpResponseNotModified())
+    
+    def set_validators(self, response):
+        response['ETag'] = quote_etag(self.etag)
+        patch_cache_control(response, private=True, must_revalidate=True)
+        return response
+
+
+class CoalescedTouchesMixin(object):
+    """
+    Coalesce the datebook touches from all writes of the request, so each 
+    modified datebook is updated only once
+    """
+    def dispatch(self, request, *args, **kwargs):
+        with coalesced_touches():
+            return super(CoalescedTouchesMixin, self).dispatch(request, *args, **kwargs)
+
+
+class MemoryProfileMixin(object):
+    """
+    Profile the memory allocations of requests from staff users in debug mode, 
+    when 'DATEBOOK_MEMORY_PROFILE' setting is True or with the 'memory_profile' 
+    argument in the query string
+    
+    The report is logged to the 'datebook.profiling' logger and the peak is 
+    added to the response in a 'X-Datebook-Memory-Peak' header. With the query 
+    string argument, the report is returned instead of the page.
+    """
+    memory_profile_arg = 'memory_profile'
+    
+    def is_memory_profiled(self, request):
+        if not settings.DEBUG or not request.user.is_staff:
+            return False
+        return settings.DATEBOOK_MEMORY_PROFILE or self.memory_profile_arg in request.GET
+    
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_memory_profiled(request):
+            return super(MemoryProfileMixin, self).dispatch(request, *args, **kwargs)
+        
+        with MemoryProfile() as profile:
+            response = super(MemoryProfileMixin, self).dispatch(request, *args, **kwargs)
+            # Template responses are rendered out of the view
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        
+        report = profile.get_report(request.get_full_path())
+        logger.info(report)
+        if self.memory_profile_arg in request.GET:
+            return http.HttpResponse(report, content_type='text/plain; charset=utf-8')
+        response['X-Datebook-Memory-Peak'] = profile.peak
+        return response
+
+
 class DatebookCalendarMixin(DateKwargsMixin):
     """
     Datebook calendar mixin
     """
     calendar_obj = DatebookCalendar
     
+    def get_datebook_queryset(self):
+        return Datebook.objects.all()
+    
     def get_datebook(self, filters):
-        return get_object_or_404(Datebook, author__username=self.kwargs['author'], **filters)
+        with timing_span('calendar.get_datebook'):
+            return get_object_or_404(self.get_datebook_queryset(), author__username=self.kwargs['author'], **filters)
     
     def get_dayentry_list(self, filters={}):
         return self.object.dayentry_set.filter(**filters).order_by('activity_date')
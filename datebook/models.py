@@ -3,14 +3,102 @@
 Data models
 """
 import datetime
+import json
+import threading
+from contextlib import contextmanager
 
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.utils.translation import ugettext_lazy as _
 from django.utils.timezone import now as tz_now, localtime
 
 from datebook import utils
 
+# Datebook ids to touch at the end of the current 'coalesced_touches' block
+_pending_touches = threading.local()
+
+
+@contextmanager
+def coalesced_touches():
+    """
+    Coalesce datebook touches until the end of the block, where all touched
+    datebooks are updated with a single query
+
+    Blocks can be nested, touches are done at the end of the outermost one.
+    Touches are also done when the block raises an exception, since with
+    autocommit the writes made before the error are kept. They are only
+    skipped when the enclosing atomic block is already marked to roll back,
+    as the writes are discarded and no query can be run before its end.
+    """
+    if getattr(_pending_touches, 'pks', None) is not None:
+        yield
+        return
+
+    _pending_touches.pks = pks = set()
+    try:
+        yield
+    finally:
+        _pending_touches.pks = None
+        if pks and not transaction.get_connection().needs_rollback:
+            Datebook.objects.touch(pks)
+
+
+class DatebookManager(models.Manager):
+    """
+    Datebook manager
+    """
+    def touch(self, pks):
+        """
+        Update the modification date of the given datebook ids with a narrow
+        update, it is delayed to the end of the current 'coalesced_touches'
+        block if any
+
+        This is the way to mark datebooks as modified when their day entries
+        are written, since the modification date is the version used for
+        caches and validators.
+        """
+        pending = getattr(_pending_touches, 'pks', None)
+        if pending is not None:
+            pending.update(pks)
+        elif pks:
+            self.filter(pk__in=set(pks)).update(modified=tz_now())
+
+    def bulk_get_or_create(self, keys):
+        """
+        Return a tuple of a dict of datebooks indexed on tuples
+        ``(AUTHOR_ID, PERIOD)`` for the given keys and the list of created ones
+
+        Missing datebooks are bulk created with empty summaries.
+        """
+        keys = set(keys)
+        author_ids = set([author_id for author_id, period in keys])
+        periods = set([period for author_id, period in keys])
+        datebooks = dict([((item.author_id, item.period), item) for item in self.filter(author_id__in=author_ids, period__in=periods) if (item.author_id, item.period) in keys])
+
+        missing = set([key for key in keys if key not in datebooks])
+        if not missing:
+            return datebooks, []
+
+        now = tz_now()
+        self.bulk_create([self.model(author_id=author_id, period=period, created=now, modified=now) for author_id, period in missing])
+        # Primary keys are not setted from bulk create
+        created = [item for item in self.filter(author_id__in=author_ids, period__in=periods) if (item.author_id, item.period) in missing]
+
+        summaries = []
+        for datebook in created:
+            summary = DatebookSummary(datebook=datebook)
+            summary.set_totals(*utils.summarize_day_values(datebook.period.year, datebook.period.month, []))
+            # Summary save method is not triggered with bulk create
+            summary.weeks = json.dumps(summary.get_weeks_totals())
+            summaries.append(summary)
+        DatebookSummary.objects.bulk_create(summaries)
+
+        datebooks.update(dict([((item.author_id, item.period), item) for item in created]))
+        return datebooks, created
+
+
 class Datebook(models.Model):
     """
     Datebook is only for one user (its author) and it is not shared.
@@ -27,6 +115,8 @@ class Datebook(models.Model):
     period = models.DateField(_("month of activity"), blank=False)
     notes = models.TextField(_("content"), max_length=500, blank=True)
 
+    objects = DatebookManager()
+
     def __unicode__(self):
         return self.period.strftime("%B %Y")
 
@@ -42,13 +132,40 @@ class Datebook(models.Model):
         """Allways forcing to the first day of the month"""
         self.period = self.period.replace(day=1)
 
+    def is_past_month(self, today=None):
+        """Return True if the datebook month is before the month of the given day (default to today)"""
+        today = today or datetime.date.today()
+        return (self.period.year, self.period.month) < (today.year, today.month)
+
+    def get_summary(self):
+        """
+        Return the datebook's totals summary, it is rebuilded if it does not exist yet
+        """
+        try:
+            return self.summary
+        except DatebookSummary.DoesNotExist:
+            self.summary = DatebookSummary.objects.rebuild(self)
+            return self.summary
+
+    def get_totals(self, today=None):
+        """
+        Return the datebook counted totals from its summary (see
+        'DatebookSummaryManager.get_counted_totals')
+        """
+        return DatebookSummary.objects.get_counted_totals(self.pk, self.period, self.get_summary().get_totals(), today=today)
+
     def save(self, *args, **kwargs):
         # First create
-        if not self.created:
+        is_new = not self.created
+        if is_new:
             self.created = tz_now()
 
         super(Datebook, self).save(*args, **kwargs)
 
+        # New datebook starts with an empty summary
+        if is_new:
+            self.summary = DatebookSummary.objects.rebuild(self, entries=[])
+
     class Meta:
         unique_together = ("author", "period")
         verbose_name = _("Datebook")
@@ -106,13 +223,145 @@ class DayBase(models.Model):
         abstract = True
 
 
+class DayEntryQuerySet(models.QuerySet):
+    """
+    DayEntry queryset
+    """
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Same as default ``bulk_create`` but fill the denormalized seconds columns
+        since model save method is not triggered with bulk creating
+        """
+        for obj in objs:
+            obj.set_seconds()
+        created = super(DayEntryQuerySet, self).bulk_create(objs, *args, **kwargs)
+        # Neither the summaries and datebooks are updated without the model save method
+        DatebookSummary.objects.apply_delta(added=[obj.get_summary_values() for obj in objs])
+        Datebook.objects.touch([obj.datebook_id for obj in objs])
+        return created
+
+    def update_each(self, changes, **values):
+        """
+        Update rows with their own values from 'changes', a dict of field values
+        dicts indexed on primary keys, and the common field 'values' for all
+        rows, with a single UPDATE query using ``CASE`` expressions
+
+        All rows must change the same fields and only the primary keys from
+        'changes' are used, not the queryset filters. Like the queryset 'update',
+        the model save method is not triggered so summaries and datebooks are not
+        updated. Rows are updated by batches on databases that limit the number
+        of query parameters.
+        """
+        if not changes:
+            return 0
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        pk_column = qn(opts.pk.column)
+        pks = sorted(changes.keys())
+        names = sorted(changes[pks[0]].keys())
+
+        # Each row takes two parameters for each of its fields and its primary key
+        batch_size = max(connection.ops.bulk_batch_size([None]*(2*len(names)+1+len(values)), pks), 1)
+
+        count = 0
+        with transaction.atomic(using=self.db):
+            cursor = connection.cursor()
+            for offset in range(0, len(pks), batch_size):
+                batch = pks[offset:offset+batch_size]
+                assignments, params = [], []
+                for name in names:
+                    field = opts.get_field(name)
+                    cases = []
+                    for pk in batch:
+                        cases.append("WHEN %s THEN %s")
+                        params.extend([pk, field.get_db_prep_save(changes[pk][name], connection=connection)])
+                    assignments.append("{0} = CASE {1} {2} END".format(qn(field.column), pk_column, " ".join(cases)))
+                for name, value in sorted(values.items()):
+                    field = opts.get_field(name)
+                    assignments.append("{0} = %s".format(qn(field.column)))
+                    params.append(field.get_db_prep_save(value, connection=connection))
+
+                sql = "UPDATE {0} SET {1} WHERE {2} IN ({3})".format(
+                    qn(opts.db_table), ", ".join(assignments), pk_column, ", ".join(["%s"]*len(batch))
+                )
+                cursor.execute(sql, params+batch)
+                count += cursor.rowcount
+        return count
+
+    def delete_each(self, pks):
+        """
+        Delete rows from their primary keys with a single DELETE query, without 
+        loading them
+
+        Only the given primary keys are used, not the queryset filters. Unlike the 
+        queryset 'delete', the 'post_delete' signal is not sent so summaries and 
+        datebooks are not updated. Rows are deleted by batches on databases that 
+        limit the number of query parameters.
+        """
+        if not pks:
+            return 0
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        pks = sorted(pks)
+        batch_size = max(connection.ops.bulk_batch_size([opts.pk.name], pks), 1)
+
+        count = 0
+        with transaction.atomic(using=self.db):
+            cursor = connection.cursor()
+            for offset in range(0, len(pks), batch_size):
+                batch = pks[offset:offset+batch_size]
+                sql = "DELETE FROM {0} WHERE {1} IN ({2})".format(
+                    qn(opts.db_table), qn(opts.pk.column), ", ".join(["%s"]*len(batch))
+                )
+                cursor.execute(sql, batch)
+                count += cursor.rowcount
+        return count
+
+    def get_totals(self):
+        """
+        Return totals (entries, elapsed seconds, overtime seconds and vacations)
+        from a single SUM query on the denormalized seconds columns
+
+        Like in calendars, vacation days are not counted in elapsed and overtime
+        seconds.
+        """
+        totals = {'entries': 0, 'elapsed_seconds': 0, 'overtime_seconds': 0, 'vacations': 0}
+        rows = self.order_by().values('vacation').annotate(
+            entries=models.Count('pk'),
+            elapsed=models.Sum('elapsed_seconds'),
+            overtime=models.Sum('overtime_seconds'),
+        )
+        for row in rows:
+            totals['entries'] += row['entries']
+            if row['vacation']:
+                totals['vacations'] += row['entries']
+            else:
+                totals['elapsed_seconds'] += row['elapsed'] or 0
+                totals['overtime_seconds'] += row['overtime'] or 0
+        return totals
+
+
 class DayEntry(DayBase):
     """
     Activity day in a Datebook
+
+    'elapsed_seconds' and 'overtime_seconds' are denormalized from start, stop,
+    pause and overtime so totals can be computed with SQL aggregates.
+
+    Each write is reported as a delta to the 'DatebookSummary' of its datebook.
     """
+    # Field values used to compute summary deltas
+    SUMMARY_FIELDS = ('datebook_id', 'activity_date', 'vacation', 'elapsed_seconds', 'overtime_seconds')
+
     datebook = models.ForeignKey(Datebook, verbose_name=_('datebook'))
     activity_date = models.DateField(_('activity day date'), blank=False) # inherit month and year from its Datebook
     vacation = models.BooleanField(_('vacation'), default=False, blank=True, null=False)
+    elapsed_seconds = models.IntegerField(_('elapsed seconds'), default=0, editable=False, db_index=True)
+    overtime_seconds = models.IntegerField(_('overtime seconds'), default=0, editable=False, db_index=True)
+
+    objects = DayEntryQuerySet.as_manager()
 
     def __unicode__(self):
         if not self.activity_date:
@@ -124,13 +373,30 @@ class DayEntry(DayBase):
         if hasattr(self, 'datebook'):
             self.activity_date = self.activity_date.replace(month=self.datebook.period.month, year=self.datebook.period.year)
 
+    def set_seconds(self):
+        """Fill the denormalized seconds columns from the time fields"""
+        self.elapsed_seconds = self.get_elapsed_seconds()
+        self.overtime_seconds = self.get_overtime_seconds()
+
+    def get_summary_values(self):
+        """Return the tuple of 'SUMMARY_FIELDS' values"""
+        return tuple([getattr(self, name) for name in self.SUMMARY_FIELDS])
+
     def save(self, *args, **kwargs):
-        # Allways update the datebook
-        self.datebook.modified = tz_now()
-        self.datebook.save()
+        self.set_seconds()
+
+        # Get the stored values to remove them from the summary
+        previous = None
+        if self.pk:
+            previous = DayEntry.objects.filter(pk=self.pk).values_list(*self.SUMMARY_FIELDS).first()
 
         super(DayEntry, self).save(*args, **kwargs)
 
+        DatebookSummary.objects.apply_delta(removed=[previous] if previous else [], added=[self.get_summary_values()])
+
+        # Allways update the datebook
+        Datebook.objects.touch([self.datebook_id])
+
     class Meta:
         unique_together = ("datebook", "activity_date")
         verbose_name = _("day entry")
@@ -151,3 +417,142 @@ class DayModel(DayBase):
         unique_together = ("author", "title")
         verbose_name = _("day model")
         verbose_name_plural = _("day models")
+
+
+class DatebookSummaryManager(models.Manager):
+    """
+    DatebookSummary manager
+    """
+    def rebuild(self, datebook, entries=None):
+        """
+        Compute again the summary of the given datebook from its entries and save it
+
+        Optional 'entries' argument is an iterable of day entry values (without
+        the datebook id) to use instead of querying them.
+        """
+        if entries is None:
+            entries = datebook.dayentry_set.values_list(*DayEntry.SUMMARY_FIELDS[1:])
+        summary = self.model(datebook=datebook)
+        summary.set_totals(*utils.summarize_day_values(datebook.period.year, datebook.period.month, entries))
+        summary.save()
+        return summary
+
+    def ensure(self, datebooks):
+        """
+        Rebuild the missing summaries from the given Datebook queryset
+        """
+        for datebook in datebooks.filter(summary__isnull=True):
+            self.rebuild(datebook)
+
+    def get_counted_totals(self, datebook_id, period, totals, today=None):
+        """
+        Return the counted totals for a datebook from its summary totals
+
+        Entries counter includes all the entries but like within calendars, days
+        from today and further are not counted in the other totals. So summary
+        totals are only right for past months, futur months have nothing to count
+        and the current month needs a SUM query on its past days.
+        """
+        today = today or datetime.date.today()
+        if (period.year, period.month) < (today.year, today.month):
+            return totals
+
+        counted = utils.empty_totals()
+        if (period.year, period.month) == (today.year, today.month):
+            counted = DayEntry.objects.filter(datebook_id=datebook_id, activity_date__lt=today).get_totals()
+        counted['entries'] = totals['entries']
+        return counted
+
+    def apply_delta(self, removed=[], added=[]):
+        """
+        Update summaries with removed and added day entries, each item is a tuple
+        of the 'DayEntry.SUMMARY_FIELDS' values.
+
+        Datebooks without a summary are ignored, they will be rebuilded when needed.
+        Summaries of all the given datebooks are getted from a single query.
+        """
+        changes = {}
+        for sign, items in ((-1, removed), (1, added)):
+            for values in items:
+                changes.setdefault(values[0], []).append((values[1:], sign))
+
+        if not changes:
+            return
+
+        # Summaries are locked together, ordered to avoid deadlocks between
+        # concurrent writes on the same datebooks
+        with transaction.atomic():
+            for summary in self.select_for_update().select_related('datebook').filter(datebook_id__in=changes.keys()).order_by('datebook'):
+                for values, sign in changes[summary.datebook_id]:
+                    summary.add_day(values, sign=sign)
+                summary.save()
+
+
+class DatebookSummary(models.Model):
+    """
+    Totals rollup for a Datebook, one row per Datebook
+
+    It is maintained with deltas on each day entry write, so totals never need to
+    rescan all the entries. Totals include all the entries, even the ones that are
+    projections (days after today), so they are equal to calendar totals only
+    for past months.
+
+    'weeks' is a JSON list of totals for each week of the month.
+    """
+    datebook = models.OneToOneField(Datebook, verbose_name=_('datebook'), related_name='summary', primary_key=True)
+    entries = models.IntegerField(_('entries'), default=0)
+    elapsed_seconds = models.IntegerField(_('elapsed seconds'), default=0)
+    overtime_seconds = models.IntegerField(_('overtime seconds'), default=0)
+    vacations = models.IntegerField(_('vacations'), default=0)
+    weeks = models.TextField(_('weeks totals'), blank=True)
+
+    objects = DatebookSummaryManager()
+
+    def __unicode__(self):
+        return unicode(self.datebook)
+
+    def get_totals(self):
+        """Return month totals as a dict"""
+        return dict([(key, getattr(self, key)) for key in utils.empty_totals()])
+
+    def get_weeks_totals(self):
+        """Return the list of weeks totals"""
+        if not hasattr(self, '_weeks_totals'):
+            self._weeks_totals = json.loads(self.weeks) if self.weeks else []
+        return self._weeks_totals
+
+    def set_totals(self, totals, weeks_totals):
+        """Replace month totals and weeks totals"""
+        for key, value in totals.items():
+            setattr(self, key, value)
+        self._weeks_totals = weeks_totals
+
+    def add_day(self, values, sign=1):
+        """
+        Add (or substract with sign=-1) a day entry values, a tuple of
+        'DayEntry.SUMMARY_FIELDS' values without the datebook id
+        """
+        totals = utils.add_day_totals(self.get_totals(), *values, sign=sign)
+        self.set_totals(totals, self.get_weeks_totals())
+
+        weeks_index = utils.month_weeks_index(self.datebook.period.year, self.datebook.period.month)
+        if values[0].day in weeks_index:
+            utils.add_day_totals(self._weeks_totals[weeks_index[values[0].day]], *values, sign=sign)
+
+    def save(self, *args, **kwargs):
+        self.weeks = json.dumps(self.get_weeks_totals())
+        super(DatebookSummary, self).save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = _("datebook summary")
+        verbose_name_plural = _("datebook summaries")
+
+
+@receiver(post_delete, sender=DayEntry)
+def remove_dayentry_from_summary(sender, instance, **kwargs):
+    """
+    Remove deleted day entries from their summary and update their datebook, this
+    is done with a signal to cover queryset deletes too (like from the admin)
+    """
+    DatebookSummary.objects.apply_delta(removed=[instance.get_summary_values()])
+    Datebook.objects.touch([instance.datebook_id])
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Memory allocations profiling
+
+Profiles trace the allocations of a block with 'tracemalloc' and report the
+peak of traced memory with the top allocation sites in the datebook modules.
+Each allocation is attributed to the innermost frame of a datebook module from
+its traceback, so allocations from Django (like model instances or template
+rendering) are reported on the datebook line that caused them.
+
+'tracemalloc' is only in Python >= 3.4, with older versions profiles report
+the growth of the peak resident memory of the process (from 'resource', on
+Unix only) and the objects tracked by the garbage collector that were created
+in the block and are still alive, counted for the module of their type.
+"""
+import gc
+import os
+import sys
+
+from django.conf import settings
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Directory of the application, only its frames are reported as allocation sites
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Frames of this module are never allocation sites
+MODULE_PATH = os.path.splitext(os.path.abspath(__file__))[0]
+
+# Tracebacks are ordered from the oldest frame since Python 3.7
+OLDEST_FRAME_FIRST = sys.version_info >= (3, 7)
+
+
+def is_available():
+    return tracemalloc is not None
+
+
+def get_peak_rss():
+    """
+    Return the peak resident memory of the process in bytes, 0 if unknown
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on Mac OS X
+    return peak if sys.platform == 'darwin' else peak*1024
+
+
+def format_size(size):
+    """
+    Return a human readable size from bytes
+    """
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return '{0:.1f} {1}'.format(size, unit)
+        size /= 1024.0
+    return '{0:.1f} GiB'.format(size)
+
+
+class MemoryProfile(object):
+    """
+    Context manager to trace the allocations of a block
+
+    After the block, 'peak' and 'current' are the peak and remaining traced
+    memory in bytes and 'sites' and 'modules' are the allocations for each
+    datebook line and module. Allocations are the ones still alive at the end
+    of the block, like the objects of a view and its response content.
+
+    Without 'tracemalloc', 'peak' is the growth of the process peak resident
+    memory (0 when the block stays under the previous peak), 'current' is the
+    shallow size of the new objects and 'modules' are these objects for the
+    module of their type, there are no 'sites'.
+    """
+    def __init__(self, frames=None, limit=None):
+        self.frames = frames or settings.DATEBOOK_MEMORY_PROFILE_FRAMES
+        self.limit = limit or settings.DATEBOOK_MEMORY_PROFILE_LIMIT
+        self.tracing = is_available()
+        self.peak = 0
+        self.current = 0
+        self.sites = []
+        self.modules = []
+
+    def __enter__(self):
+        if not self.tracing:
+            gc.collect()
+            self.object_ids = set([id(item) for item in gc.get_objects()])
+            self.peak_rss = get_peak_rss()
+            return self
+        # Don't stop a tracing started by someone else
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start(self.frames)
+        else:
+            tracemalloc.clear_traces()
+            # Python >= 3.9
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.tracing:
+            self.peak = max(get_peak_rss()-self.peak_rss, 0)
+            modules = self.get_objects()
+            self.current = sum([size for size, count, name in modules])
+            self.modules = modules[:self.limit]
+            self.object_ids = None
+            return
+        snapshot = tracemalloc.take_snapshot()
+        self.current, self.peak = tracemalloc.get_traced_memory()
+        if self.started:
+            tracemalloc.stop()
+        self.sites, self.modules = self.get_allocations(snapshot)
+
+    def get_site(self, trace_traceback):
+        """
+        Return the innermost datebook frame of a traceback as a tuple
+        ``(FILENAME, LINE)``, None if there is not any
+        """
+        frames = reversed(trace_traceback) if OLDEST_FRAME_FIRST else trace_traceback
+        for frame in frames:
+            if frame.filename.startswith(APP_DIR) and os.path.splitext(frame.filename)[0] != MODULE_PATH:
+                return os.path.relpath(frame.filename, os.path.dirname(APP_DIR)), frame.lineno
+        return None
+
+    def get_allocations(self, snapshot):
+        """
+        Return the lists of allocations for each site and for each module as
+        tuples ``(SIZE, COUNT, NAME)`` ordered on their size, other allocations
+        are grouped in an 'other' module
+        """
+        sites, modules = {}, {}
+        for trace in snapshot.traces:
+            site = self.get_site(trace.traceback)
+            if site is None:
+                site_name, module_name = None, 'other'
+            else:
+                site_name, module_name = u'{0}:{1}'.format(*site), site[0]
+            for name, allocations in ((site_name, sites), (module_name, modules)):
+                if name is not None:
+                    size, count = allocations.get(name, (0, 0))
+                    allocations[name] = (size+trace.size, count+1)
+        sort = lambda items: sorted([(size, count, name) for name, (size, count) in items.items()], reverse=True)
+        return sort(sites)[:self.limit], sort(modules)
+
+    def get_objects(self):
+        """
+        Return the list of new objects for each module as tuples
+        ``(SIZE, COUNT, MODULE)`` ordered on their size
+        """
+        modules = {}
+        for item in gc.get_objects():
+            # The ids set of the profile is new too
+            if id(item) in self.object_ids or item is self.object_ids:
+                continue
+            name = getattr(type(item), '__module__', None) or 'other'
+            size, count = modules.get(name, (0, 0))
+            modules[name] = (size+sys.getsizeof(item, 0), count+1)
+        return sorted([(size, count, name) for name, (size, count) in modules.items()], reverse=True)
+
+    def get_report(self, name):
+        """
+        Return the report text of the profile
+        """
+        if not self.tracing:
+            lines = [
+                u"Memory profile for {0} (without tracemalloc)".format(name),
+                u"Peak resident memory growth: {0}, new objects: {1}".format(format_size(self.peak), format_size(self.current)),
+                u"New objects by module of their type:",
+            ]
+            for size, count, module in self.modules:
+                lines.append(u"* {0}: {1} in {2} objects".format(module, format_size(size), count))
+            return u'\n'.join(lines)
+
+        lines = [
+            u"Memory profile for {0}".format(name),
+            u"Peak: {0}, remaining: {1}".format(format_size(self.peak), format_size(self.current)),
+            u"Top allocation sites:",
+        ]
+        for size, count, site in self.sites:
+            lines.append(u"* {0}: {1} in {2} blocks".format(site, format_size(size), count))
+        lines.append(u"Allocations by module:")
+        for size, count, module in self.modules:
+            lines.append(u"* {0}: {1} in {2} blocks".format(module, format_size(size), count))
+        return u'\n'.join(lines)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Recurring schedules of day models
+
+A schedule applies a day model on the days of a date range that match its
+recurrence (weekdays and interval). Days are written by batches: each batch
+creates its missing datebooks then its day entries with bulk creates and
+updates the existing ones with a single query, in its own transaction.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+
+from datebook.models import Datebook, DatebookSummary, DayEntry, coalesced_touches
+from datebook.utils.timezones import combine_local, get_walltime
+
+
+def iter_schedule_dates(start, end, weekdays=None, every=1):
+    """
+    Yield the dates from start to end (both included), every given number of
+    days from the start and only for the given weekdays if any (``0`` for
+    monday to ``6`` for sunday)
+    """
+    step = datetime.timedelta(days=every)
+    day = start
+    while day <= end:
+        if not weekdays or day.weekday() in weekdays:
+            yield day
+        day += step
+
+
+class DayModelSchedule(object):
+    """
+    Apply a day model on days for its author
+
+    Days times are combined from the day model wall-clock times, so they are
+    right whatever is the daylight season of each day. Existing days are
+    skipped with 'skip_existing', else they are filled from the day model
+    except vacation days with 'skip_vacations'.
+
+    After 'run', 'created', 'updated', 'skipped' and 'datebooks_created' are
+    the counters of written days and created datebooks.
+    """
+    def __init__(self, daymodel, with_content=False, skip_existing=True, skip_vacations=True, batch_size=None):
+        self.daymodel = daymodel
+        self.author_id = daymodel.author_id
+        self.with_content = with_content
+        self.skip_existing = skip_existing
+        self.skip_vacations = skip_vacations
+        self.batch_size = batch_size or settings.DATEBOOK_SCHEDULE_BATCH_SIZE
+        self.delta = daymodel.stop - daymodel.start
+        self.walltime = get_walltime(daymodel.start)
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.datebooks_created = 0
+
+    def get_day_times(self, day):
+        """
+        Return the start and stop datetimes for the given day
+        """
+        start = combine_local(day, self.walltime)
+        return start, start+self.delta
+
+    def get_values(self):
+        """
+        Return the common field values for all days, the vacation is allways
+        removed
+        """
+        values = {
+            'pause': self.daymodel.pause,
+            'overtime': self.daymodel.overtime,
+            'vacation': False,
+            'elapsed_seconds': self.daymodel.get_elapsed_seconds(),
+            'overtime_seconds': self.daymodel.get_overtime_seconds(),
+        }
+        if self.with_content:
+            values['content'] = self.daymodel.content
+        return values
+
+    def apply_batch(self, dates):
+        """
+        Write the days for the given dates
+        """
+        values = self.get_values()
+
+        with transaction.atomic(), coalesced_touches():
+            datebooks, created = Datebook.objects.bulk_get_or_create([(self.author_id, item.replace(day=1)) for item in dates])
+            self.datebooks_created += len(created)
+
+            # Existing entries with their summary values to compute the delta,
+            # from the batch range since dates can be too many for a 'IN' clause
+            dates = set(dates)
+            existing = DayEntry.objects.filter(
+                datebook__in=[item.id for item in datebooks.values()],
+                activity_date__gte=min(dates),
+                activity_date__lte=max(dates),
+            ).values_list('pk', *DayEntry.SUMMARY_FIELDS)
+            existing = dict([(item[0], item[1:]) for item in existing if item[2] in dates])
+
+            changes, removed = {}, []
+            for pk, summary_values in existing.items():
+                if self.skip_existing or (self.skip_vacations and summary_values[2]):
+                    self.skipped += 1
+                    continue
+                start, stop = self.get_day_times(summary_values[1])
+                changes[pk] = {'start': start, 'stop': stop}
+                removed.append(summary_values)
+
+            if changes:
+                DayEntry.objects.update_each(changes, **values)
+                DatebookSummary.objects.apply_delta(
+                    removed=removed,
+                    added=[(item[0], item[1], False, values['elapsed_seconds'], values['overtime_seconds']) for item in removed],
+                )
+                Datebook.objects.touch([item[0] for item in removed])
+                self.updated += len(changes)
+
+            # Create the missing days
+            existing_dates = set([item[1] for item in existing.values()])
+            new_days = []
+            for activity_date in sorted(dates - existing_dates):
+                start, stop = self.get_day_times(activity_date)
+                new_days.append(DayEntry(
+                    datebook=datebooks[(self.author_id, activity_date.replace(day=1))],
+                    activity_date=activity_date,
+                    start=start,
+                    stop=stop,
+                    pause=self.daymodel.pause,
+                    overtime=self.daymodel.overtime,
+                    content=self.daymodel.content if self.with_content else "",
+                    vacation=False,
+                ))
+            # The queryset fills their denormalized seconds, summaries and
+            # touches their datebook
+            if new_days:
+                DayEntry.objects.bulk_create(new_days)
+                self.created += len(new_days)
+
+    def run(self, dates):
+        """
+        Apply the day model on the given dates by batches
+        """
+        batch = []
+        for day in dates:
+            batch.append(day)
+            if len(batch) >= self.batch_size:
+                self.apply_batch(batch)
+                batch = []
+        if batch:
+            self.apply_batch(batch)
+        return self
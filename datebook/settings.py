@@ -35,3 +35,97 @@ DATEBOOK_TEXT_MARKUP_RENDER_TEMPLATE = None # Default, just a CharField
 # Template to init some Javascript for texts in forms
 DATEBOOK_TEXT_FIELD_JS_TEMPLATE = None # Default, no JS template
 #DATEBOOK_TEXT_FIELD_JS_TEMPLATE = "datebook/markup/_text_field_djangocodemirror_js.html" # Use DjangoCodeMirror
+
+#
+# Optionnal cache settings
+#
+
+# Cache name (from your 'CACHES' setting) to use, None to disable caching
+DATEBOOK_CACHE = None
+#DATEBOOK_CACHE = "default"
+
+# Timeout in seconds for cached month calendars, they are allways invalidated 
+# when their datebook is modified
+DATEBOOK_CALENDAR_CACHE_TIMEOUT = 60*60*24
+
+# Timeout in seconds for cached pages of the author index, they are not 
+# invalidated so new activities are displayed after this delay
+DATEBOOK_INDEX_CACHE_TIMEOUT = 60*5
+
+# Timeout in seconds for cached iCalendar events of datebooks, they are allways 
+# invalidated when their datebook is modified
+DATEBOOK_ICS_CACHE_TIMEOUT = 60*60*24*7
+
+#
+# Views settings
+#
+
+# Number of authors by page in the author index
+DATEBOOK_INDEX_PAGINATE_BY = 100
+
+#
+# Exports and imports settings
+#
+
+# Number of day entries fetched by each query when exporting
+DATEBOOK_EXPORT_CHUNK_SIZE = 1000
+
+# Number of rows validated and written in each transaction when importing
+DATEBOOK_IMPORT_BATCH_SIZE = 500
+
+# Minimum number of generated day entries written in each transaction by the 
+# 'datebook_generate' command
+DATEBOOK_GENERATOR_BATCH_SIZE = 10000
+
+#
+# Schedules and bulk edits settings
+#
+
+# Number of days written in each transaction when applying a day model schedule
+DATEBOOK_SCHEDULE_BATCH_SIZE = 500
+
+# Maximum number of days in the date range of a schedule form
+DATEBOOK_SCHEDULE_MAX_DAYS = 366*2
+
+# Maximum number of days for an operation of the bulk day form
+DATEBOOK_BULK_MAX_DAYS = 366
+
+#
+# Forms settings
+#
+
+# Maximum number of usernames returned by the owner autocompletion
+DATEBOOK_OWNER_AUTOCOMPLETE_LIMIT = 20
+
+#
+# Metrics settings
+#
+
+# Enable the timing spans of the hot paths, their histograms are exposed from 
+# the 'datebook:metrics' view. When disabled spans don't time anything
+DATEBOOK_METRICS_ENABLED = False
+
+# Upper bounds in seconds of the histograms buckets
+DATEBOOK_METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+#
+# Debug settings
+#
+
+# Profile the memory allocations of all month views requests from staff users 
+# in debug mode, else only with the 'memory_profile' query string argument. 
+# Profiles without 'tracemalloc' (Python < 3.4) only report the peak resident 
+# memory growth and the new objects for each module
+DATEBOOK_MEMORY_PROFILE = False
+
+# Number of frames stored for each allocation, enough to reach the datebook 
+# frames from the Django ones
+DATEBOOK_MEMORY_PROFILE_FRAMES = 30
+
+# Number of top allocation sites in memory profiles reports
+DATEBOOK_MEMORY_PROFILE_LIMIT = 15
+
+# Mode for the query budgets of views checked from 'QueryBudgetMiddleware', 
+# 'warn' to emit a warning with a report, 'raise' to raise an exception with 
+# the report and 'off' to disable it. Default None is to warn in debug mode only
+DATEBOOK_QUERY_BUDGET_MODE = None
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from django import template
+
+from datebook.metrics import timing_span
+
+register = template.Library()
+
+
+class TimingSpanNode(template.Node):
+    def __init__(self, name, nodelist):
+        self.name = name
+        self.nodelist = nodelist
+    
+    def render(self, context):
+        with timing_span(self.name.resolve(context)):
+            return self.nodelist.render(context)
+
+
+@register.tag(name="timing_span")
+def do_timing_span(parser, token):
+    """
+    Time the rendering of the enclosed content in a metrics span: ::
+    
+        {% timing_span "markup.render" %}...{% endtiming_span %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError("'{0}' tag requires a single span name argument".format(bits[0]))
+    nodelist = parser.parse(('endtiming_span',))
+    parser.delete_first_token()
+    return TimingSpanNode(parser.compile_filter(bits[1]), nodelist)
@@ -0,0 +1,705 @@
+# -*- coding: utf-8 -*-
+"""
+Tests
+"""
+import calendar
+import datetime
+from unittest import skipIf
+
+import pytz
+
+import django
+from django import http
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.forms import ValidationError
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.http import http_date
+from django.utils import timezone
+from django.utils.timezone import now as tz_now, localtime, make_aware, utc
+from django.utils import translation
+from django.views import generic
+
+from datebook.benchmarks import get_assign_daymodel_data, get_dayentry_form_data
+from datebook.budgets import QueryBudgetTestMixin
+from datebook.bulk import DayEntryBulkEdit
+from datebook.calendars import DatebookMonthTotals
+from datebook.forms.day import DayEntryBulkForm
+from datebook.forms.daymodel import AssignDayModelForm
+from datebook.importers import iter_ics_rows
+from datebook.mixins import ConditionalResponseMixin
+from datebook.models import Datebook, DatebookSummary, DayEntry, DayModel, coalesced_touches
+from datebook.views.month import DatebookMonthView
+from datebook.views.year import DatebookYearView
+from datebook.utils import format_seconds_to_clock, get_day_weekno
+from datebook.utils.timezones import combine_local
+
+
+def legacy_month_totals(datebook, current_day):
+    """
+    Weeks and month totals computed like the month view did before
+    'DatebookMonthTotals', with a loop on each day entry
+    """
+    year, month = datebook.period.year, datebook.period.month
+    week_days = [[day for day in item if day] for item in calendar.Calendar().monthdayscalendar(year, month)]
+    weeks_totals = [{'current': False, 'active': False, 'elapsed_seconds':0, 'overtime_seconds':0, 'vacations':0} for i in range(0, len(week_days))]
+    if current_day.year == year and current_day.month == month:
+        weeks_totals[get_day_weekno(week_days, current_day.day)]['current'] = True
+
+    for entry in datebook.dayentry_set.all().order_by('activity_date'):
+        # Days from the current day are projections
+        if current_day <= entry.activity_date:
+            continue
+        week = weeks_totals[get_day_weekno(week_days, entry.activity_date.day)]
+        week['active'] = True
+        if entry.vacation:
+            week['vacations'] += 1
+        else:
+            week['elapsed_seconds'] += entry.get_elapsed_seconds()
+            week['overtime_seconds'] += entry.get_overtime_seconds()
+
+    month_totals = {'elapsed_seconds': 0, 'overtime_seconds': 0, 'vacations': 0}
+    for item in weeks_totals:
+        item['elapsed_time'] = format_seconds_to_clock(item['elapsed_seconds'])
+        item['overtime_time'] = format_seconds_to_clock(item['overtime_seconds'])
+        for key in month_totals:
+            month_totals[key] += item[key]
+    month_totals['elapsed_time'] = format_seconds_to_clock(month_totals['elapsed_seconds'])
+    month_totals['overtime_time'] = format_seconds_to_clock(month_totals['overtime_seconds'])
+
+    return weeks_totals, month_totals
+
+
+class SummaryTestMixin(object):
+    """
+    Assertions on the denormalized values of day entries and datebooks
+    """
+    def activate_timezone(self, name='Europe/Paris'):
+        override = timezone.override(pytz.timezone(name))
+        override.__enter__()
+        self.addCleanup(override.__exit__, None, None, None)
+
+    def set_old_modified(self, datebooks):
+        Datebook.objects.filter(pk__in=[item.pk for item in datebooks]).update(modified=tz_now()-datetime.timedelta(days=1))
+        return dict(Datebook.objects.filter(pk__in=[item.pk for item in datebooks]).values_list('pk', 'modified'))
+
+    def assertTouched(self, modified, touched=True):
+        for pk, value in Datebook.objects.filter(pk__in=modified.keys()).values_list('pk', 'modified'):
+            if touched:
+                self.assertGreater(value, modified[pk])
+            else:
+                self.assertEqual(value, modified[pk])
+
+    def assertSummaryRebuilt(self, datebook):
+        """
+        Check the seconds columns of the datebook entries and that its summary
+        is the same than a rebuilded one
+        """
+        for entry in DayEntry.objects.filter(datebook=datebook):
+            self.assertEqual((entry.elapsed_seconds, entry.overtime_seconds), (entry.get_elapsed_seconds(), entry.get_overtime_seconds()))
+        summary = DatebookSummary.objects.get(pk=datebook.pk)
+        rebuilt = DatebookSummary.objects.rebuild(Datebook.objects.get(pk=datebook.pk))
+        self.assertEqual((summary.get_totals(), summary.get_weeks_totals()), (rebuilt.get_totals(), rebuilt.get_weeks_totals()))
+
+
+class DayEntrySummaryTestCase(SummaryTestMixin, TestCase):
+    def setUp(self):
+        self.activate_timezone()
+        author = User.objects.create_user('summary', 'summary@example.com', 'summary')
+        self.datebook = Datebook.objects.create(author=author, period=datetime.date(2015, 9, 1))
+
+    def get_entry(self, day, start=datetime.time(9, 0), stop=datetime.time(18, 0), **kwargs):
+        activity_date = self.datebook.period.replace(day=day)
+        return DayEntry(
+            datebook=self.datebook,
+            activity_date=activity_date,
+            start=combine_local(activity_date, start),
+            stop=combine_local(activity_date, stop),
+            **kwargs
+        )
+
+    def test_create_edit_delete(self):
+        for day in range(1, 15):
+            self.get_entry(day, pause=datetime.time(1, 0), overtime=datetime.time(0, day % 3 * 20), vacation=(day % 5 == 0)).save()
+        self.assertSummaryRebuilt(self.datebook)
+
+        # Edit times, vacation and date
+        entry = DayEntry.objects.get(datebook=self.datebook, activity_date=datetime.date(2015, 9, 3))
+        entry.stop = combine_local(entry.activity_date, datetime.time(20, 30))
+        entry.overtime = datetime.time(2, 30)
+        entry.save()
+        self.assertEqual(entry.elapsed_seconds, 10*3600+30*60)
+        self.assertSummaryRebuilt(self.datebook)
+
+        entry = DayEntry.objects.get(datebook=self.datebook, activity_date=datetime.date(2015, 9, 5))
+        entry.vacation = False
+        entry.save()
+        self.assertSummaryRebuilt(self.datebook)
+
+        entry = DayEntry.objects.get(datebook=self.datebook, activity_date=datetime.date(2015, 9, 6))
+        entry.activity_date = datetime.date(2015, 9, 28)
+        entry.start = combine_local(entry.activity_date, datetime.time(8, 0))
+        entry.stop = combine_local(entry.activity_date, datetime.time(12, 0))
+        entry.save()
+        self.assertSummaryRebuilt(self.datebook)
+
+        # Delete from an instance and from a queryset
+        DayEntry.objects.get(datebook=self.datebook, activity_date=datetime.date(2015, 9, 7)).delete()
+        self.assertSummaryRebuilt(self.datebook)
+        DayEntry.objects.filter(datebook=self.datebook, activity_date__gte=datetime.date(2015, 9, 10)).delete()
+        self.assertSummaryRebuilt(self.datebook)
+        self.assertEqual(DatebookSummary.objects.get(pk=self.datebook.pk).entries, 7)
+
+    def test_bulk_create(self):
+        self.get_entry(1).save()
+        DayEntry.objects.bulk_create([self.get_entry(day, pause=datetime.time(0, 45), overtime=datetime.time(1, 0), vacation=(day % 4 == 0)) for day in range(2, 31)])
+        self.assertSummaryRebuilt(self.datebook)
+        self.assertEqual(DatebookSummary.objects.get(pk=self.datebook.pk).entries, 30)
+
+
+class DatebookYearViewTestCase(SummaryTestMixin, TestCase):
+    def setUp(self):
+        self.activate_timezone()
+        self.author = User.objects.create_user('year', 'year@example.com', 'year')
+        for month in range(1, 7):
+            datebook = Datebook.objects.create(author=self.author, period=datetime.date(2015, month, 1))
+            for day in range(1, month+1):
+                activity_date = datebook.period.replace(day=day)
+                DayEntry(
+                    datebook=datebook,
+                    activity_date=activity_date,
+                    start=combine_local(activity_date, datetime.time(9, 0)),
+                    stop=combine_local(activity_date, datetime.time(18, 0)),
+                    vacation=(day == 3),
+                ).save()
+        self.view = DatebookYearView()
+        self.view.object = self.author
+        self.view.year = 2015
+
+    def get_selects(self, missing):
+        DatebookSummary.objects.filter(datebook__period__lte=datetime.date(2015, missing, 1)).delete()
+        with CaptureQueriesContext(connection) as context:
+            datebooks = self.view.get_datebook_totals(datetime.date(2016, 1, 1))
+        self.assertEqual([item['entries'] for item in datebooks], range(1, 7))
+        self.assertEqual([item['vacations'] for item in datebooks], [0, 0, 1, 1, 1, 1])
+        for datebook in Datebook.objects.filter(author=self.author):
+            self.assertSummaryRebuilt(datebook)
+        return len([item for item in context.captured_queries if 'SELECT' in item['sql'] and 'INSERT' not in item['sql'] and 'UPDATE' not in item['sql']])
+
+    def test_missing_summaries(self):
+        # Rebuilding summaries doesn't select each missing datebook
+        self.assertEqual(self.get_selects(1), self.get_selects(6))
+
+
+class DatebookMonthTotalsTestCase(TestCase):
+    current_day = datetime.date(2015, 10, 15)
+
+    def setUp(self):
+        self.author = User.objects.create_user('totals', 'totals@example.com', 'totals')
+
+    def create_datebook(self, period, entries=True):
+        datebook = Datebook.objects.create(author=self.author, period=period)
+        if entries:
+            for day in range(1, calendar.monthrange(period.year, period.month)[1]+1):
+                activity_date = period.replace(day=day)
+                DayEntry(
+                    datebook=datebook,
+                    activity_date=activity_date,
+                    start=combine_local(activity_date, datetime.time(8, day % 4 * 15)),
+                    stop=combine_local(activity_date, datetime.time(17 + day % 3, 30)),
+                    pause=datetime.time(1, 0),
+                    overtime=datetime.time(0, day % 2 * 45),
+                    vacation=(day % 9 == 0),
+                ).save()
+        return Datebook.objects.get(pk=datebook.pk)
+
+    def assertTotalsEqual(self, datebook):
+        totals = DatebookMonthTotals(datebook, self.current_day).compute(datebook.dayentry_set.all())
+        self.assertEqual(totals, legacy_month_totals(datebook, self.current_day))
+        return totals
+
+    def test_past_month(self):
+        datebook = self.create_datebook(datetime.date(2015, 9, 1))
+        # Totals come from the summary without any query on day entries
+        with self.assertNumQueries(1):
+            weeks_totals, month_totals = DatebookMonthTotals(datebook, self.current_day).compute(datebook.dayentry_set.all())
+        weeks_totals, month_totals = self.assertTotalsEqual(datebook)
+        self.assertEqual(month_totals['vacations'], 3)
+        self.assertTrue(all([item['active'] for item in weeks_totals]))
+
+    def test_current_month(self):
+        datebook = self.create_datebook(datetime.date(2015, 10, 1))
+        weeks_totals, month_totals = self.assertTotalsEqual(datebook)
+        # Projected days from the 15 are not counted
+        self.assertEqual(month_totals['vacations'], 1)
+        self.assertEqual([item['current'] for item in weeks_totals], [False, False, True, False, False])
+        self.assertEqual([item['active'] for item in weeks_totals], [True, True, True, False, False])
+
+    def test_future_month(self):
+        datebook = self.create_datebook(datetime.date(2015, 11, 1))
+        weeks_totals, month_totals = self.assertTotalsEqual(datebook)
+        self.assertEqual(month_totals['elapsed_seconds'], 0)
+        self.assertFalse(any([item['active'] for item in weeks_totals]))
+
+    def test_empty_month(self):
+        datebook = self.create_datebook(datetime.date(2015, 8, 1), entries=False)
+        weeks_totals, month_totals = self.assertTotalsEqual(datebook)
+        self.assertEqual(month_totals['elapsed_time'], format_seconds_to_clock(0))
+        self.assertFalse(any([item['active'] for item in weeks_totals]))
+
+
+class ConditionalView(ConditionalResponseMixin, generic.View):
+    modified = None
+
+    def get_modified(self):
+        return self.modified
+
+    def get(self, request, *args, **kwargs):
+        response = self.get_not_modified_response()
+        if response is not None:
+            return response
+        return self.set_validators(http.HttpResponse('page'))
+
+
+class ConditionalResponseMixinTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user('conditional', 'conditional@example.com', 'conditional')
+        self.view = ConditionalView.as_view(modified=tz_now())
+
+    def get(self, user=None, **extra):
+        request = self.factory.get('/', **extra)
+        request.user = user or self.user
+        return self.view(request)
+
+    def test_etag(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        response = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # The page of another user is another version
+        other = User.objects.create_user('other', 'other@example.com', 'other')
+        self.assertEqual(self.get(other, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_if_modified_since_alone(self):
+        response = self.get(HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+
+    def get_month_etag(self, datebook):
+        view = DatebookMonthView()
+        view.request = self.factory.get('/')
+        view.request.user = self.user
+        view.author = self.user
+        view.object = datebook
+        view.day_models = view.get_day_models()
+        return view.get_etag()
+
+    def test_month_day_models(self):
+        # Renaming a day model doesn't touch the datebook but changes the page
+        datebook = Datebook.objects.create(author=self.user, period=datetime.date(2015, 9, 1))
+        daymodel = DayModel.objects.create(
+            author=self.user,
+            title='Office',
+            start=combine_local(datetime.date(2015, 1, 5), datetime.time(9, 0)),
+            stop=combine_local(datetime.date(2015, 1, 5), datetime.time(18, 0)),
+        )
+        etag = self.get_month_etag(datebook)
+        self.assertEqual(self.get_month_etag(datebook), etag)
+
+        daymodel.title = 'Home'
+        daymodel.save()
+        self.assertNotEqual(self.get_month_etag(Datebook.objects.get(pk=datebook.pk)), etag)
+
+
+class CoalescedTouchesTestCase(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('touches', 'touches@example.com', 'touches')
+        self.datebook = Datebook.objects.create(author=author, period=datetime.date(2015, 9, 1))
+        Datebook.objects.filter(pk=self.datebook.pk).update(modified=self.datebook.created-datetime.timedelta(days=1))
+
+    def get_modified(self):
+        return Datebook.objects.values_list('modified', flat=True).get(pk=self.datebook.pk)
+
+    def test_touch_at_the_end(self):
+        modified = self.get_modified()
+        with coalesced_touches():
+            Datebook.objects.touch([self.datebook.pk])
+            self.assertEqual(self.get_modified(), modified)
+        self.assertGreater(self.get_modified(), modified)
+
+    def test_touch_on_exception(self):
+        # Writes made before the error are kept with autocommit
+        modified = self.get_modified()
+        with self.assertRaises(ValueError):
+            with coalesced_touches():
+                Datebook.objects.touch([self.datebook.pk])
+                raise ValueError
+        self.assertGreater(self.get_modified(), modified)
+
+
+class AssignDayModelFormTestCase(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('assign', 'assign@example.com', 'assign')
+        self.datebook = Datebook.objects.create(author=self.author, period=datetime.date(2015, 9, 1))
+        self.daymodel = DayModel.objects.create(
+            author=self.author,
+            title='Office',
+            start=combine_local(datetime.date(2015, 1, 5), datetime.time(9, 0)),
+            stop=combine_local(datetime.date(2015, 1, 5), datetime.time(18, 0)),
+            pause=datetime.time(1, 0),
+            overtime=datetime.time(0, 30),
+            content='At the office',
+        )
+        # Existing days are on even day numbers
+        for day in range(2, 29, 2):
+            activity_date = self.datebook.period.replace(day=day)
+            DayEntry(
+                datebook=self.datebook,
+                activity_date=activity_date,
+                start=combine_local(activity_date, datetime.time(10, 0)),
+                stop=combine_local(activity_date, datetime.time(16, 0)),
+                vacation=(day % 4 == 0),
+            ).save()
+        self.datebook = Datebook.objects.get(pk=self.datebook.pk)
+        self.datebook.get_summary()
+
+    def get_form(self, days):
+        return AssignDayModelForm(
+            {'days': [str(day) for day in days], 'daymodel': self.daymodel.pk, 'with_content': 'on'},
+            author=self.author,
+            datebook=self.datebook,
+            daychoices=range(1, 31),
+        )
+
+    def get_valid_form(self, days):
+        form = self.get_form(days)
+        self.assertTrue(form.is_valid(), form.errors)
+        return form
+
+    def test_query_count(self):
+        # A few days, then many days, both with existing and missing entries
+        form = self.get_valid_form(range(1, 5))
+        with CaptureQueriesContext(connection) as context:
+            form.save()
+        form = self.get_valid_form(range(5, 29))
+        with self.assertNumQueries(len(context.captured_queries)):
+            form.save()
+
+        self.assertEqual(self.datebook.dayentry_set.filter(activity_date__lt=datetime.date(2015, 9, 29)).count(), 28)
+        self.assertFalse(self.datebook.dayentry_set.filter(vacation=True).exists())
+        for entry in self.datebook.dayentry_set.all():
+            self.assertEqual(entry.content, 'At the office')
+            self.assertEqual(entry.elapsed_seconds, self.daymodel.get_elapsed_seconds())
+
+        # Summary is kept in sync with the entries
+        summary = Datebook.objects.get(pk=self.datebook.pk).summary
+        self.assertEqual(summary.entries, 28)
+        self.assertEqual(summary.vacations, 0)
+        self.assertEqual(summary.elapsed_seconds, 28*self.daymodel.get_elapsed_seconds())
+
+
+class DayEntryBulkEditTestCase(SummaryTestMixin, TestCase):
+    def setUp(self):
+        self.activate_timezone()
+        self.author = User.objects.create_user('bulk', 'bulk@example.com', 'bulk')
+        self.datebooks = []
+        for period in (datetime.date(2015, 9, 1), datetime.date(2015, 10, 1)):
+            datebook = Datebook.objects.create(author=self.author, period=period)
+            for day in range(1, 29):
+                activity_date = period.replace(day=day)
+                DayEntry(
+                    datebook=datebook,
+                    activity_date=activity_date,
+                    start=combine_local(activity_date, datetime.time(9, 0)),
+                    stop=combine_local(activity_date, datetime.time(18, 0)),
+                    pause=datetime.time(1, 0),
+                    vacation=(day % 7 == 0),
+                ).save()
+            self.datebooks.append(datebook)
+        self.modified = self.set_old_modified(self.datebooks)
+
+    def get_dates(self, start, end):
+        return [start+datetime.timedelta(days=i) for i in range((end-start).days+1)]
+
+    def assertSummariesRebuilt(self):
+        for datebook in self.datebooks:
+            self.assertSummaryRebuilt(datebook)
+
+    def test_mark_vacation(self):
+        # Worked days, vacation days and missing days from both months
+        dates = self.get_dates(datetime.date(2015, 9, 26), datetime.date(2015, 10, 2))
+        bulk = DayEntryBulkEdit(self.author, dates).mark_vacation()
+        self.assertEqual((bulk.created, bulk.updated), (2, 4))
+
+        entries = DayEntry.objects.filter(activity_date__in=dates)
+        self.assertEqual(entries.filter(vacation=True).count(), 7)
+        created = entries.get(activity_date=datetime.date(2015, 9, 29))
+        self.assertEqual((localtime(created.start).time(), localtime(created.stop).time()), (datetime.time(9, 0), datetime.time(18, 0)))
+        self.assertSummariesRebuilt()
+        self.assertTouched(self.modified)
+
+    def test_delete(self):
+        dates = self.get_dates(datetime.date(2015, 9, 10), datetime.date(2015, 10, 7))
+        bulk = DayEntryBulkEdit(self.author, dates).delete()
+        self.assertEqual(bulk.deleted, 26)
+        self.assertFalse(DayEntry.objects.filter(activity_date__in=dates).exists())
+        self.assertSummariesRebuilt()
+        self.assertTouched(self.modified)
+
+    def test_set_times(self):
+        dates = self.get_dates(datetime.date(2015, 9, 20), datetime.date(2015, 10, 10))
+        bulk = DayEntryBulkEdit(self.author, dates).set_times(pause=datetime.time(0, 30), overtime=datetime.time(1, 15))
+        self.assertEqual(bulk.updated, 19)
+
+        for entry in DayEntry.objects.filter(activity_date__in=dates):
+            self.assertEqual((entry.pause, entry.overtime), (datetime.time(0, 30), datetime.time(1, 15)))
+            self.assertEqual(entry.elapsed_seconds, 8*3600+30*60)
+        # Other days are untouched
+        self.assertEqual(DayEntry.objects.get(activity_date=datetime.date(2015, 9, 19)).pause, datetime.time(1, 0))
+        self.assertSummariesRebuilt()
+        self.assertTouched(self.modified)
+
+        # Only the overtime
+        DayEntryBulkEdit(self.author, dates).set_times(overtime=datetime.time(0, 0))
+        self.assertFalse(DayEntry.objects.filter(activity_date__in=dates, overtime_seconds__gt=0).exists())
+        self.assertEqual(DayEntry.objects.get(activity_date=datetime.date(2015, 9, 20)).pause, datetime.time(0, 30))
+        self.assertSummariesRebuilt()
+
+    def test_shift(self):
+        dates = self.get_dates(datetime.date(2015, 9, 27), datetime.date(2015, 10, 3))
+        DayEntryBulkEdit(self.author, dates).shift(datetime.timedelta(minutes=-90))
+
+        for entry in DayEntry.objects.filter(activity_date__in=dates):
+            self.assertEqual((localtime(entry.start).time(), localtime(entry.stop).time()), (datetime.time(7, 30), datetime.time(16, 30)))
+            self.assertEqual(entry.elapsed_seconds, 8*3600)
+        self.assertEqual(localtime(DayEntry.objects.get(activity_date=datetime.date(2015, 9, 26)).start).time(), datetime.time(9, 0))
+        self.assertSummariesRebuilt()
+        self.assertTouched(self.modified)
+
+    def test_shift_dst(self):
+        # The day starts in summer time and the shift crosses the change to
+        # winter time at 3:00, so the wall-clock start moves one hour less
+        activity_date = datetime.date(2015, 10, 25)
+        entry = DayEntry.objects.get(activity_date=activity_date)
+        entry.start = combine_local(activity_date, datetime.time(1, 30))
+        entry.save()
+        self.modified = self.set_old_modified([entry.datebook])
+
+        DayEntryBulkEdit(self.author, [activity_date]).shift(datetime.timedelta(hours=2))
+        entry = DayEntry.objects.get(pk=entry.pk)
+        self.assertEqual(localtime(entry.start).replace(tzinfo=None), datetime.datetime(2015, 10, 25, 2, 30))
+        self.assertEqual(localtime(entry.stop).replace(tzinfo=None), datetime.datetime(2015, 10, 25, 20, 0))
+        # Elapsed time is from the real duration, which has not changed
+        self.assertEqual(entry.elapsed_seconds, 16*3600+30*60)
+        self.assertSummariesRebuilt()
+        self.assertTouched(self.modified)
+
+    def test_shift_invalid(self):
+        # Days would start on the day before
+        dates = self.get_dates(datetime.date(2015, 9, 27), datetime.date(2015, 10, 3))
+        with self.assertRaises(ValidationError) as context:
+            DayEntryBulkEdit(self.author, dates).shift(datetime.timedelta(hours=-10))
+        # 29 and 30 september are missing
+        self.assertEqual(len(context.exception.messages), 5)
+
+        # Nothing is updated
+        for entry in DayEntry.objects.filter(activity_date__in=dates):
+            self.assertEqual(localtime(entry.start).time(), datetime.time(9, 0))
+        self.assertSummariesRebuilt()
+        self.assertTouched(self.modified, touched=False)
+
+
+class DayEntryBulkFormTestCase(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('bulkform', 'bulkform@example.com', 'bulkform')
+        # Error messages are checked in english
+        override = translation.override('en')
+        override.__enter__()
+        self.addCleanup(override.__exit__, None, None, None)
+
+    def get_form(self, **data):
+        data.update({'start': '2015-09-01', 'end': '2015-09-10', 'operation': 'shift'})
+        return DayEntryBulkForm(self.author, data)
+
+    def test_shift(self):
+        form = self.get_form(shift='-30')
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['shift'], -30)
+
+    def test_shift_missing(self):
+        form = self.get_form()
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['shift'], ["This field is required for this operation"])
+
+    def test_shift_invalid(self):
+        form = self.get_form(shift='foo')
+        self.assertFalse(form.is_valid())
+        self.assertEqual(len(form.errors['shift']), 1)
+
+    def test_shift_zero(self):
+        form = self.get_form(shift='0')
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['shift'], ["Shift can't be zero"])
+
+
+class CombineLocalTestCase(TestCase):
+    paris = pytz.timezone('Europe/Paris')
+
+    def assertCombined(self, day, walltime, utc_value, tz=paris):
+        self.assertEqual(combine_local(day, walltime, tz), utc.localize(utc_value))
+
+    def test_ordinary_dates(self):
+        # Same than 'make_aware' for every day of a year, in timezones with and
+        # without DST
+        for tz in (self.paris, pytz.timezone('America/New_York'), pytz.timezone('Asia/Tokyo'), utc):
+            day = datetime.date(2015, 1, 1)
+            while day.year == 2015:
+                for walltime in (datetime.time(0, 0), datetime.time(9, 30), datetime.time(23, 59)):
+                    value = datetime.datetime.combine(day, walltime)
+                    try:
+                        expected = make_aware(value, tz)
+                    except (pytz.AmbiguousTimeError, pytz.NonExistentTimeError):
+                        continue
+                    self.assertEqual(combine_local(day, walltime, tz), expected)
+                day += datetime.timedelta(days=1)
+
+    def test_spring_forward(self):
+        # 2:00 to 3:00 does not exist on 29 march 2015, it is resolved as standard time
+        day = datetime.date(2015, 3, 29)
+        self.assertCombined(day, datetime.time(1, 30), datetime.datetime(2015, 3, 29, 0, 30))
+        self.assertCombined(day, datetime.time(2, 30), datetime.datetime(2015, 3, 29, 1, 30))
+        self.assertCombined(day, datetime.time(3, 30), datetime.datetime(2015, 3, 29, 1, 30))
+        self.assertCombined(day, datetime.time(9, 0), datetime.datetime(2015, 3, 29, 7, 0))
+        # Days around are out of the transition
+        self.assertCombined(datetime.date(2015, 3, 28), datetime.time(9, 0), datetime.datetime(2015, 3, 28, 8, 0))
+        self.assertCombined(datetime.date(2015, 3, 30), datetime.time(9, 0), datetime.datetime(2015, 3, 30, 7, 0))
+
+    def test_autumn_fold(self):
+        # 2:00 to 3:00 happens twice on 25 october 2015, it is resolved as standard time
+        day = datetime.date(2015, 10, 25)
+        self.assertCombined(day, datetime.time(1, 30), datetime.datetime(2015, 10, 24, 23, 30))
+        self.assertCombined(day, datetime.time(2, 30), datetime.datetime(2015, 10, 25, 1, 30))
+        self.assertCombined(day, datetime.time(3, 30), datetime.datetime(2015, 10, 25, 2, 30))
+        self.assertCombined(day, datetime.time(9, 0), datetime.datetime(2015, 10, 25, 8, 0))
+        self.assertCombined(datetime.date(2015, 10, 24), datetime.time(9, 0), datetime.datetime(2015, 10, 24, 7, 0))
+        self.assertCombined(datetime.date(2015, 10, 26), datetime.time(9, 0), datetime.datetime(2015, 10, 26, 8, 0))
+
+    def test_current_timezone(self):
+        with timezone.override(self.paris):
+            self.assertEqual(combine_local(datetime.date(2015, 7, 1), datetime.time(9, 0)), utc.localize(datetime.datetime(2015, 7, 1, 7, 0)))
+        with timezone.override(pytz.timezone('America/New_York')):
+            self.assertEqual(combine_local(datetime.date(2015, 7, 1), datetime.time(9, 0)), utc.localize(datetime.datetime(2015, 7, 1, 13, 0)))
+
+
+class IcsImportTestCase(TestCase):
+    def get_rows(self, *events):
+        lines = ['BEGIN:VCALENDAR']
+        for properties in events:
+            lines.extend(['BEGIN:VEVENT', 'DTSTART:20150907T070000Z', 'DTEND:20150907T160000Z']+list(properties)+['END:VEVENT'])
+        lines.append('END:VCALENDAR')
+        return [row['vacation'] for row in iter_ics_rows([u'{0}\r\n'.format(line) for line in lines], author='ics')]
+
+    def test_vacation_property(self):
+        rows = self.get_rows(
+            ['SUMMARY:Vacation', 'X-DATEBOOK-VACATION:FALSE'],
+            [u'SUMMARY:Cong\xe9s', 'X-DATEBOOK-VACATION:TRUE'],
+            ['X-DATEBOOK-VACATION:TRUE', 'SUMMARY:8:00h worked'],
+        )
+        self.assertEqual(rows, [False, True, True])
+
+    def test_vacation_summary(self):
+        # Events without the property, from another language than the current one
+        with translation.override('fr'):
+            summary = translation.ugettext('Vacation')
+        with translation.override('en'):
+            rows = self.get_rows(['SUMMARY:Vacation'], [u'SUMMARY:{0}'.format(summary)], ['SUMMARY:8:00h worked'])
+        self.assertEqual(rows, [True, False, False])
+        with translation.override('fr'):
+            rows = self.get_rows(['SUMMARY:Vacation'], [u'SUMMARY:{0}'.format(summary)], ['SUMMARY:8:00h worked'])
+        self.assertEqual(rows, [True, True, False])
+
+
+@skipIf(django.VERSION < (1, 8), "Recording queries needs Django >= 1.8")
+class QueryBudgetsTestCase(SummaryTestMixin, QueryBudgetTestMixin, TestCase):
+    """
+    Each budgeted view is requested with its 'query_budget', views are
+    reversed from the 'datebook' namespace of the project urls
+    """
+    def setUp(self):
+        self.activate_timezone()
+        self.author = User.objects.create_superuser('budget', 'budget@example.com', 'budget')
+        User.objects.create_user('available', 'available@example.com', 'available')
+        self.datebook = Datebook.objects.create(author=self.author, period=datetime.date(2015, 9, 1))
+        for day in range(1, 11):
+            activity_date = self.datebook.period.replace(day=day)
+            DayEntry.objects.create(
+                datebook=self.datebook,
+                activity_date=activity_date,
+                start=combine_local(activity_date, datetime.time(9, 0)),
+                stop=combine_local(activity_date, datetime.time(18, 0)),
+                pause=datetime.time(1, 0),
+            )
+        self.daymodel = DayModel.objects.create(
+            author=self.author,
+            title='Budget',
+            start=combine_local(self.datebook.period, datetime.time(8, 0)),
+            stop=combine_local(self.datebook.period, datetime.time(17, 0)),
+            pause=datetime.time(1, 0),
+        )
+        self.client.login(username='budget', password='budget')
+
+    def get_url(self, name, **kwargs):
+        if kwargs.pop('author', True):
+            kwargs['author'] = self.author.username
+        return reverse('datebook:{0}'.format(name), kwargs=kwargs)
+
+    def assertViewBudget(self, url, status_code=200, method='get', data=None):
+        response = self.assertQueryBudget(url, method=method, data=data)
+        self.assertEqual(response.status_code, status_code, url)
+        return response
+
+    def test_read_views(self):
+        month = {'year': 2015, 'month': 9}
+        self.assertViewBudget(self.get_url('index', author=False))
+        self.assertViewBudget(self.get_url('owner-autocomplete', author=False))
+        self.assertViewBudget(self.get_url('author-detail'))
+        self.assertViewBudget(self.get_url('author-calendar-feed'))
+        self.assertViewBudget(self.get_url('year-calendar-feed', year=2015))
+        self.assertViewBudget(self.get_url('year-detail', year=2015))
+        self.assertViewBudget(self.get_url('month-detail', **month))
+        self.assertViewBudget(self.get_url('month-json', **month))
+        self.assertViewBudget(self.get_url('day-detail', day=3, **month))
+        self.assertViewBudget(self.get_url('day-models'))
+        with override_settings(DATEBOOK_METRICS_ENABLED=True):
+            self.assertViewBudget(self.get_url('metrics', author=False))
+
+    def test_redirect_views(self):
+        self.assertViewBudget(self.get_url('month-add', year=2015, month=10), status_code=302)
+        self.assertViewBudget(self.get_url('current-month'), status_code=302)
+        self.assertViewBudget(self.get_url('current-day'), status_code=302)
+
+    def test_form_views(self):
+        month = {'year': 2015, 'month': 9}
+        day = self.datebook.period.replace(day=15)
+        forms = [
+            (self.get_url('create', author=False), {'owner': 'available', 'period': '2015-09-01'}),
+            (self.get_url('month-detail', **month), get_assign_daymodel_data([11, 12], self.daymodel.pk)),
+            (self.get_url('month-notes', **month), {'notes': 'Budget notes'}),
+            (self.get_url('month-copy', **month), {'target': '2015-11-01', 'with_content': '1'}),
+            (self.get_url('day-add', day=15, **month), get_dayentry_form_data(day)),
+            (self.get_url('day-edit', day=15, **month), get_dayentry_form_data(day, stop=datetime.time(19, 0))),
+            (self.get_url('dayentry-to-daymodel', day=15, **month), dict(get_dayentry_form_data(day), title='From day')),
+            (self.get_url('day-remove', day=15, **month), {}),
+            (self.get_url('day-model-edit', pk=self.daymodel.pk), dict(get_dayentry_form_data(self.datebook.period), title='Edited')),
+            (self.get_url('day-model-schedule', pk=self.daymodel.pk), {'start': '2015-09-14', 'end': '2015-09-27', 'weekdays': ['0', '1', '2', '3', '4'], 'every': '1', 'skip_existing': '1'}),
+            (self.get_url('days-bulk'), {'start': '2015-09-01', 'end': '2015-09-05', 'operation': 'vacation'}),
+        ]
+        for url, data in forms:
+            self.assertViewBudget(url)
+            self.assertViewBudget(url, status_code=302, method='post', data=data)
+        self.assertSummaryRebuilt(self.datebook)
@@ -7,28 +7,41 @@ from django.conf.urls import *
 from datebook.views import IndexView
 from datebook.views.author import DatebookAuthorView
 from datebook.views.year import DatebookYearView
-from datebook.views.month import DatebookMonthView, DatebookMonthGetOrCreateView, DatebookMonthCurrentView, DatebookMonthFormView, DatebookNotesFormView
-from datebook.views.day import DayEntryFormCreateView, DayEntryDetailView, DayEntryFormEditView, DayEntryCurrentView, DayEntryDeleteFormView
-from datebook.views.daymodel import DayModelListView, DayEntryToDayModelFormView, DayModelFormEditView
+from datebook.views.month import DatebookMonthView, DatebookMonthJsonView, DatebookMonthGetOrCreateView, DatebookMonthCurrentView, DatebookMonthFormView, DatebookOwnerAutocompleteView, DatebookNotesFormView, DatebookMonthCopyFormView
+from datebook.views.day import DayEntryFormCreateView, DayEntryDetailView, DayEntryFormEditView, DayEntryCurrentView, DayEntryDeleteFormView, DayEntryBulkFormView
+from datebook.views.export import DayEntryExportView, DatebookCalendarFeedView
+from datebook.views.daymodel import DayModelListView, DayEntryToDayModelFormView, DayModelFormEditView, DayModelScheduleFormView
+from datebook.views.metrics import DatebookMetricsView
 
 urlpatterns = patterns('',
     url(r'^$', IndexView.as_view(), name='index'),
     
     url(r'^create/$', DatebookMonthFormView.as_view(), name='create'),
+    url(r'^create/owners/$', DatebookOwnerAutocompleteView.as_view(), name='owner-autocomplete'),
+    url(r'^export/$', DayEntryExportView.as_view(), name='export'),
+    url(r'^metrics/$', DatebookMetricsView.as_view(), name='metrics'),
     
     url(r'^(?P<author>\w+)/$', DatebookAuthorView.as_view(), name='author-detail'),
+    url(r'^(?P<author>\w+)/export/$', DayEntryExportView.as_view(), name='author-export'),
+    url(r'^(?P<author>\w+)/calendar\.ics$', DatebookCalendarFeedView.as_view(), name='author-calendar-feed'),
     
     url(r'^(?P<author>\w+)/day-models/$', DayModelListView.as_view(), name='day-models'),
     url(r'^(?P<author>\w+)/day-models/(?P<pk>\d+)/$', DayModelFormEditView.as_view(), name='day-model-edit'),
+    url(r'^(?P<author>\w+)/day-models/(?P<pk>\d+)/schedule/$', DayModelScheduleFormView.as_view(), name='day-model-schedule'),
+    
+    url(r'^(?P<author>\w+)/bulk/$', DayEntryBulkFormView.as_view(), name='days-bulk'),
     
     url(r'^(?P<author>\w+)/current-day/$', DayEntryCurrentView.as_view(), name='current-day'),
     url(r'^(?P<author>\w+)/current-month/$', DatebookMonthCurrentView.as_view(), name='current-month'),
     
     url(r'^(?P<author>\w+)/(?P<year>\d{4})/$', DatebookYearView.as_view(), name='year-detail'),
+    url(r'^(?P<author>\w+)/(?P<year>\d{4})/calendar\.ics$', DatebookCalendarFeedView.as_view(), name='year-calendar-feed'),
     url(r'^(?P<author>\w+)/(?P<year>\d{4})/add/(?P<month>\d{1,2})/$', DatebookMonthGetOrCreateView.as_view(), name='month-add'),
     
     url(r'^(?P<author>\w+)/(?P<year>\d{4})/(?P<month>\d{1,2})/$', DatebookMonthView.as_view(), name='month-detail'),
+    url(r'^(?P<author>\w+)/(?P<year>\d{4})/(?P<month>\d{1,2})/json/$', DatebookMonthJsonView.as_view(), name='month-json'),
     url(r'^(?P<author>\w+)/(?P<year>\d{4})/(?P<month>\d{1,2})/notes/$', DatebookNotesFormView.as_view(), name='month-notes'),
+    url(r'^(?P<author>\w+)/(?P<year>\d{4})/(?P<month>\d{1,2})/copy/$', DatebookMonthCopyFormView.as_view(), name='month-copy'),
     
     url(r'^(?P<author>\w+)/(?P<year>\d{4})/(?P<month>\d{1,2})/add/(?P<day>\d{1,2})/$', DayEntryFormCreateView.as_view(), name='day-add'),
     
@@ -45,3 +45,62 @@ def get_day_weekno(weeks, dayno):
             return i
     # This should never happend
     raise ValueError
+
+def month_weeks_index(year, month):
+    """
+    Return a dict mapping each day number of the given month to the week number
+    (index on zero) it belongs to
+    """
+    index = {}
+    for i, week in enumerate(calendar.Calendar().monthdayscalendar(year, month), start=0):
+        for dayno in week:
+            if dayno:
+                index[dayno] = i
+    return index
+
+def get_matching_weekday(day, period):
+    """
+    Return the date from the month of the given period that is the same weekday 
+    occurrence than the given day (like the second tuesday), None if this month 
+    does not have this occurrence
+    """
+    first = (day.weekday()-period.replace(day=1).weekday()) % 7 + 1
+    dayno = first + 7*((day.day-1)//7)
+    if dayno > calendar.monthrange(period.year, period.month)[1]:
+        return None
+    return period.replace(day=dayno)
+
+def empty_totals():
+    """Return a totals dict with all counters to zero"""
+    return {'entries': 0, 'elapsed_seconds': 0, 'overtime_seconds': 0, 'vacations': 0}
+
+def add_day_totals(totals, activity_date, vacation, elapsed_seconds, overtime_seconds, sign=1):
+    """
+    Add (or substract with sign=-1) a day entry values to the given totals dict
+
+    Vacation days are counted apart and never add their elapsed or overtime seconds
+    """
+    totals['entries'] += sign
+    if vacation:
+        totals['vacations'] += sign
+    else:
+        totals['elapsed_seconds'] += sign*elapsed_seconds
+        totals['overtime_seconds'] += sign*overtime_seconds
+    return totals
+
+def summarize_day_values(year, month, values):
+    """
+    Compute month and weeks totals from an iterable of day entry values, each
+    value is a tuple ``(activity_date, vacation, elapsed_seconds, overtime_seconds)``
+
+    Return a tuple ``(totals, weeks_totals)`` where weeks totals is a list of
+    totals dicts for each week of the month
+    """
+    weeks_index = month_weeks_index(year, month)
+    totals = empty_totals()
+    weeks_totals = [empty_totals() for i in range(0, max(weeks_index.values())+1)]
+    for item in values:
+        add_day_totals(totals, *item)
+        if item[0].day in weeks_index:
+            add_day_totals(weeks_totals[weeks_index[item[0].day]], *item)
+    return totals, weeks_totals
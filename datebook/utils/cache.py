@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Cache helpers
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.encoding import force_text
+
+def get_datebook_cache():
+    """
+    Return the cache backend defined in 'DATEBOOK_CACHE' setting, None if 
+    cache is disabled
+    """
+    if not settings.DATEBOOK_CACHE:
+        return None
+    return caches[settings.DATEBOOK_CACHE]
+
+def get_version_key(value):
+    """
+    Return a string to use as a version in keys from a datetime
+    """
+    return value.strftime('%Y%m%d%H%M%S%f')
+
+def make_cache_key(*parts):
+    """
+    Return a cache key from the given parts prefixed with the application name
+    """
+    return ':'.join(['datebook']+[force_text(item).replace(' ', '_') for item in parts])
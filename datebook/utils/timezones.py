@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Timezone helpers to combine local dates with wall-clock times
+"""
+import datetime
+
+from django.conf import settings
+from django.utils.timezone import get_current_timezone, localtime, utc
+
+# Tables of day offsets indexed on tuples (TIMEZONE_NAME, YEAR), they are
+# builded once for each process
+_offsets_tables = {}
+
+def localize(value, tz):
+    """
+    Make a naive datetime aware in the given timezone, ambiguous or non existent
+    times (during DST transitions) are resolved as standard time
+    """
+    if hasattr(tz, 'localize'):
+        return tz.localize(value, is_dst=False)
+    return value.replace(tzinfo=tz)
+
+def get_offsets_table(tz, year):
+    """
+    Return a dict of UTC offsets indexed on the dates of the given year for
+    the given timezone
+
+    Dates with a DST transition are not in the table since their offset
+    depends on the time.
+    """
+    key = (getattr(tz, 'zone', None) or str(tz), year)
+    if key not in _offsets_tables:
+        table = {}
+        day = datetime.date(year, 1, 1)
+        offset = localize(datetime.datetime(year, 1, 1), tz).utcoffset()
+        while day.year == year:
+            next_day = day+datetime.timedelta(days=1)
+            next_offset = localize(datetime.datetime.combine(next_day, datetime.time.min), tz).utcoffset()
+            if offset == next_offset:
+                table[day] = offset
+            day, offset = next_day, next_offset
+        _offsets_tables[key] = table
+    return _offsets_tables[key]
+
+def combine_local(day, walltime, tz=None):
+    """
+    Return the UTC datetime for the given local date and wall-clock time, in
+    the current timezone if not given
+
+    Without timezone support, return the naive combined datetime.
+    """
+    value = datetime.datetime.combine(day, walltime)
+    if not settings.USE_TZ:
+        return value
+
+    tz = tz or get_current_timezone()
+    offset = get_offsets_table(tz, day.year).get(day)
+    # Days with a DST transition
+    if offset is None:
+        return localize(value, tz).astimezone(utc)
+    return (value-offset).replace(tzinfo=utc)
+
+def get_walltime(value):
+    """
+    Return the wall-clock time of a datetime, in the current timezone for
+    aware ones
+    """
+    if settings.USE_TZ:
+        value = localtime(value)
+    return value.time()
@@ -2,6 +2,7 @@
 """
 Some generic views
 """
+from django.http import Http404
 from django.views.generic.list import ListView
 from django.views.generic.edit import FormMixin
 
@@ -31,6 +32,15 @@ class ListAppendView(ListView, FormMixin):
     def form_invalid(self, form):
         return self.render_to_response(self.get_context_data(object_list=self.object_list, form=form))
 
+    def is_empty_list(self, object_list):
+        """
+        Check if the object list is empty with an existence test for querysets 
+        instead of loading them
+        """
+        if hasattr(object_list, 'exists'):
+            return not object_list.exists()
+        return len(object_list) == 0
+
     def get_locked_form(self, form_class):
         return self.locked_form
 
@@ -49,7 +59,7 @@ class ListAppendView(ListView, FormMixin):
         form = self.get_form(form_class)
         
         allow_empty = self.get_allow_empty()
-        if not allow_empty and len(self.object_list) == 0:
+        if not allow_empty and self.is_empty_list(self.object_list):
             raise Http404(u"Empty list and '%(class_name)s.allow_empty' is False.".format(class_name=self.__class__.__name__))
         
         context = self.get_context_data(object_list=self.object_list, form=form)
@@ -62,7 +72,7 @@ class ListAppendView(ListView, FormMixin):
         form = self.get_form(form_class)
         
         allow_empty = self.get_allow_empty()
-        if not allow_empty and len(self.object_list) == 0:
+        if not allow_empty and self.is_empty_list(self.object_list):
             raise Http404(u"Empty list and '%(class_name)s.allow_empty' is False.".format(class_name=self.__class__.__name__))
         
         if form and form.is_valid():
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Day validation rules
+
+They are shared by day forms and imports, each rule raise a 'ValidationError' 
+for invalid values. Datetimes have to be in the current timezone.
+"""
+import datetime
+
+from django.forms import ValidationError
+from django.utils.translation import ugettext as _
+
+def validate_day_start(start, daydate):
+    # Day entry can't start before the targeted day date
+    if start and start.date() < daydate:
+        raise ValidationError(_("You can't start a day before itself"))
+    # Day entry can't start after the targeted day date
+    if start and start.date() > daydate:
+        raise ValidationError(_("You can't start a day after itself"))
+
+def validate_day_stop(start, stop, daydate):
+    # Day entry can't stop before the start
+    if start and stop and stop <= start:
+        raise ValidationError(_("Stop time can't be less or equal to start time"))
+    # Day entry can't stop in more than one futur day from the targeted day date
+    if stop and stop.date() > daydate+datetime.timedelta(days=1):
+        raise ValidationError(_("Stop time can't be more than the next day"))
@@ -2,26 +2,72 @@
 """
 Common views
 """
+from django.conf import settings
+from django.db.models import Max
 from django.views import generic
-from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 
 from braces.views import LoginRequiredMixin
 
-from datebook.models import Datebook
+from datebook.utils.cache import get_datebook_cache, make_cache_key
 
 class IndexView(LoginRequiredMixin, generic.TemplateView):
     """
     Index view
     
-    Display all user that have one or more Datebooks
+    Display all user that have one or more Datebooks with their last activity 
+    date
+    
+    Authors are paginated with a keyset on their username, the 'after' argument 
+    is the last username from the previous page.
     """
+    query_budget = 3
     template_name = "datebook/index.html"
     
+    def get_authors_queryset(self):
+        """
+        Return active authors with their last datebook modification, grouped 
+        on authors
+        """
+        return User.objects.filter(is_active=True, datebook__isnull=False).values('username').annotate(last_activity=Max('datebook__modified')).order_by('username')
+    
+    def get_authors_page(self, after):
+        """
+        Return the page of authors following the given username, with the next 
+        page username if any
+        """
+        limit = settings.DATEBOOK_INDEX_PAGINATE_BY
+        queryset = self.get_authors_queryset()
+        if after:
+            queryset = queryset.filter(username__gt=after)
+        object_list = list(queryset[0:limit+1])
+        
+        next_after = None
+        if len(object_list) > limit:
+            object_list = object_list[0:limit]
+            next_after = object_list[-1]['username']
+        
+        return object_list, next_after
+    
     def get(self, request, *args, **kwargs):
+        after = request.GET.get('after', '').strip()
+        
+        # Pages are cached for a short time if cache is enabled
+        cache = get_datebook_cache()
+        if cache is None:
+            object_list, next_after = self.get_authors_page(after)
+        else:
+            key = make_cache_key('index', after)
+            page = cache.get(key)
+            if page is None:
+                page = self.get_authors_page(after)
+                cache.set(key, page, settings.DATEBOOK_INDEX_CACHE_TIMEOUT)
+            object_list, next_after = page
         
         context = {
-            'object_list': Datebook.objects.filter(author__is_active=True).values('author__username').distinct(),
+            'object_list': object_list,
+            'after': after,
+            'next_after': next_after,
         }
         
         return self.render_to_response(context)
@@ -4,6 +4,8 @@ Datebook author views
 """
 import datetime
 
+from django.db import connection
+from django.db.models import Count, Sum
 from django.views import generic
 from django.shortcuts import get_object_or_404
 from django.core.urlresolvers import reverse
@@ -11,8 +13,10 @@ from django.contrib.auth.models import User
 
 from braces.views import LoginRequiredMixin
 
-from datebook.models import Datebook
+from datebook.models import Datebook, DatebookSummary
 from datebook.forms.year import DatebookYearForm
+from datebook.ics import get_feed_url
+from datebook.utils import empty_totals, format_seconds_to_clock
 from datebook.utils.views import ListAppendView
 
 class DatebookAuthorView(LoginRequiredMixin, ListAppendView):
@@ -21,6 +25,7 @@ class DatebookAuthorView(LoginRequiredMixin, ListAppendView):
     
     Display all years that have one or more Datebooks for the given user
     """
+    query_budget = 7
     model = Datebook
     form_class = DatebookYearForm
     paginate_by = None
@@ -29,7 +34,9 @@ class DatebookAuthorView(LoginRequiredMixin, ListAppendView):
     
     def get_queryset(self, *args, **kwargs):
         self.author = get_object_or_404(User, username=self.kwargs['author'])
-        self.queryset = self.model.objects.filter(author=self.author).dates('period', 'year')
+        self.years_totals = self.get_years_totals()
+        # Dates for the first day of each year like with "dates('period', 'year')"
+        self.queryset = [datetime.date(year, 1, 1) for year in sorted(self.years_totals)]
         return super(DatebookAuthorView, self).get_queryset(*args, **kwargs)
 
     def get_form(self, form_class):
@@ -48,12 +55,62 @@ class DatebookAuthorView(LoginRequiredMixin, ListAppendView):
     def format_year_list(self, queryset):
         """
         Reformate the paginated queryset to replace items with a tuple containing the 
-        item's year, datetime and it's opened month counter
+        item's year, datetime, it's opened month counter and it's totals
         """
-        return [(item.year, item, self.count_opened_months(item.year)) for item in queryset]
+        return [(item.year, item, self.years_totals[item.year]['months'], self.years_totals[item.year]) for item in queryset]
         
-    def count_opened_months(self, year):
-        return Datebook.objects.filter(author=self.author, period__year=year).count()
+    def get_years_queryset(self, datebooks):
+        """
+        Return a queryset of totals summed from datebook summaries and grouped 
+        on the year
+        """
+        year_select = connection.ops.date_extract_sql('year', '{0}.{1}'.format(
+            connection.ops.quote_name(Datebook._meta.db_table),
+            connection.ops.quote_name(Datebook._meta.get_field('period').column),
+        ))
+        return datebooks.extra(select={'year': year_select}).values('year').annotate(
+            months=Count('pk'),
+            summaries=Count('summary'),
+            entries=Sum('summary__entries'),
+            elapsed_seconds=Sum('summary__elapsed_seconds'),
+            overtime_seconds=Sum('summary__overtime_seconds'),
+            vacations=Sum('summary__vacations'),
+        ).order_by()
+        
+    def get_years_totals(self):
+        """
+        Return a dict of opened months counter and totals for each year, from a 
+        single query grouped on years
+        """
+        today = datetime.date.today()
+        datebooks = Datebook.objects.filter(author=self.author)
+        
+        rows = list(self.get_years_queryset(datebooks))
+        # Rebuild missing summaries before to get the totals again
+        if any([row['months'] != row['summaries'] for row in rows]):
+            DatebookSummary.objects.ensure(datebooks)
+            rows = list(self.get_years_queryset(datebooks))
+        
+        years_totals = {}
+        for row in rows:
+            years_totals[int(row['year'])] = dict([(key, row[key] or 0) for key in ['months']+empty_totals().keys()])
+        
+        # Summaries include projections, so totals from the current and futur 
+        # months are replaced with their counted totals
+        fields = empty_totals().keys()
+        current_months = datebooks.filter(period__gte=today.replace(day=1)).values(
+            'id', 'period', *['summary__{0}'.format(key) for key in fields]
+        )
+        for row in current_months:
+            summary_totals = dict([(key, row['summary__{0}'.format(key)]) for key in fields])
+            counted = DatebookSummary.objects.get_counted_totals(row['id'], row['period'], summary_totals, today=today)
+            totals = years_totals[row['period'].year]
+            for key in fields:
+                totals[key] += counted[key]-summary_totals[key]
+        
+        for totals in years_totals.values():
+            totals['elapsed_time'] = format_seconds_to_clock(totals['elapsed_seconds'])
+        return years_totals
         
     def get_context_data(self, **kwargs):
         context = super(DatebookAuthorView, self).get_context_data(**kwargs)
@@ -61,6 +118,7 @@ class DatebookAuthorView(LoginRequiredMixin, ListAppendView):
             'author': self.author,
             'today': datetime.datetime.today(),
             'object_list': self.format_year_list(context['object_list']),
+            'calendar_feed_url': get_feed_url(self.author.username) if self.request.user == self.author else None,
         })
         return context
 
@@ -9,16 +9,20 @@ from django.conf import settings
 from django.views import generic
 from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
+from django.contrib import messages
+from django.forms import ValidationError
 from django.shortcuts import get_object_or_404
 from django.views.generic.edit import DeleteView
+from django.utils.translation import ugettext as _
 from braces.views import LoginRequiredMixin
 
 from datebook.models import Datebook, DayEntry
-from datebook.mixins import AuthorKwargsMixin, DatebookCalendarMixin, OwnerOrPermissionRequiredMixin
-from datebook.forms.day import DayEntryForm, DayEntryCreateForm
+from datebook.mixins import AuthorKwargsMixin, CoalescedTouchesMixin, ConditionalResponseMixin, DatebookCalendarMixin, OwnerOrPermissionRequiredMixin
+from datebook.forms.day import DayEntryForm, DayEntryCreateForm, DayEntryBulkForm
 from datebook.utils import week_from_date
+from datebook.utils.timezones import combine_local
 
-class DayEntryBaseFormView(DatebookCalendarMixin, OwnerOrPermissionRequiredMixin):
+class DayEntryBaseFormView(CoalescedTouchesMixin, DatebookCalendarMixin, OwnerOrPermissionRequiredMixin):
     """
     DayEntry base form view
     """
@@ -139,6 +143,7 @@ class DayEntryFormCreateView(DayEntryBaseFormView, generic.CreateView):
     """
     DayEntry form create view
     """
+    query_budget = {'GET': 6, 'POST': 15}
     form_class = DayEntryCreateForm
 
     def get_form_kwargs(self):
@@ -154,8 +159,8 @@ class DayEntryFormCreateView(DayEntryBaseFormView, generic.CreateView):
         time_stop = datetime.time(18, 0)
         kwargs.update({
             'initial': {
-                'start' : datetime.datetime.combine(day_date, time_start),
-                'stop' : datetime.datetime.combine(day_date, time_stop),
+                'start' : combine_local(day_date, time_start),
+                'stop' : combine_local(day_date, time_stop),
                 'pause' : datetime.time(1, 0),
             },
             'form_action': reverse('datebook:day-add', kwargs={
@@ -172,6 +177,7 @@ class DayEntryFormEditView(DayEntryBaseFormView, generic.UpdateView):
     """
     DayEntry form edit view
     """
+    query_budget = {'GET': 7, 'POST': 16}
     permission_required = 'datebook.change_dayentry'
 
     def get_object(self):
@@ -214,6 +220,7 @@ class DayEntryCurrentView(AuthorKwargsMixin, OwnerOrPermissionRequiredMixin, gen
     If the month datebook does not exist for the current day, this will create it
     before redirect.
     """
+    query_budget = 8
     permission_required = 'datebook.add_dayentry'
     raise_exception = True
     permanent = False
@@ -267,10 +274,11 @@ class DayEntryCurrentView(AuthorKwargsMixin, OwnerOrPermissionRequiredMixin, gen
             })
 
 
-class DayEntryDetailView(LoginRequiredMixin, DatebookCalendarMixin, generic.TemplateView):
+class DayEntryDetailView(LoginRequiredMixin, ConditionalResponseMixin, DatebookCalendarMixin, generic.TemplateView):
     """
     DayEntry detail view
     """
+    query_budget = 8
     model = DayEntry
     template_name = "datebook/day/detail_fragment.html"
 
@@ -308,6 +316,9 @@ class DayEntryDetailView(LoginRequiredMixin, DatebookCalendarMixin, generic.Temp
             obj.projected = True
         return obj
 
+    def get_modified(self):
+        return self.datebook.modified
+
     def get_context_data(self, **kwargs):
         context = super(DayEntryDetailView, self).get_context_data(**kwargs)
         context.update({
@@ -321,15 +332,21 @@ class DayEntryDetailView(LoginRequiredMixin, DatebookCalendarMixin, generic.Temp
 
     def get(self, request, *args, **kwargs):
         self.datebook = self.get_datebook({'period__year': self.year, 'period__month': self.month})
+
+        response = self.get_not_modified_response()
+        if response is not None:
+            return response
+
         self.object = self.get_object()
         self.previous_day = self.get_previous_day()
         self.next_day = self.get_next_day()
 
         context = self.get_context_data(**kwargs)
 
-        return self.render_to_response(context)
+        return self.set_validators(self.render_to_response(context))
 
 class DayEntryDeleteFormView(DayEntryBaseFormView, generic.DeleteView):
+    query_budget = {'GET': 7, 'POST': 16}
     template_name = "datebook/day/delete.html"
     permission_required = 'datebook.delete_dayentry'
 
@@ -362,3 +379,49 @@ class DayEntryDeleteFormView(DayEntryBaseFormView, generic.DeleteView):
             'month': self.object.activity_date.month,
         })
 
+
+class DayEntryBulkFormView(CoalescedTouchesMixin, AuthorKwargsMixin, OwnerOrPermissionRequiredMixin, generic.FormView):
+    """
+    Form view to do an operation on several days of an author at once, the 
+    date range can be initialized from the 'start' and 'end' GET arguments
+    """
+    query_budget = {'GET': 4, 'POST': 14}
+    template_name = "datebook/day/bulk_form.html"
+    form_class = DayEntryBulkForm
+    permission_required = 'datebook.change_dayentry'
+    raise_exception = True
+    
+    def get_form(self, form_class):
+        return form_class(self.author, **self.get_form_kwargs())
+    
+    def get_initial(self):
+        initial = super(DayEntryBulkFormView, self).get_initial()
+        for name in ('start', 'end', 'dates'):
+            if self.request.GET.get(name):
+                initial[name] = self.request.GET[name]
+        return initial
+    
+    def form_valid(self, form):
+        try:
+            bulk = form.save()
+        except ValidationError as e:
+            form.add_error(None, e)
+            return self.form_invalid(form)
+        
+        messages.add_message(self.request, messages.SUCCESS, _('%(created)s day entries have been created, %(updated)s updated and %(deleted)s removed') % {
+            'created': bulk.created,
+            'updated': bulk.updated,
+            'deleted': bulk.deleted,
+        }, fail_silently=True)
+        self.first_day = min(form.cleaned_data['days'])
+        return super(DayEntryBulkFormView, self).form_valid(form)
+    
+    def get_success_url(self):
+        """
+        Redirect to the month of the first day
+        """
+        return reverse('datebook:month-detail', kwargs={
+            'author': self.author,
+            'year': self.first_day.year,
+            'month': self.first_day.month,
+        })
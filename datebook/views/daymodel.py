@@ -16,7 +16,7 @@ from braces.views import LoginRequiredMixin
 
 from datebook.models import DayEntry, DayModel
 from datebook.views.day import DayEntryFormEditView
-from datebook.forms.daymodel import DayToDayModelForm
+from datebook.forms.daymodel import DayToDayModelForm, DayModelScheduleForm
 from datebook.mixins import AuthorKwargsMixin, DatebookCalendarMixin, OwnerOrPermissionRequiredMixin
 
 
@@ -24,6 +24,7 @@ class DayModelListView(AuthorKwargsMixin, OwnerOrPermissionRequiredMixin, generi
     """
     Author's day models index
     """
+    query_budget = 6
     model = DayModel
     template_name = "datebook/daymodel/index.html"
     permission_required = 'datebook.change_daymodel'
@@ -37,6 +38,7 @@ class DayEntryToDayModelFormView(DatebookCalendarMixin, OwnerOrPermissionRequire
     """
     Form view to create a DayModel object from a DayEntry object
     """
+    query_budget = {'GET': 7, 'POST': 10}
     context_object_name = "dayentry"
     template_name = "datebook/day/form.html"
     form_class = DayToDayModelForm
@@ -111,6 +113,7 @@ class DayModelFormEditView(AuthorKwargsMixin, OwnerOrPermissionRequiredMixin, ge
     """
     DayModel form edit view
     """
+    query_budget = {'GET': 5, 'POST': 7}
     model = DayModel
     context_object_name = "daymodel"
     template_name = "datebook/day/form.html"
@@ -152,3 +155,50 @@ class DayModelFormEditView(AuthorKwargsMixin, OwnerOrPermissionRequiredMixin, ge
             'author': self.author,
         })
 
+
+
+
+class DayModelScheduleFormView(AuthorKwargsMixin, OwnerOrPermissionRequiredMixin, generic.FormView):
+    """
+    Form view to apply a DayModel on a date range
+    """
+    query_budget = {'GET': 5, 'POST': 18}
+    template_name = "datebook/daymodel/schedule.html"
+    form_class = DayModelScheduleForm
+    permission_required = 'datebook.add_dayentry'
+    raise_exception = True
+    
+    def get_daymodel(self):
+        return get_object_or_404(DayModel, author=self.author, pk=self.kwargs['pk'])
+    
+    def get_form_kwargs(self):
+        kwargs = super(DayModelScheduleFormView, self).get_form_kwargs()
+        kwargs['daymodel'] = self.daymodel
+        return kwargs
+    
+    def get_context_data(self, **kwargs):
+        context = super(DayModelScheduleFormView, self).get_context_data(**kwargs)
+        context['daymodel'] = self.daymodel
+        return context
+    
+    def form_valid(self, form):
+        schedule = form.save()
+        messages.add_message(self.request, messages.SUCCESS, _('%(created)s day entries have been created, %(updated)s updated and %(skipped)s skipped') % {
+            'created': schedule.created,
+            'updated': schedule.updated,
+            'skipped': schedule.skipped,
+        }, fail_silently=True)
+        return super(DayModelScheduleFormView, self).form_valid(form)
+    
+    def get_success_url(self):
+        return reverse('datebook:day-models', kwargs={
+            'author': self.author,
+        })
+    
+    def get(self, request, *args, **kwargs):
+        self.daymodel = self.get_daymodel()
+        return super(DayModelScheduleFormView, self).get(request, *args, **kwargs)
+    
+    def post(self, request, *args, **kwargs):
+        self.daymodel = self.get_daymodel()
+        return super(DayModelScheduleFormView, self).post(request, *args, **kwargs)
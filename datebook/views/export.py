@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Export views
+"""
+from django import http
+from django.views import generic
+from django.shortcuts import get_object_or_404
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.utils.translation import get_language
+
+from braces.views import LoginRequiredMixin
+
+from datebook.models import Datebook
+from datebook.mixins import ConditionalResponseMixin
+from datebook.exports import get_export_authors, iter_dayentry_rows, iter_csv_lines
+from datebook.forms.export import DayEntryExportForm
+from datebook.ics import build_feed, check_feed_token, get_datebook_blocks
+
+class DayEntryExportView(LoginRequiredMixin, generic.View):
+    """
+    Stream a CSV export of the day entries for the given author, or for all 
+    authors if no author is given
+    
+    Date range is given with the optional 'start' and 'end' arguments in 
+    'YYYY-MM-DD' format.
+    """
+    def get_filename(self, form):
+        parts = [self.kwargs.get('author', 'datebook')]
+        for name in ('start', 'end'):
+            if form.cleaned_data[name]:
+                parts.append(form.cleaned_data[name].isoformat())
+        return '{0}.csv'.format('_'.join(parts))
+    
+    def get(self, request, *args, **kwargs):
+        if 'author' in kwargs:
+            author = get_object_or_404(User, username=kwargs['author'])
+            author_ids = [author.id]
+        else:
+            author_ids = get_export_authors()
+        
+        form = DayEntryExportForm(data=request.GET)
+        if not form.is_valid():
+            return http.HttpResponseBadRequest(form.errors.as_text(), content_type='text/plain')
+        
+        rows = iter_dayentry_rows(author_ids, start=form.cleaned_data['start'], end=form.cleaned_data['end'])
+        
+        response = http.StreamingHttpResponse(iter_csv_lines(rows), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="{0}"'.format(self.get_filename(form))
+        return response
+
+
+class DatebookCalendarFeedView(ConditionalResponseMixin, generic.View):
+    """
+    iCalendar feed of the day entries for the given author, and year if given
+    
+    Calendar clients can't log in, so the feed is available to anonymous 
+    requests with the author feed token as 'token' argument.
+    
+    The ETag is from the last datebook modification and the datebook count, 
+    so clients polling the feed get 'Not Modified' responses until a datebook 
+    changes.
+    """
+    query_budget = 6
+    
+    def get_datebooks(self):
+        queryset = Datebook.objects.filter(author=self.author)
+        if 'year' in self.kwargs:
+            queryset = queryset.filter(period__year=int(self.kwargs['year']))
+        return list(queryset.order_by('period').values('id', 'modified'))
+    
+    def get_modified(self):
+        modified = [item['modified'] for item in self.datebooks]
+        return max(modified) if modified else None
+    
+    def get_etag_parts(self):
+        return [self.author.pk, self.kwargs.get('year'), get_language(), len(self.datebooks), self.get_modified()]
+    
+    def get_feed_name(self):
+        if 'year' in self.kwargs:
+            return u'{0} {1}'.format(self.author.username, self.kwargs['year'])
+        return self.author.username
+    
+    def get(self, request, *args, **kwargs):
+        self.author = get_object_or_404(User, username=kwargs['author'])
+        if not request.user.is_authenticated() and not check_feed_token(self.author.username, request.GET.get('token')):
+            raise PermissionDenied
+        
+        self.datebooks = self.get_datebooks()
+        
+        response = self.get_not_modified_response()
+        if response is not None:
+            return response
+        
+        content = build_feed(self.get_feed_name(), get_datebook_blocks(self.datebooks))
+        
+        response = http.HttpResponse(content, content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = 'inline; filename="{0}.ics"'.format(self.get_feed_name().replace(' ', '_'))
+        return self.set_validators(response)
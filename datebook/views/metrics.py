@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics views
+"""
+from django import http
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.views import generic
+
+from datebook.metrics import render_prometheus
+
+
+class DatebookMetricsView(generic.View):
+    """
+    Timing histograms of the hot paths in the Prometheus text format
+    
+    Metrics collectors can't log in, so the view is available to staff users 
+    and to requests from 'INTERNAL_IPS'. Respond a 404 when metrics are 
+    disabled.
+    """
+    query_budget = 2
+    
+    def get(self, request, *args, **kwargs):
+        if not settings.DATEBOOK_METRICS_ENABLED:
+            raise http.Http404
+        if not request.user.is_staff and request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+            raise PermissionDenied
+        
+        return http.HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
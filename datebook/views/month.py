@@ -3,25 +3,73 @@
 Datebook month views
 """
 import datetime
+import calendar
 
 from django.conf import settings
 from django import http
 from django.views import generic
 from django.views.generic.edit import FormMixin
+from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
+from django.contrib import messages
+from django.middleware.csrf import get_token
+from django.utils.timezone import get_current_timezone_name
+from django.utils.translation import get_language, ugettext as _
 
 from braces.views import LoginRequiredMixin, PermissionRequiredMixin
 
-from datebook.forms.month import DatebookForm, DatebookNotesForm
+from datebook.forms.month import DatebookForm, DatebookNotesForm, DatebookCopyForm
 from datebook.forms.daymodel import AssignDayModelForm
 from datebook.models import Datebook
-from datebook.mixins import DatebookCalendarMixin, DatebookCalendarAutoCreateMixin, OwnerOrPermissionRequiredMixin
-from datebook.utils import format_seconds_to_clock, get_day_weekno
+from datebook.mixins import CoalescedTouchesMixin, ConditionalResponseMixin, DatebookCalendarMixin, DatebookCalendarAutoCreateMixin, MemoryProfileMixin, OwnerOrPermissionRequiredMixin
+from datebook.calendars import DatebookMonthTotals
+from datebook.metrics import timing_span
+from datebook.utils import time_to_seconds
+from datebook.utils.cache import get_datebook_cache, get_version_key, make_cache_key
+
+def get_available_owners():
+    """
+    Return the queryset of users that don't have any datebook yet, with an 
+    anti-join on datebooks
+    """
+    return User.objects.filter(datebook__isnull=True)
+
+
+class DatebookOwnerAutocompleteView(PermissionRequiredMixin, generic.View):
+    """
+    Return a JSON list of usernames for available datebook owners
+    
+    Usernames are filtered on the prefix from the 'q' argument and paginated 
+    with a keyset on usernames from the 'after' argument, the last returned 
+    username is given as 'next' argument when there are more results.
+    """
+    query_budget = 4
+    permission_required = 'datebook.add_datebook'
+    raise_exception = True
+    
+    def get(self, request, *args, **kwargs):
+        limit = settings.DATEBOOK_OWNER_AUTOCOMPLETE_LIMIT
+        prefix = request.GET.get('q', '').strip()
+        after = request.GET.get('after', '').strip()
+        
+        queryset = get_available_owners().order_by('username')
+        if prefix:
+            queryset = queryset.filter(username__startswith=prefix)
+        if after:
+            queryset = queryset.filter(username__gt=after)
+        usernames = list(queryset.values_list('username', flat=True)[0:limit+1])
+        
+        return http.JsonResponse({
+            'results': usernames[0:limit],
+            'next': usernames[limit-1] if len(usernames) > limit else None,
+        })
+
 
 class DatebookMonthFormView(PermissionRequiredMixin, generic.FormView):
     """
     Datebook create form view
     """
+    query_budget = {'GET': 4, 'POST': 8}
     model = Datebook
     form_class = DatebookForm
     template_name = 'datebook/month/form.html'
@@ -29,10 +77,9 @@ class DatebookMonthFormView(PermissionRequiredMixin, generic.FormView):
     raise_exception = True
 
     def get_form(self, form_class):
-        excluded_users = Datebook.objects.all().values('author_id').distinct()
-        self.available_users = User.objects.all().exclude(pk__in=[v['author_id'] for v in excluded_users]).order_by('username')
+        self.available_users = get_available_owners()
         
-        if self.available_users.count() == 0:
+        if not self.available_users.exists():
             return None
         return super(DatebookMonthFormView, self).get_form(form_class)
         
@@ -40,6 +87,7 @@ class DatebookMonthFormView(PermissionRequiredMixin, generic.FormView):
         kwargs = super(DatebookMonthFormView, self).get_form_kwargs(**kwargs)
         kwargs.update({
             'available_users': self.available_users,
+            'owner_autocomplete_url': reverse('datebook:owner-autocomplete'),
         })
         return kwargs
     
@@ -58,6 +106,7 @@ class DatebookMonthGetOrCreateView(DatebookCalendarMixin, OwnerOrPermissionRequi
     
     If the Datebook allready exists for the given kwargs, raise a "Http404"
     """
+    query_budget = 10
     permission_required = 'datebook.add_datebook'
     raise_exception = True
     
@@ -77,6 +126,8 @@ class DatebookMonthCurrentView(DatebookCalendarAutoCreateMixin, OwnerOrPermissio
     
     If the Datebook allready exists for the given kwargs, directly redirect to it
     """
+    query_budget = 10
+    
     def get(self, request, *args, **kwargs):
         self.get_current_date()
         
@@ -89,7 +140,7 @@ class DatebookMonthCurrentView(DatebookCalendarAutoCreateMixin, OwnerOrPermissio
         
         return http.HttpResponseRedirect(d.get_absolute_url())
 
-class DatebookMonthView(LoginRequiredMixin, DatebookCalendarMixin, FormMixin, generic.TemplateView):
+class DatebookMonthView(LoginRequiredMixin, MemoryProfileMixin, CoalescedTouchesMixin, ConditionalResponseMixin, DatebookCalendarMixin, FormMixin, generic.TemplateView):
     """
     Datebook month details view
     
@@ -97,88 +148,69 @@ class DatebookMonthView(LoginRequiredMixin, DatebookCalendarMixin, FormMixin, ge
     
     Accept POST request for the AssignDayModelForm form that fill days from a day model.
     """
+    query_budget = {'GET': 9, 'POST': 26}
     template_name = "datebook/month/calendar.html"
     form_class = AssignDayModelForm
 
+    def get_datebook_queryset(self):
+        # Summary is used to get past months totals
+        return Datebook.objects.select_related('summary')
+
+    def get_calendar_cache_key(self, current_day):
+        """
+        Return the cache key for the calendar datas, they depend on the datebook 
+        version, the current day (for projections), language and timezone
+        """
+        return make_cache_key('calendar', self.object.pk, get_version_key(self.object.modified),
+                              current_day.isoformat(), get_language(), get_current_timezone_name())
+    
     def get_calendar(self, day_filters={}):
         """
-        Where we get the Datebook's calendar and crawl it to compute some 
-        values about its weeks and days
+        Get the calendar datas from cache if enabled, else compute them
         """
+        cache = get_datebook_cache()
+        if cache is None or day_filters:
+            return self.compute_calendar(day_filters)
+        
         current_day = datetime.date.today()
+        key = self.get_calendar_cache_key(current_day)
+        with timing_span('month.calendar_cache'):
+            calendar_datas = cache.get(key)
+        if calendar_datas is None:
+            calendar_datas = self.compute_calendar(day_filters, current_day=current_day)
+            cache.set(key, calendar_datas, settings.DATEBOOK_CALENDAR_CACHE_TIMEOUT)
+        return calendar_datas
+    
+    def compute_calendar(self, day_filters={}, current_day=None):
+        """
+        Where we get the Datebook's calendar and compute its weeks and month 
+        totals
+        """
+        current_day = current_day or datetime.date.today()
         
         # Init the calendar object
         _cal = super(DatebookMonthView, self).get_calendar()
         
-        # Get month weeks structure, removing days that are not month's days (equal to 0)
-        week_days = [filter(None, item) for item in _cal.monthdayscalendar(self.object.period.year, self.object.period.month)]
-        weeks_totals = [{'current': False, 'active': False, 'elapsed_seconds':0, 'overtime_seconds':0, 'vacations':0} for i in range(0, len(week_days))]
-        # Tag the current week if we are on a current month
-        if current_day.year == self.object.period.year and current_day.month == self.object.period.month:
-            for i, item in enumerate(weeks_totals, start=0):
-                if current_day.day in week_days[i]:
-                    item['current'] = True
-                    break
-        
-        # Calculate total elapsed time for worked days and total vacations
-        day_entries = self.get_dayentry_list(day_filters)
-        total_elapsed_seconds = total_overtime_seconds = total_vacation = 0
-        
-        for item in day_entries:
-            # Find the day's week number
-            weekno = get_day_weekno(week_days, item.activity_date.day)
-            week = weeks_totals[weekno]
-            
-            # Default value for day's mark used in calendar template for a day equal or after the current day
-            item.projected = False
-            
-            # Do not calculate future days (from current day and further)
-            if current_day <= item.activity_date:
-                item.projected = True
-                continue
-            # Mark the day's week as active (the week have days that are not projections)
-            else:
-                weeks_totals[weekno]['active'] = True
-            
-            # Do not calculate vacations days
-            if item.vacation:
-                total_vacation += 1
-                weeks_totals[weekno]['vacations'] += 1
-                continue
-            
-            # Compute totals (for months and weeks)
-            total_elapsed_seconds += item.get_elapsed_seconds()
-            total_overtime_seconds += item.get_overtime_seconds()
-            weeks_totals[weekno]['elapsed_seconds'] += item.get_elapsed_seconds()
-            weeks_totals[weekno]['overtime_seconds'] += item.get_overtime_seconds()
-        
-        
-        # Post process week totals for some additional values
-        for item in weeks_totals:
-            item['elapsed_time'] = format_seconds_to_clock(item['elapsed_seconds'])
-            item['overtime_time'] = format_seconds_to_clock(item['overtime_seconds'])
-            
+        # Mark projected days (equal or after the current day) used in calendar 
+        # template
+        with timing_span('month.get_dayentry_list'):
+            day_entries = self.get_dayentry_list(day_filters)
+            for item in day_entries:
+                item.projected = (current_day <= item.activity_date)
         
-        calendar_datas = {
-            "days": [item.day for item in _cal.itermonthdates(self.object.period.year, self.object.period.month) if item.month == self.object.period.month],
-            "weekheader": _cal.formatweekheader(),
-            "weeks_totals": weeks_totals,
-            "month": _cal.formatmonth(self.object.period.year, self.object.period.month, dayentries=day_entries, current_day=current_day),
-            "elapsed_seconds": 0,
-            "elapsed_time": None,
-            "overtime_seconds": 0,
-            "overtime_time": None,
-            "vacations": 0,
-        }
+        # Weeks and month totals for worked days and vacations
+        with timing_span('month.totals'):
+            totals_engine = DatebookMonthTotals(self.object, current_day)
+            weeks_totals, month_totals = totals_engine.compute(day_entries, use_summary=not day_filters)
         
-        # Crawl all weeks to calculate month totals
-        for item in weeks_totals:
-            calendar_datas['elapsed_seconds'] += item['elapsed_seconds']
-            calendar_datas['overtime_seconds'] += item['overtime_seconds']
-            calendar_datas['vacations'] += item['vacations']
-            
-        calendar_datas['elapsed_time'] = format_seconds_to_clock(calendar_datas['elapsed_seconds'])
-        calendar_datas['overtime_time'] = format_seconds_to_clock(calendar_datas['overtime_seconds'])
+        with timing_span('month.formatmonth'):
+            calendar_datas = {
+                "days": [item.day for item in _cal.itermonthdates(self.object.period.year, self.object.period.month) if item.month == self.object.period.month],
+                "weekheader": _cal.formatweekheader(),
+                "weeks_totals": weeks_totals,
+                "month": _cal.formatmonth(self.object.period.year, self.object.period.month, dayentries=list(day_entries), current_day=current_day),
+            }
+        calendar_datas.update(month_totals)
         
         return calendar_datas
     
@@ -186,7 +218,20 @@ class DatebookMonthView(LoginRequiredMixin, DatebookCalendarMixin, FormMixin, ge
         """
         Get and return author's day models
         """
-        return self.author.daymodel_set.all().order_by('title').values('id', 'title')
+        return list(self.author.daymodel_set.all().order_by('title').values('id', 'title'))
+    
+    def get_modified(self):
+        return self.object.modified
+    
+    def get_etag_parts(self):
+        """
+        Day models and the CSRF token are used in the day models form, day models 
+        titles are parts too since renaming a day model does not touch datebooks
+        """
+        parts = super(DatebookMonthView, self).get_etag_parts()
+        parts.extend([u'{id}:{title}'.format(**item) for item in self.day_models])
+        parts.append(get_token(self.request))
+        return parts
         
     def get_context_data(self, **kwargs):
         context = super(DatebookMonthView, self).get_context_data(**kwargs)
@@ -194,7 +239,7 @@ class DatebookMonthView(LoginRequiredMixin, DatebookCalendarMixin, FormMixin, ge
             'datebook': self.object,
             'daymodels_form': self.form,
             'datebook_calendar': self.calendar,
-            'day_models': self.get_day_models(),
+            'day_models': self.day_models,
             'DATEBOOK_TEXT_MARKUP_RENDER_TEMPLATE': settings.DATEBOOK_TEXT_MARKUP_RENDER_TEMPLATE,
         })
         return context
@@ -220,15 +265,27 @@ class DatebookMonthView(LoginRequiredMixin, DatebookCalendarMixin, FormMixin, ge
    
     def get(self, request, *args, **kwargs):
         self.object = self.get_datebook({'period__year': self.year, 'period__month': self.month})
+        self.day_models = self.get_day_models()
+        
+        response = self.get_not_modified_response()
+        if response is not None:
+            return response
+        
         self.calendar = self.get_calendar()
         
         form_class = self.get_form_class()
         self.form = self.get_form(form_class)
         
-        return self.render_to_response(self.get_context_data(**kwargs))
+        # Render now instead of in the response middlewares to time it
+        response = self.render_to_response(self.get_context_data(**kwargs))
+        with timing_span('month.render'):
+            response.render()
+        
+        return self.set_validators(response)
     
     def post(self, request, *args, **kwargs):
         self.object = self.get_datebook({'period__year': self.year, 'period__month': self.month})
+        self.day_models = self.get_day_models()
         self.calendar = self.get_calendar()
         
         form_class = self.get_form_class()
@@ -240,10 +297,72 @@ class DatebookMonthView(LoginRequiredMixin, DatebookCalendarMixin, FormMixin, ge
             return self.form_invalid(self.form)
 
 
-class DatebookNotesFormView(DatebookCalendarMixin, OwnerOrPermissionRequiredMixin, generic.UpdateView):
+class DatebookMonthJsonView(DatebookMonthView):
+    """
+    Datebook month calendar as JSON
+    
+    Return the same calendar datas than DatebookMonthView with only integer 
+    values, without formatted times or markup. Dates are in ISO format and 
+    entry start/stop are timestamps.
+    
+    Use the same cached calendar datas and validators, without the day models 
+    form parts.
+    """
+    query_budget = 5
+    http_method_names = ['get']
+    
+    def get_etag_parts(self):
+        return super(DatebookMonthView, self).get_etag_parts()
+    
+    def get_entry_datas(self, entry):
+        return {
+            'id': entry.id,
+            'start': calendar.timegm(entry.start.utctimetuple()),
+            'stop': calendar.timegm(entry.stop.utctimetuple()),
+            'pause_seconds': time_to_seconds(entry.pause),
+            'elapsed_seconds': entry.elapsed_seconds,
+            'overtime_seconds': entry.overtime_seconds,
+            'vacation': entry.vacation,
+            'projected': entry.projected,
+        }
+    
+    def get_day_datas(self, day):
+        return {
+            'date': day['date'].isoformat(),
+            'noday': day['noday'],
+            'is_current': day['is_current'],
+            'entry': self.get_entry_datas(day['entry']) if day['entry'] else None,
+        }
+    
+    def get_calendar_datas(self):
+        counters = ('active', 'current', 'elapsed_seconds', 'overtime_seconds', 'vacations')
+        return {
+            'datebook': self.object.pk,
+            'period': self.object.period.isoformat(),
+            'month': [[self.get_day_datas(day) for day in week] for week in self.calendar['month']],
+            'weeks_totals': [dict([(key, week[key]) for key in counters]) for week in self.calendar['weeks_totals']],
+            'elapsed_seconds': self.calendar['elapsed_seconds'],
+            'overtime_seconds': self.calendar['overtime_seconds'],
+            'vacations': self.calendar['vacations'],
+        }
+    
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_datebook({'period__year': self.year, 'period__month': self.month})
+        
+        response = self.get_not_modified_response()
+        if response is not None:
+            return response
+        
+        self.calendar = self.get_calendar()
+        
+        return self.set_validators(http.JsonResponse(self.get_calendar_datas()))
+
+
+class DatebookNotesFormView(ConditionalResponseMixin, DatebookCalendarMixin, OwnerOrPermissionRequiredMixin, generic.UpdateView):
     """
     Datebook create form view
     """
+    query_budget = {'GET': 6, 'POST': 8}
     model = Datebook
     form_class = DatebookNotesForm
     template_name = 'datebook/month/notes_form.html'
@@ -257,6 +376,17 @@ class DatebookNotesFormView(DatebookCalendarMixin, OwnerOrPermissionRequiredMixi
     
     def get_success_url(self):
         return self.object.get_absolute_url()
+    
+    def get_modified(self):
+        return self.object.modified
+    
+    def get_etag_parts(self):
+        """
+        CSRF token is used in the form
+        """
+        parts = super(DatebookNotesFormView, self).get_etag_parts()
+        parts.append(get_token(self.request))
+        return parts
         
     def get_context_data(self, **kwargs):
         context = super(DatebookNotesFormView, self).get_context_data(**kwargs)
@@ -265,3 +395,65 @@ class DatebookNotesFormView(DatebookCalendarMixin, OwnerOrPermissionRequiredMixi
             'DATEBOOK_TEXT_MARKUP_RENDER_TEMPLATE': settings.DATEBOOK_TEXT_MARKUP_RENDER_TEMPLATE,
         })
         return context
+    
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        
+        response = self.get_not_modified_response()
+        if response is not None:
+            return response
+        
+        form_class = self.get_form_class()
+        form = self.get_form(form_class)
+        
+        return self.set_validators(self.render_to_response(self.get_context_data(form=form)))
+
+
+class DatebookMonthCopyFormView(CoalescedTouchesMixin, DatebookCalendarMixin, OwnerOrPermissionRequiredMixin, generic.FormView):
+    """
+    Form view to copy the day entries of a datebook to another month
+    """
+    query_budget = {'GET': 5, 'POST': 20}
+    form_class = DatebookCopyForm
+    template_name = 'datebook/month/copy_form.html'
+    permission_required = 'datebook.add_dayentry'
+    raise_exception = True
+    
+    def get_form(self, form_class):
+        return form_class(self.datebook, **self.get_form_kwargs())
+    
+    def get_initial(self):
+        """
+        Default target is the next month
+        """
+        initial = super(DatebookMonthCopyFormView, self).get_initial()
+        initial['target'] = (self.datebook.period+datetime.timedelta(days=31)).replace(day=1)
+        return initial
+    
+    def get_context_data(self, **kwargs):
+        context = super(DatebookMonthCopyFormView, self).get_context_data(**kwargs)
+        context['datebook'] = self.datebook
+        return context
+    
+    def form_valid(self, form):
+        self.target_datebook = form.save()
+        messages.add_message(self.request, messages.SUCCESS, _('%(created)s day entries have been copied, %(skipped)s skipped') % {
+            'created': form.created,
+            'skipped': form.skipped,
+        }, fail_silently=True)
+        return super(DatebookMonthCopyFormView, self).form_valid(form)
+    
+    def get_success_url(self):
+        return reverse('datebook:month-detail', kwargs={
+            'author': self.author,
+            'year': self.target_datebook.period.year,
+            'month': self.target_datebook.period.month,
+        })
+    
+    def get(self, request, *args, **kwargs):
+        self.datebook = self.get_datebook({'period__year': self.year, 'period__month': self.month})
+        return super(DatebookMonthCopyFormView, self).get(request, *args, **kwargs)
+    
+    def post(self, request, *args, **kwargs):
+        self.datebook = self.get_datebook({'period__year': self.year, 'period__month': self.month})
+        return super(DatebookMonthCopyFormView, self).post(request, *args, **kwargs)
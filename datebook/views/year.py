@@ -5,43 +5,123 @@ Datebook year views
 import datetime
 import calendar
 
+from django.db.models import Count, Max
 from django.views import generic
 
 from braces.views import LoginRequiredMixin
 
-from datebook.mixins import DateKwargsMixin
+from datebook.models import Datebook, DatebookSummary, DayEntry
+from datebook.mixins import ConditionalResponseMixin, DateKwargsMixin
+from datebook.ics import get_feed_url
+from datebook.utils import empty_totals, format_seconds_to_clock
 
-class DatebookYearView(LoginRequiredMixin, DateKwargsMixin, generic.TemplateView):
+class DatebookYearView(LoginRequiredMixin, ConditionalResponseMixin, DateKwargsMixin, generic.TemplateView):
     """
     Datebook year view
     
     Display the twelve months of the given year with link and infos for the 
     existing datebooks
     """
+    query_budget = 7
     template_name = "datebook/year.html"
+    
+    def get_year_version(self):
+        """
+        Return the last modification date and the count of the datebooks for 
+        the year, the count is needed to see removed datebooks
+        """
+        if not hasattr(self, '_year_version'):
+            self._year_version = self.object.datebook_set.filter(period__year=self.year).aggregate(modified=Max('modified'), count=Count('id'))
+        return self._year_version
+    
+    def get_modified(self):
+        return self.get_year_version()['modified']
+    
+    def get_etag_parts(self):
+        parts = super(DatebookYearView, self).get_etag_parts()
+        parts.append(self.get_year_version()['count'])
+        return parts
+        
+    def rebuild_summaries(self, datebook_ids):
+        """
+        Rebuild the summaries of the given datebook ids, return them in a dict 
+        indexed on datebook ids
+        """
+        if not datebook_ids:
+            return {}
+        entries = dict([(pk, []) for pk in datebook_ids])
+        for values in DayEntry.objects.filter(datebook__in=datebook_ids).values_list(*DayEntry.SUMMARY_FIELDS):
+            entries[values[0]].append(values[1:])
+        return dict([(datebook.id, DatebookSummary.objects.rebuild(datebook, entries=entries[datebook.id])) for datebook in Datebook.objects.filter(pk__in=datebook_ids)])
+    
+    def get_datebook_totals(self, today):
+        """
+        Return a list of dicts with the period, entries counter and counted totals 
+        of each datebook for the year
+        
+        They are getted from a single query joined on the datebook summaries, 
+        without loading full Datebook rows. Missing summaries are rebuilded from 
+        a single query for their datebooks and another one for their entries.
+        """
+        fields = empty_totals().keys()
+        rows = list(self.object.datebook_set.filter(period__year=self.year).order_by('period').values(
+            'id', 'period', *['summary__{0}'.format(key) for key in fields]
+        ))
+        rebuilt = self.rebuild_summaries([row['id'] for row in rows if row['summary__entries'] is None])
+        
+        datebooks = []
+        for row in rows:
+            totals = dict([(key, row['summary__{0}'.format(key)]) for key in fields])
+            # Missing summary
+            if totals['entries'] is None:
+                totals = rebuilt[row['id']].get_totals()
+            
+            item = DatebookSummary.objects.get_counted_totals(row['id'], row['period'], totals, today=today)
+            item.update({
+                'id': row['id'],
+                'period': row['period'],
+                'elapsed_time': format_seconds_to_clock(item['elapsed_seconds']),
+                'overtime_time': format_seconds_to_clock(item['overtime_seconds']),
+            })
+            datebooks.append(item)
+        
+        return datebooks
         
     def get_context_data(self, **kwargs):
         context = super(DatebookYearView, self).get_context_data(**kwargs)
         
         _curr = datetime.date.today()
-        # Get all datebooks for the given year
-        queryset = self.object.datebook_set.filter(period__year=self.year).order_by('period')[0:13]
-        _datebook_map = dict(map(lambda x: (x.period.month, x), queryset))
+        # Get all datebooks for the given year with their totals
+        _datebook_map = dict(map(lambda x: (x['period'].month, x), self.get_datebook_totals(_curr)))
         # Fill the finded datebooks in the month map, month without datebook will have 
-        # None instead of a Datebook instance
+        # None instead of a datebook totals dict
         datebooks_map = [(datetime.datetime(self.year, i, 1), _datebook_map.get(i)) for i in range(1,13)]
         
+        # Sum the month totals for the year
+        year_totals = empty_totals()
+        for item in _datebook_map.values():
+            for key in year_totals:
+                year_totals[key] += item[key]
+        year_totals['elapsed_time'] = format_seconds_to_clock(year_totals['elapsed_seconds'])
+        year_totals['overtime_time'] = format_seconds_to_clock(year_totals['overtime_seconds'])
+        
         context.update({
             'year_current': _curr.year,
             'is_current_year': (self.year == _curr.year),
             'datebooks_map': datebooks_map,
+            'year_totals': year_totals,
+            'calendar_feed_url': get_feed_url(self.author.username, self.year) if self.request.user == self.author else None,
         })
         return context
     
     def get(self, request, *args, **kwargs):
         self.object = self.author
         
+        response = self.get_not_modified_response()
+        if response is not None:
+            return response
+        
         context = self.get_context_data(**kwargs)
         
-        return self.render_to_response(context)
+        return self.set_validators(self.render_to_response(context))
 